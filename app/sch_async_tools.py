@@ -0,0 +1,260 @@
+# --------- SCHEDULE PROJECT ---------
+# ------- Jadwiga Swierczynska -------
+# ------------ 30.12.2023 ------------
+
+"""Async tools - asyncio version of the workers and of `act` \
+    on SQLAlchemy's async engine (many queries at once in one thread)"""
+
+from __future__ import annotations
+import asyncio
+import contextlib
+import itertools
+import weakref
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, \
+    async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import sch_db_tools as dbt
+from typing import Any, AsyncIterator, Coroutine, TypeVar
+
+try:
+    import aiosqlite
+except ImportError:  # optional - needed only for SQLite databases
+    aiosqlite = None
+
+
+ASYNC_DRIVERS: dict[str, str] = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql"
+}
+"""Async drivers used for databases of `dbt.DB_URL`."""
+
+_engines: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop,
+    tuple[str, AsyncEngine, AsyncEngine, async_sessionmaker[AsyncSession]]] \
+    = weakref.WeakKeyDictionary()
+"""URL, async engine, its version for writing sessions (see `dbt.init`) \
+    and session factory of each event loop \
+        (connections of async drivers are bound to the loop)."""
+
+T = TypeVar("T")
+
+_locks: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop,
+                                  asyncio.Lock] = weakref.WeakKeyDictionary()
+
+
+def async_url(url: str) -> str:
+    """Return the database URL with the async driver of its dialect \
+        (e.g. `"sqlite+aiosqlite:///schedule.db"`).
+
+    Arguments:
+
+    - `url` - database URL (e.g. `"sqlite:///schedule.db"`)"""
+
+    u = make_url(url)
+    if u.get_backend_name() == "sqlite" and aiosqlite is None:
+        raise ModuleNotFoundError(
+            "Async access to SQLite requires aiosqlite package")
+    driver = ASYNC_DRIVERS.get(u.get_backend_name())
+    if driver is None or u.drivername != u.get_backend_name():
+        return url  # driver given explicitly (or unknown)
+    return u.set(drivername=f"{u.get_backend_name()}+{driver}")\
+        .render_as_string(hide_password=False)
+
+
+async def get_async_engine() -> AsyncEngine:
+    """Return the async engine of `dbt.DB_URL` for the running event loop. \
+        It is built (and the schema is created) on the first call only \
+            (or after the URL is changed by `dbt.configure`)."""
+
+    loop = asyncio.get_running_loop()
+    async with _locks.setdefault(loop, asyncio.Lock()):
+        entry = _engines.get(loop)
+        if entry is None or entry[0] != dbt.DB_URL:
+            url = dbt.DB_URL
+            # pooled also for SQLite files (pragmas are set once per
+            # connection, see `dbt.sqlite_pragmas`)
+            options = dict(poolclass=AsyncAdaptedQueuePool,
+                           **dbt.pool_options(url)) \
+                if dbt.file_backed(url) else {}
+            engine = create_async_engine(async_url(url), echo=False,
+                                         **options)
+            dbt.prepare_engine(engine.sync_engine)
+            write_engine = engine.execution_options(sqlite_write=True)
+            async with write_engine.begin() as connection:
+                await connection.run_sync(dbt.create_schema)
+            if entry is not None:
+                await entry[1].dispose()
+            # own class of the sync sessions, as listeners of `dbt.init`
+            sync_class = type("Session", (Session,), {})
+            dbt.listen_session_events(sync_class)
+            _engines[loop] = (url, engine, write_engine, async_sessionmaker(
+                engine, expire_on_commit=False,
+                sync_session_class=sync_class))
+        return _engines[loop][1]
+
+
+@contextlib.asynccontextmanager
+async def init(write: bool = False) -> AsyncIterator[AsyncSession]:
+    """Initialize an async session (`AsyncSession` object) \
+        of the engine from `get_async_engine` \
+            (`async with init() as session: ...`).
+
+    Arguments:
+
+    - `write` - whether the session writes to the database \
+        (as in `dbt.init`, waiting for the write lock of SQLite \
+            blocks a thread of the driver, not the event loop)"""
+
+    await get_async_engine()
+    _, _, write_engine, factory = _engines[asyncio.get_running_loop()]
+    async with (factory(bind=write_engine) if write
+                else factory()) as session:
+        yield session
+
+
+class AsyncWorker():
+    """Async worker - performs actions of a worker \
+        (`dbt.PersonWorker`, `dbt.EventWorker` or `dbt.PlaceWorker`) \
+            on an `AsyncSession`. The actions run in the session's \
+                greenlet bridge (`AsyncSession.run_sync`), \
+                    so validation and serialization stay the same, \
+                        while waiting for the database does not block \
+                            the event loop."""
+
+    def __init__(self: AsyncWorker, table: str,
+                 instr: dict[str, Any]) -> None:
+        """Initialize an async worker.
+
+        Arguments:
+
+        - `table` - table name (`"people"`, `"events"` or `"places"`)
+        - `instr` - dictionary with properties of the action"""
+
+        self.worker: dbt.Worker = dbt.workers[table](instr)
+
+    async def perform(self: AsyncWorker, session: AsyncSession,
+                      action: str) \
+            -> dict[str, Any] | list[dict[str, Any]]:
+        """Perform an action and return its serialized result \
+            (see `dbt.serialize_result`).
+
+        Arguments:
+
+        - `session` - `AsyncSession` object
+        - `action` - name of the action (e.g. `"info"`)"""
+
+        def perform(s: Session) -> dict[str, Any] | list[dict[str, Any]]:
+            return dbt.serialize_result(getattr(self.worker, action)(s))
+        return await session.run_sync(perform)
+
+    async def stream(self: AsyncWorker, session: AsyncSession,
+                     action: str) -> AsyncIterator[dict[str, Any]]:
+        """Yield results of a streaming action (e.g. `info_stream`) \
+            one by one, fetched `dbt.Worker.stream_chunk` at once.
+
+        Arguments:
+
+        - `session` - `AsyncSession` object
+        - `action` - name of the action (e.g. `"collisions_all"`)"""
+
+        results = await session.run_sync(
+            lambda s: getattr(self.worker, action)(s))
+        while chunk := await session.run_sync(lambda s: list(
+                itertools.islice(results, dbt.Worker.stream_chunk))):
+            for r in chunk:
+                yield r
+
+
+async def act(instr: dict[str, Any]) -> dict[str, Any] | list[dict[str, Any]]:
+    """Perform an action on a database according to `instr` \
+        (as `dbt.act`, sharing its result cache).
+
+    Arguments:
+
+    - `instr` - dictionary with info about action \
+        that we want to perform (name of that action, table, \
+            parameters of the query)"""
+
+    action = instr["action"]
+    table = instr["table"]
+
+    if action in dbt.cached_actions:
+        key = dbt.cache_key(instr)
+        version = dbt.cache.version
+        res = dbt.cache.get(key)
+        if res is not None:
+            return res
+
+    worker = AsyncWorker(table, instr)
+
+    async with init(action in dbt.write_actions) as session:
+        res = await worker.perform(session, action)
+        await session.commit()
+
+    if action in dbt.cached_actions:
+        dbt.cache.put(key, res, dbt.read_tags(
+            type(worker.worker).model, res, instr), version)
+    return res
+
+
+async def act_many(instrs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Perform many actions (`add`, `update`, `delete` or `upsert`) \
+        on a database in one transaction (as `dbt.act_many`).
+
+    Arguments:
+
+    - `instrs` - list of dictionaries with info about actions"""
+
+    async with init(write=True) as session:
+        res = await session.run_sync(dbt.perform_many, instrs)
+        await session.commit()
+    return res
+
+
+async def act_stream(instr: dict[str, Any]) -> AsyncIterator[dict[str, Any]]:
+    """Perform a streaming action (e.g. `collisions_all`) \
+        and yield its results one by one (as `dbt.act_stream`). \
+            The session is open until the results are exhausted.
+
+    Arguments:
+
+    - `instr` - dictionary with info about action \
+        that we want to perform (name of that action, table, \
+            parameters of the query)"""
+
+    worker = AsyncWorker(instr["table"], instr)
+
+    async with init() as session:
+        async for r in worker.stream(session, instr["action"]):
+            yield r
+        await session.commit()
+
+
+async def dispose() -> None:
+    """Close the connections of the async engine of the running event loop. \
+        Must be awaited before the loop is closed (threads of `aiosqlite` \
+            connections would keep the process alive), see `run`. \
+                The engine is rebuilt when needed again."""
+
+    entry = _engines.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[1].dispose()
+
+
+def run(main: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine in a new event loop (as `asyncio.run`) \
+        and close the connections of its async engine afterwards.
+
+    Arguments:
+
+    - `main` - coroutine, e.g. `act(instr)`"""
+
+    async def wrapped() -> T:
+        try:
+            return await main
+        finally:
+            await dispose()
+    return asyncio.run(wrapped())
@@ -6,14 +6,62 @@
 
 import argparse
 import datetime
+import itertools
+import json
 import sch_db_tools as dbt
 import sch_print_tools as prt
+import sch_io_tools as sio
+import sch_snapshot_tools as sst
 import requests
-from typing import Union, Any
+from typing import Union, Any, Iterable, Iterator
 import sys
 
 SERVER = "http://localhost:5000/"
 
+TABLES = ["people", "events", "places"]
+
+ACTIONS: dict[str, list[str]] = {
+    "add": TABLES,
+    "update": TABLES,
+    "lookup": TABLES,
+    "info": TABLES,
+    "info_all": TABLES,
+    "delete": TABLES,
+    "collisions_all": ["events"],
+    "conflicts": ["people", "places"],
+    "conflicts_all": ["people", "places"],
+    "search": TABLES,
+    "range": ["events"],
+    "free_slots": ["events"],
+    "stats": ["events"],
+    "archived": ["events"],
+    "rebuild": ["events"],
+    "available": ["places"]
+}
+"""Available actions with tables for which they can be performed."""
+
+STREAMED: dict[str, str] = {
+    "collisions_all": "collisions/",
+    "conflicts": "conflicts/",
+    "conflicts_all": "conflicts/"
+}
+"""Actions with streamed results and their API endpoints \
+    (relative to the table endpoint)."""
+
+PAGE_SIZE = 1000
+"""Number of records fetched at once through API by `info_all` action."""
+
+PRINTED_AS: dict[str, str] = {
+    "collisions_all": "collisions",
+    "conflicts": "conflicts",
+    "conflicts_all": "conflicts",
+    "free_slots": "slots",
+    "stats": "stats",
+    "archived": "archived",
+    "available": "available"
+}
+"""Actions which results are not printed as objects of the table."""
+
 # PARSING ------------------------------------
 
 
@@ -79,31 +127,66 @@ def parse() -> argparse.Namespace:
     """
 
     properties: dict[str, dict[str, str]] = {
-        "people": dbt.PersonWorker.properties,
-        "events": dbt.EventWorker.properties,
-        "places": dbt.PlaceWorker.properties
+        "people": dbt.PersonWorker.properties | dbt.Worker.page_properties
+        | dbt.Worker.search_properties,
+        "events": dbt.EventWorker.properties | dbt.Worker.page_properties
+        | dbt.Worker.search_properties | dbt.EventWorker.range_properties
+        | dbt.EventWorker.slot_properties
+        | dbt.EventWorker.optional_properties,
+        "places": dbt.PlaceWorker.properties | dbt.Worker.page_properties
+        | dbt.Worker.search_properties | dbt.EventWorker.range_properties
+        | dbt.PlaceWorker.available_properties
     }
     requirements: dict[str, dict[str, list[str]]] = {
         t: {
-            "add": [p for p in properties[t] if p != "id"],
+            "add": [p for p in dbt.workers[t].properties if p != "id"],
             "update": ["id"],
             "lookup": ["name"] if t != "people" else ["surname"],
             "info": ["id"],
             "info_all": [],
-            "delete": ["id"]
-        } for t in ["people", "events", "places"]
+            "delete": ["id"],
+            "collisions_all": [],
+            "conflicts": ["id"],
+            "conflicts_all": [],
+            "search": ["query"],
+            "range": ["from", "to"],
+            "free_slots": ["invitees", "from", "to"],
+            "stats": [],
+            "archived": [],
+            "rebuild": [],
+            "available": ["from", "to"]
+        } for t in TABLES
+    }
+    optionals: dict[str, dict[str, list[str]]] = {
+        t: {
+            "add": list(dbt.workers[t].optional_properties),
+            "update": [p for p in dbt.workers[t].properties
+                       | dbt.workers[t].optional_properties],
+            "info_all": list(dbt.Worker.page_properties),
+            "search": ["limit"],
+            "range": ["place_id", "invitees"],
+            "free_slots": ["duration", "place_id"],
+            "stats": ["from", "to"],
+            "archived": ["from", "to", "place_id"]
+            + list(dbt.Worker.page_properties),
+            "available": list(dbt.PlaceWorker.available_properties)
+        } for t in TABLES
     }
     possibles: dict[str, dict[str, list[str]]] = {
         t: {
-            a: (requirements[t][a]
-                if a != "update" else list(properties[t].keys()))
+            a: requirements[t][a] + [p for p in optionals[t].get(a, [])
+                                     if p not in requirements[t][a]]
             for a in requirements[t]
-        } for t in ["people", "events", "places"]
+        } for t in TABLES
     }
 
-    list_parse: list[str] = ["participates", "invitees"]
-    date_parse: list[str] = ["start_date", "end_date"]
-    int_parse: list[str] = ["street_number", "place_id", "id"]
+    list_parse: list[str] = ["participates", "invitees", "repeat_except",
+                             "weekdays", "places"]
+    date_parse: list[str] = ["start_date", "end_date", "from", "to",
+                             "repeat_until"]
+    int_parse: list[str] = ["street_number", "place_id", "id",
+                            "after_id", "limit", "duration",
+                            "repeat_every", "repeat_count"]
 
     parser: argparse.ArgumentParser = argparse.ArgumentParser(
         prog=sys.argv[0],
@@ -115,20 +198,65 @@ def parse() -> argparse.Namespace:
 
     parser.add_argument("-a", "--api", action="store_true",
                         help="Get data using API")
+    parser.add_argument("--db",
+                        help=f"Database URL used directly \
+                            (by default ${dbt.DB_URL_ENV} or {dbt.DB_URL})")
+    parser.add_argument("--merge_people", action="store_true",
+                        help="Merge people sharing an email \
+                            (case-insensitively) when upgrading a database \
+                                of an older version (the upgrade fails \
+                                    otherwise)")
 
     subparser_action = parser.add_subparsers(
         description="Action to be performed",
         required=True,
         dest="action",
-        help="add - adding new record, \
+        help="add - adding new record \
+            (events may repeat daily, weekly or monthly), \
             update - updating a record, \
             lookup - lookup a record with given name \
                 (unavailable through API), \
             info - get data of a record with given id, \
-            info_all - get data of all records (unavailable through API), \
-            delete - remove a record with given id")
-
-    for a in ["add", "update", "lookup", "info", "info_all", "delete"]:
+            info_all - get data of all records \
+                (or a page of them after given id), \
+            delete - remove a record with given id, \
+            collisions_all - get all pairs of colliding events, \
+            conflicts - get colliding events of a person or a place \
+                with given id, \
+            conflicts_all - get colliding events of all people or places, \
+            search - full-text search of records containing given words \
+                (or words starting with them), the best matching first, \
+            range - get events taking place in given time range \
+                (optionally in a place or with invitees), sorted by start, \
+            free_slots - find time slots in given time range \
+                free for all given people (and a place), \
+            stats - get numbers of events per place, person and day \
+                and booked hours per place (of events starting \
+                    in given time range), \
+            archived - get archived events taking place \
+                in given time range (or a page of them after given id), \
+            rebuild - regenerate the stored collisions of events \
+                from scratch, \
+            available - get places free in given time range \
+                (optionally only in given hours and days of the week), \
+            batch - perform many add, update and delete actions \
+                (JSON list of instructions) in one transaction, \
+            import - import records from CSV or JSONL file \
+                (unavailable through API), \
+            upsert - add or update people from CSV or JSONL file \
+                (matched by email), \
+            archive - move events ended before given date \
+                to the archive (unavailable through API), \
+            changes - get entries of the change log \
+                after given sequence number, \
+            compact - remove entries of the change log logged before \
+                given date followed by later ones of the same records \
+                    (unavailable through API), \
+            snapshot - save a columnar snapshot of events \
+                for analytics to a file (unavailable through API), \
+            export - export all records to CSV or JSONL file")
+
+    for a, tables in ACTIONS.items():
         subparser = subparser_action.add_parser(
             a, description=f"Performing action {a}")
         subsubp = subparser.add_subparsers(
@@ -138,7 +266,7 @@ def parse() -> argparse.Namespace:
             help="people - participants data (e.g. name, surname), \
                     events - events data (e.g. name, dates), \
                     places - places of the events data (e.g. name, street)")
-        for t in ["people", "events", "places"]:
+        for t in tables:
             subsubsubp = subsubp.add_parser(
                 t,
                 description=f"Performing action {a} on {t} table")
@@ -146,11 +274,121 @@ def parse() -> argparse.Namespace:
                 subsubsubp, properties[t], possibles[t][a],
                 requirements[t][a], list_parse, date_parse, int_parse)
 
+    batch = subparser_action.add_parser(
+        "batch", description="Performing a batch of add, update \
+            and delete actions in one transaction")
+    batch.add_argument(
+        "file", type=argparse.FileType("r"),
+        help="JSON file (or - for standard input) with a list \
+            of instructions, e.g. [{\"action\": \"add\", \
+                \"table\": \"places\", \"name\": \"University\", ...}]; \
+                    dates in format 'dd-mm-yyyy hh:mm'")
+
+    imp = subparser_action.add_parser(
+        "import", description="Importing records from CSV or JSONL file")
+    imp_tables = imp.add_subparsers(
+        description="Table to which records will be imported",
+        dest="table",
+        required=True)
+    for t in TABLES:
+        imp_table = imp_tables.add_parser(
+            t, description=f"Importing records to {t} table")
+        imp_table.add_argument(
+            "file", type=argparse.FileType("r"),
+            help="CSV file (with a header line) or JSONL file \
+                (or - for standard input) with properties of the records; \
+                    in CSV lists of ids are separated by spaces")
+        imp_table.add_argument(
+            "--format", choices=["csv", "jsonl"],
+            help="Format of the file (guessed from the file name by default)")
+        imp_table.add_argument(
+            "--chunk_size", type=int, default=sio.IMPORT_CHUNK,
+            help="Number of records inserted and committed at once")
+
+    ups = subparser_action.add_parser(
+        "upsert", description="Adding or updating records from CSV \
+            or JSONL file (matched by email)")
+    ups_tables = ups.add_subparsers(
+        description="Table to which records will be written",
+        dest="table",
+        required=True)
+    ups_table = ups_tables.add_parser(
+        "people", description="Adding or updating people")
+    ups_table.add_argument(
+        "file", type=argparse.FileType("r"),
+        help="CSV file (with a header line) or JSONL file \
+            (or - for standard input) with names, surnames and emails")
+    ups_table.add_argument(
+        "--format", choices=["csv", "jsonl"],
+        help="Format of the file (guessed from the file name by default)")
+    ups_table.add_argument(
+        "--chunk_size", type=int, default=dbt.PersonWorker.upsert_chunk,
+        help="Number of records written and committed at once")
+
+    arch = subparser_action.add_parser(
+        "archive", description="Moving events ended before given date \
+            (with their invitees) to the archive tables")
+    arch.add_argument(
+        "--before", type=parse_time, required=True,
+        help="Cutoff date ('dd-mm-yyyy hh:mm')")
+    arch.add_argument(
+        "--chunk_size", type=int, default=dbt.ARCHIVE_CHUNK,
+        help="Number of events moved in one transaction")
+
+    chg = subparser_action.add_parser(
+        "changes", description="Getting entries of the change log \
+            (added, updated and deleted records) in order")
+    chg.add_argument(
+        "--since", type=int, default=0,
+        help="Sequence number of the last entry already read")
+    chg.add_argument(
+        "--limit", type=int, default=dbt.CHANGES_LIMIT,
+        help="Maximum number of fetched entries")
+
+    cmp = subparser_action.add_parser(
+        "compact", description="Removing entries of the change log \
+            logged before given date followed by later ones \
+                of the same records")
+    cmp.add_argument(
+        "--before", type=parse_time, required=True,
+        help="Cutoff date ('dd-mm-yyyy hh:mm')")
+
+    snp = subparser_action.add_parser(
+        "snapshot", description="Saving a columnar snapshot of events \
+            (ids, places, invitees and occurrences) to a memory-mapped file")
+    snp.add_argument(
+        "file", help="Output file (replaced at once)")
+    snp.add_argument(
+        "--until", type=parse_time,
+        help="End of the expansion of recurring events ('dd-mm-yyyy hh:mm', \
+            by default the latest end of an event)")
+
+    exp = subparser_action.add_parser(
+        "export", description="Exporting all records to CSV or JSONL file")
+    exp_tables = exp.add_subparsers(
+        description="Table which records will be exported",
+        dest="table",
+        required=True)
+    for t in TABLES:
+        exp_table = exp_tables.add_parser(
+            t, description=f"Exporting records of {t} table")
+        exp_table.add_argument(
+            "file", type=argparse.FileType("wb"),
+            help="Output file (or - for standard output)")
+        exp_table.add_argument(
+            "--format", choices=["csv", "jsonl"],
+            help="Format of the file (guessed from the file name by default)")
+        exp_table.add_argument(
+            "--gzip", action="store_true",
+            help="Compress the file with gzip \
+                (by default if the file name ends with .gz)")
+
     args: argparse.Namespace = parser.parse_args()
     return args
 
 
-def api_access(instr: dict[str, Any]) -> dict[str, Any] | list[dict[str, Any]]:
+def api_access(instr: dict[str, Any]) -> dict[str, Any] \
+        | Iterable[dict[str, Any]]:
     """Access database through API.
 
     Arguments:
@@ -163,10 +401,45 @@ def api_access(instr: dict[str, Any]) -> dict[str, Any] | list[dict[str, Any]]:
     table = instr["table"]
 
     # fixing format
-    if "start_date" in instr and instr["start_date"] is not None:
-        instr["start_date"] = instr["start_date"].strftime("%d-%m-%Y %H:%M")
-    if "end_date" in instr and instr["end_date"] is not None:
-        instr["end_date"] = instr["end_date"].strftime("%d-%m-%Y %H:%M")
+    for p in ["start_date", "end_date", "from", "to", "repeat_until"]:
+        if p in instr and instr[p] is not None:
+            instr[p] = instr[p].strftime("%d-%m-%Y %H:%M")
+
+    if action == "info_all":
+        return api_pages(instr)
+
+    if action == "search":
+        res_search: requests.Response = requests.get(
+            SERVER+"search", params={"table": table, "query": instr["query"],
+                                     "limit": instr["limit"]})
+        return res_search.json()
+
+    if action in ["range", "free_slots", "available"]:
+        res_range: requests.Response = requests.get(
+            SERVER+table+"/"+action+"/", params=instr)
+        return res_range.json()
+
+    if action == "stats":
+        res_stats: requests.Response = requests.get(
+            SERVER+"stats", params={"from": instr["from"],
+                                    "to": instr["to"]})
+        return res_stats.json()
+
+    if action == "archived":
+        res_archived: requests.Response = requests.get(
+            SERVER+table+"/archived/", params=instr)
+        return res_archived.json()
+
+    if action == "rebuild":
+        res_rebuild: requests.Response = requests.post(
+            SERVER+table+"/collisions/")
+        return res_rebuild.json()
+
+    if action in STREAMED:
+        res_stream: requests.Response = requests.get(
+            SERVER+table+"/"+STREAMED[action], params=instr, stream=True)
+        return (json.loads(line) for line in res_stream.iter_lines()
+                if line)
 
     reqs: dict[str, Any] = {
         "add": requests.put,
@@ -180,8 +453,43 @@ def api_access(instr: dict[str, Any]) -> dict[str, Any] | list[dict[str, Any]]:
     return res.json()
 
 
+def api_pages(instr: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    """Fetch records of a table through API page by page \
+        (keyset pagination with the id of the last fetched record \
+            as the cursor) and yield them one by one.
+
+    Arguments:
+
+    - `instr` -- dictionary containing parameters of the database query \
+        (`table` and optional `after_id` and `limit`)
+    """
+
+    cursor = instr.get("after_id")
+    remaining = instr.get("limit")
+
+    while remaining is None or remaining > 0:
+        limit = PAGE_SIZE if remaining is None else min(remaining, PAGE_SIZE)
+        params: dict[str, Any] = {"all": 1, "limit": limit}
+        if cursor is not None:
+            params["cursor"] = cursor
+        res: requests.Response = requests.get(
+            SERVER+instr["table"]+"/", params=params, stream=True)
+
+        fetched = 0
+        for line in res.iter_lines():
+            if line:
+                r = json.loads(line)
+                cursor = r["id"]
+                fetched += 1
+                yield r
+        if fetched < limit:
+            return
+        if remaining is not None:
+            remaining -= fetched
+
+
 def direct_access(instr: dict[str, Any]) -> dict[str, Any] \
-        | list[dict[str, Any]]:
+        | Iterable[dict[str, Any]]:
     """Directly access the database.
 
     Arguments:
@@ -190,10 +498,101 @@ def direct_access(instr: dict[str, Any]) -> dict[str, Any] \
         (`action`, `table` and parameters required by the database function)
     """
 
+    if instr["action"] == "info_all":
+        return dbt.act_stream(dict(instr, action="info_stream"))
+
+    if instr["action"] in STREAMED:
+        return dbt.act_stream(instr)
+
     s = dbt.act(instr)
     return s
 
 
+def export(instr: dict[str, Any]) -> None:
+    """Export a table to a file - directly or through API.
+
+    Arguments:
+
+    - `instr` - dictionary with `api`, `table`, `file` \
+        (file opened for writing in binary mode), `format` and `gzip`
+    """
+
+    if not instr["api"]:
+        sio.export_file(instr["table"], instr["file"],
+                        instr["format"], instr["gzip"])
+        return
+
+    name = getattr(instr["file"], "name", "")
+    name = name if isinstance(name, str) else ""
+    compress = instr["gzip"] or name.endswith(".gz")
+    format = instr["format"] or \
+        ("csv" if name.removesuffix(".gz").endswith(".csv") else "jsonl")
+
+    params: dict[str, Any] = {"format": format}
+    if compress:
+        params["gzip"] = 1
+    res: requests.Response = requests.get(
+        SERVER+"export/"+instr["table"], params=params, stream=True)
+    for chunk in res.iter_content(chunk_size=None):
+        instr["file"].write(chunk)
+    instr["file"].flush()
+
+
+def batch(instr: dict[str, Any]) -> list[dict[str, Any]]:
+    """Perform a batch of instructions read from a JSON file \
+        - directly or through API.
+
+    Arguments:
+
+    - `instr` - dictionary with `api` and `file` \
+        (opened JSON file with a list of instructions)
+    """
+
+    instrs: list[dict[str, Any]] = json.load(instr["file"])
+
+    if instr["api"]:
+        res: requests.Response = requests.post(SERVER+"batch", json=instrs)
+        return res.json()
+
+    for i in instrs:
+        for p in ["start_date", "end_date", "repeat_until"]:
+            if isinstance(i.get(p), str):
+                i[p] = parse_time(i[p])
+    return dbt.act_many(instrs)
+
+
+def upsert(instr: dict[str, Any]) -> dict[str, Any]:
+    """Add or update people from a CSV or JSONL file - directly \
+        or through API (each chunk of rows sent as a batch \
+            of `upsert` instructions). Return a summary \
+                (see `sio.upsert_rows`).
+
+    Arguments:
+
+    - `instr` - dictionary with `api`, `file`, `format` and `chunk_size`
+    """
+
+    if not instr["api"]:
+        return sio.upsert_file(instr["file"], instr["format"],
+                               instr["chunk_size"])
+
+    format = instr["format"] or ("csv" if instr["file"].name.endswith(".csv")
+                                 else "jsonl")
+    summary: dict[str, Any] = {"table": "people", "created": 0,
+                               "updated": 0, "unchanged": 0, "errors": []}
+    rows = enumerate(sio.read_rows(instr["file"], format), 1)
+    while chunk := list(itertools.islice(rows, instr["chunk_size"])):
+        res: requests.Response = requests.post(SERVER+"batch", json=[
+            dict(row, table="people", action="upsert") for _, row in chunk])
+        for (n, _), r in zip(chunk, res.json()):
+            if r["ok"]:
+                summary[r["status"]] += 1
+            else:
+                summary["errors"].append({"row": n, "error": r["error"]})
+    summary["failed"] = len(summary["errors"])
+    return summary
+
+
 def eval(instr: dict[str, Any]) -> None:
     """Evaluate given instruction.
 
@@ -204,6 +603,50 @@ def eval(instr: dict[str, Any]) -> None:
             required by the database function)
     """
 
+    if instr["action"] == "batch":
+        prt.printer(batch(instr), "batch")
+        return
+
+    if instr["action"] == "export":
+        export(instr)
+        return
+
+    if instr["action"] == "archive":
+        prt.printer(dbt.archive(instr["before"], instr["chunk_size"]),
+                    "archive")
+        return
+
+    if instr["action"] == "changes":
+        if instr["api"]:
+            res: requests.Response = requests.get(
+                SERVER+"changes", params={"since": instr["since"],
+                                          "limit": instr["limit"]})
+            prt.printer(res.json(), "changes")
+        else:
+            prt.printer(dbt.changes(instr["since"], instr["limit"]),
+                        "changes")
+        return
+
+    if instr["action"] == "compact":
+        prt.printer(dbt.compact_changes(instr["before"]), "compact")
+        return
+
+    if instr["action"] == "upsert":
+        prt.printer(upsert(instr), "upsert")
+        return
+
+    if instr["action"] == "snapshot":
+        snapshot = sst.Snapshot.load(instr["until"])
+        snapshot.save(instr["file"])
+        prt.printer(dict(snapshot.summary(), file=instr["file"]), "snapshot")
+        return
+
+    if instr["action"] == "import":
+        prt.printer(sio.import_file(instr["table"], instr["file"],
+                                    instr["format"], instr["chunk_size"]),
+                    "import")
+        return
+
     table = instr["table"]
     api = instr["api"]
 
@@ -212,15 +655,23 @@ def eval(instr: dict[str, Any]) -> None:
     else:
         s = direct_access(instr)
 
-    prt.printer(s, table)
+    prt.printer(s, PRINTED_AS.get(instr["action"], table))
 
 
 def main():
     args = vars(parse())
     # print("Parsed args", args, "\n-------------------------\n")
+    if args["db"] is not None:
+        dbt.configure(url=args["db"])
+    if args["merge_people"]:
+        dbt.configure(merge_people=True)
 
     eval(args)
 
+    # exported records written to standard output end the output
+    if args["action"] == "export" and args["file"] is sys.stdout.buffer:
+        return
+
     print("-------------------------\n\
 | Successfully executed |\n\
 -------------------------")
@@ -12,10 +12,89 @@ from sqlalchemy import Table, Column, Integer, ForeignKey, String, \
 from sqlalchemy.orm import relationship, mapped_column, Mapped
 from typing import List
 from sqlalchemy.orm import validates
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine, Engine, Index, Connection, inspect, \
+    table, column, text, select, Row, event, or_, literal_column, \
+    exists, func, and_, delete, insert, literal
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker, selectinload, joinedload, \
+    Query, InstrumentedAttribute, MANYTOONE, InstanceState
+from sqlalchemy.sql import Select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import Pool
 import datetime
-from typing import Any
+import functools
+import heapq
+import itertools
+import logging
+import operator
+import os
+import abc
+import collections
+import contextlib
+import threading
+import time
+import types
+import weakref
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+from sch_recurrence_tools import Recurrence, FREQUENCIES, FOREVER, \
+    parse_exceptions
+import sch_occupancy_tools as sot
+
+
+DB_URL_ENV = "SCHEDULE_DB_URL"
+"""Environment variable overriding the default database URL."""
+
+DB_URL = os.environ.get(DB_URL_ENV, "sqlite:///schedule.db")
+"""URL of the database used by `init` and `act` \
+    (see `configure` and `DB_URL_ENV`)."""
+
+MERGE_PEOPLE = False
+"""Whether people sharing an email are merged when the unique index \
+    of emails is added to an older database (see `upgrade_schema` \
+        and `configure`) - otherwise the upgrade fails."""
+
+logger = logging.getLogger(__name__)
+"""Logger of changes made to the data by schema upgrades."""
+
+POOL_OPTIONS: dict[str, Any] = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_timeout": 30,
+    "pool_recycle": -1
+}
+"""Options of the connection pool passed to `create_engine` \
+    (for file-backed databases only, see `pool_options`)."""
+
+SQLITE_PRAGMAS: dict[str, Any] = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "busy_timeout": 5000
+}
+"""Pragmas set on every pooled SQLite connection: \
+    write-ahead log (readers do not block behind a writer), \
+        sync on checkpoints only, memory-mapped reads (bytes), \
+            page cache (negative - in KiB) and waiting for locks (ms)."""
+
+CACHE_OPTIONS: dict[str, Any] = {
+    "maxsize": 10000,
+    "ttl": 60.0
+}
+"""Options of the result cache of `act` (see `ResultCache`)."""
+
+OCCUPANCY_OPTIONS: dict[str, Any] = {
+    "resolution": 15,
+    "block_days": 7
+}
+"""Options of booked slots of places (see `sot.Occupancy`) \
+    - length of a slot in minutes and number of days in one block."""
+
+_engine: Engine | None = None
+_write_engine: Engine | None = None
+_session_factory: sessionmaker[Session] | None = None
+_engine_lock = threading.Lock()
 
 
 class Base(DeclarativeBase):
@@ -25,8 +104,9 @@ class Base(DeclarativeBase):
 participation = Table(
     "person_event",
     Base.metadata,
-    Column("event_id", ForeignKey("Events.id")),
-    Column("person_id", ForeignKey("People.id")))
+    Column("event_id", ForeignKey("Events.id"), primary_key=True),
+    Column("person_id", ForeignKey("People.id"), primary_key=True),
+    Index("ix_person_event_person", "person_id", "event_id"))
 
 
 class Event(Base):
@@ -34,15 +114,23 @@ class Event(Base):
 
     Apart from properties explicitly mentioned below `Event` objects \
         may also contain `collides` property \
-            informing about time collisions with other events.
+            informing about time collisions with other events \
+                (read from `event_collisions`).
     """
     __tablename__ = "Events"
     __allow_unmapped__ = True
+    __table_args__ = (
+        Index("ix_events_start_end", "start_date", "end_date"),
+        Index("ix_events_place", "place_id", "start_date", "end_date"),
+        # ids of deleted (and archived) events are never reused
+        {"sqlite_autoincrement": True}
+    )
 
     id: MappedColumn[Any] = mapped_column(Integer, primary_key=True)
     """Id of the event (integer), primary key. Automatically generated."""
 
-    name: MappedColumn[Any] = mapped_column(String, nullable=False)
+    name: MappedColumn[Any] = mapped_column(String, nullable=False,
+                                            index=True)
     """Name of the event. Must not be empty."""
 
     start_date: MappedColumn[Any] = mapped_column(DateTime, nullable=False)
@@ -65,6 +153,29 @@ class Event(Base):
     place: Mapped[Place] = relationship("Place", back_populates="hosts_event")
     """`Place` object - place of the event"""
 
+    repeat: MappedColumn[Any] = mapped_column(String, nullable=True)
+    """Frequency of a recurring event - one of `FREQUENCIES` \
+        (`None` for a single event)."""
+
+    repeat_every: MappedColumn[Any] = mapped_column(Integer, nullable=True)
+    """Number of days, weeks or months between occurrences \
+        (1 if not given). Must be a positive integer."""
+
+    repeat_count: MappedColumn[Any] = mapped_column(Integer, nullable=True)
+    """Maximal number of occurrences. Must be a positive integer."""
+
+    repeat_until: MappedColumn[Any] = mapped_column(DateTime, nullable=True)
+    """Maximal start of an occurrence \
+        (must not be given together with `repeat_count`)."""
+
+    repeat_except: MappedColumn[Any] = mapped_column(String, nullable=True)
+    """Dates of skipped occurrences (ISO format, separated by spaces)."""
+
+    series_end: MappedColumn[Any] = mapped_column(DateTime, nullable=True)
+    """End of the last occurrence of a recurring event \
+        (`FOREVER` if it is repeated forever, `None` for a single event). \
+            Computed automatically (see `series_end`)."""
+
     collides: list[Event]
 
     def serialize_basic(self: Event) -> dict[str, Any]:
@@ -73,7 +184,7 @@ class Event(Base):
                 and `Place` object from `place` \
                 will *not* be serialized)."""
 
-        return {k: v for k, v in vars(self).items() if not k.startswith('_')}
+        return serializer(type(self))(self)
 
     def serialize(self: Event) -> dict[str, Any]:
         """Recursively serialize:
@@ -148,6 +259,96 @@ class Event(Base):
 
         return field
 
+    @validates("repeat")
+    def validate_repeat(self: Event, key: str, repeat: str | None) \
+            -> str | None:
+        """Check if the `repeat` is one of `FREQUENCIES` (or `None`).
+
+        Arguments:
+
+        - `self` - `Event` object
+        - `key` - always equal to `"repeat"` \
+            (as the method is automatically invoked by the database)
+        - `repeat` - value of the `repeat` property"""
+
+        if repeat is not None and repeat not in FREQUENCIES:
+            raise ValueError(
+                f"Repeat must be one of: {', '.join(FREQUENCIES)}")
+        return repeat
+
+    @validates("repeat_every", "repeat_count", "repeat_until")
+    def validate_repeat_limits(self: Event, key: str, field: Any) -> Any:
+        """Check if the `repeat_every` and `repeat_count` \
+            are positive integers and if only one of `repeat_count` \
+                and `repeat_until` is given.
+
+        Arguments:
+
+        - `self` - `Event` object
+        - `key` - name of the validated property \
+            (as the method is automatically invoked by the database)
+        - `field` - value of the property"""
+
+        if field is None:
+            return field
+        if key in ("repeat_every", "repeat_count") \
+                and (not isinstance(field, int) or field <= 0):
+            raise ValueError(f"{key} must be positive number")
+        other = "repeat_until" if key == "repeat_count" else "repeat_count"
+        if key != "repeat_every" and getattr(self, other) is not None:
+            raise ValueError(
+                "Repeat count and repeat until cannot be given together")
+        return field
+
+    @validates("repeat_except")
+    def validate_repeat_except(self: Event, key: str, field: Any) \
+            -> str | None:
+        """Normalize dates of skipped occurrences \
+            (see `sch_recurrence_tools.parse_exceptions`) \
+                to a string of sorted dates in ISO format.
+
+        Arguments:
+
+        - `self` - `Event` object
+        - `key` - always equal to `"repeat_except"` \
+            (as the method is automatically invoked by the database)
+        - `field` - string of dates separated by spaces or list of dates"""
+
+        dates = parse_exceptions(field)
+        return " ".join(d.isoformat() for d in dates) if dates else None
+
+
+def series_end(e: Any) -> datetime.datetime | None:
+    """Return the end of the last occurrence of a recurring event \
+        (`None` for a single event).
+
+    Arguments:
+
+    - `e` - `Event` object or dictionary with the same keys"""
+
+    if isinstance(e, dict):
+        e = types.SimpleNamespace(**e)
+    if e.repeat is None:
+        return None
+    return Recurrence.of(e).end()
+
+
+@event.listens_for(Event, "before_insert")
+@event.listens_for(Event, "before_update")
+def set_series_end(mapper: Any, connection: Connection, target: Event) \
+        -> None:
+    """Compute `series_end` of a flushed event."""
+
+    target.series_end = series_end(target)
+
+
+recurrence_columns = (Event.repeat, Event.repeat_every, Event.repeat_count,
+                      Event.repeat_until, Event.repeat_except)
+"""Columns needed by `Recurrence.of` (besides the dates)."""
+
+last_end = func.coalesce(Event.series_end, Event.end_date)
+"""End of the last occurrence of an event (recurring or not)."""
+
 
 class Place(Base):
     """Class of places where the events are held."""
@@ -156,7 +357,8 @@ class Place(Base):
     id: MappedColumn[Any] = mapped_column(Integer, primary_key=True)
     """Id of the place (integer), primary key. Automatically generated."""
 
-    name: MappedColumn[Any] = mapped_column(String, nullable=False)
+    name: MappedColumn[Any] = mapped_column(String, nullable=False,
+                                            index=True)
     """Name of the place. Must not be empty."""
 
     street_name: MappedColumn[Any] = mapped_column(String, nullable=False)
@@ -174,7 +376,7 @@ class Place(Base):
             (`Event` objects from `hosts_event` list \
                 will *not* be serialized)."""
 
-        return {k: v for k, v in vars(self).items() if not k.startswith('_')}
+        return serializer(type(self))(self)
 
     def serialize(self: Place) -> dict[str, Any]:
         """Recursively serialize:
@@ -232,11 +434,14 @@ class Person(Base):
     name: MappedColumn[Any] = mapped_column(String, nullable=False)
     """Name of the person."""
 
-    surname: MappedColumn[Any] = mapped_column(String, nullable=False)
+    surname: MappedColumn[Any] = mapped_column(String, nullable=False,
+                                               index=True)
     """Surname of the person. Must not be empty."""
 
-    email: MappedColumn[Any] = mapped_column(String, nullable=False)
-    """Email of the person. Must contain `@` character."""
+    email: MappedColumn[Any] = mapped_column(String, nullable=False,
+                                             index=True, unique=True)
+    """Email of the person. Must contain `@` character. Unique \
+        (people are matched by email by `PersonWorker.upsert_many`)."""
 
     participates: Mapped[List[Event]] = relationship(
         secondary=participation, back_populates="invitees")
@@ -247,7 +452,7 @@ class Person(Base):
             (`Event` objects from `participates` list \
                 will *not* be serialized)."""
 
-        return {k: v for k, v in vars(self).items() if not k.startswith('_')}
+        return serializer(type(self))(self)
 
     def serialize(self: Person) -> dict[str, Any]:
         """Recursively serialize:
@@ -292,312 +497,2164 @@ class Person(Base):
         return email
 
 
-# DB workers ---------------------------
+# Interval index ---------------------------
 
-class Worker():
-    """Base class for database workers - performing actions on database."""
+interval_index = table("events_rtree", column("id"),
+                       column("start_ts"), column("end_ts"))
+"""SQLite R*Tree virtual table indexing `[start_date, last_end]` \
+    intervals of events (as Unix timestamps), keyed by event id \
+        (recurring events are indexed with the span of all occurrences). \
+            Kept in sync with the `Events` table by triggers."""
 
-    def __init__(self: Worker, dict: dict[str, Any],
-                 properties: dict[str, Any]) -> None:
-        """Initialize a worker - set attributes listed in `properties` \
-            basing on the dictionary `dict` \
-                (`dict` *must* contain all properties from `properties`)."""
+_EPOCH = datetime.datetime(1970, 1, 1)
 
-        for prop in properties:
-            setattr(self, prop, dict[prop] if prop in dict else None)
+bulk_loads = Table(
+    "bulk_loads",
+    Base.metadata,
+    Column("id", Integer, primary_key=True))
+"""Insert triggers of `interval_index` and of the FTS5 tables skip rows \
+    while this table is not empty - it has a row only inside a transaction \
+        loading rows in bulk (see `deferred_indexes`), \
+            so other connections never see it."""
+
+_interval_rows = """SELECT id, (julianday(start_date) - 2440587.5) * 86400.0,
+                (julianday(COALESCE(series_end, end_date))
+                    - 2440587.5) * 86400.0
+            FROM Events"""
+"""Rows of `interval_index` for all events."""
+
+_interval_index_ddl = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS events_rtree
+    USING rtree(id, start_ts, end_ts)""",
+    # triggers of older versions ignored series_end and bulk loads
+    "DROP TRIGGER IF EXISTS events_rtree_insert",
+    "DROP TRIGGER IF EXISTS events_rtree_update",
+    """CREATE TRIGGER events_rtree_insert
+    AFTER INSERT ON Events
+    WHEN NOT EXISTS (SELECT 1 FROM bulk_loads) BEGIN
+        INSERT INTO events_rtree VALUES (
+            new.id,
+            (julianday(new.start_date) - 2440587.5) * 86400.0,
+            (julianday(COALESCE(new.series_end, new.end_date))
+                - 2440587.5) * 86400.0);
+    END""",
+    """CREATE TRIGGER events_rtree_update
+    AFTER UPDATE OF start_date, end_date, series_end ON Events BEGIN
+        UPDATE events_rtree SET
+            start_ts = (julianday(new.start_date) - 2440587.5) * 86400.0,
+            end_ts = (julianday(COALESCE(new.series_end, new.end_date))
+                - 2440587.5) * 86400.0
+        WHERE id = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS events_rtree_delete
+    AFTER DELETE ON Events BEGIN
+        DELETE FROM events_rtree WHERE id = old.id;
+    END"""
+]
+
+_interval_indexed_pools: weakref.WeakSet[Pool] = weakref.WeakSet()
+"""Connection pools of engines maintaining `interval_index` \
+    (shared with their versions for writing sessions, see `init`)."""
+
+
+def timestamp(date: datetime.datetime) -> float:
+    """Convert a naive `datetime.datetime` object \
+        to the Unix timestamp used by `interval_index`."""
+
+    return (date - _EPOCH).total_seconds()
+
+
+def create_interval_index(connection: Connection) -> bool:
+    """Create `interval_index` with its triggers \
+        (if they do not exist yet) and fill it with the existing events. \
+            Return `False` if the database does not support R*Tree \
+                (collision checks then use `ix_events_start_end` only).
 
-    def updateWorker(self: Worker, p: Base | None,
-                     properties: dict[str, Any]) -> None:
-        """Update a database object - set attributes of `p` \
-            listed in `properties` basing on the `self` properties \
-                (`self` *does not have to* contain all properties \
-                    from `properties`).
+    Arguments:
 
-        Arguments:
+    - `connection` - `sqlalchemy.Connection` object"""
+
+    if connection.dialect.name != "sqlite":
+        return False
+    exists = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE name = 'events_rtree'")).first()
+    try:
+        for ddl in _interval_index_ddl:
+            connection.execute(text(ddl))
+    except OperationalError:
+        return False
+    if exists is None:
+        connection.execute(text(f"INSERT INTO events_rtree {_interval_rows}"))
+    return True
+
+
+def upgrade_schema(connection: Connection) -> None:
+    """Upgrade a database created by an older version in place \
+        (`create_all` does not alter existing tables):
+
+    - add the primary key `(event_id, person_id)` to `person_event` \
+        (the table is rebuilt, duplicated links are dropped)
+    - add missing (nullable) columns, e.g. recurrence of events
+    - rebuild `Events` with `AUTOINCREMENT` ids \
+        (see `add_autoincrement`)
+    - check that no people share an email (compared case-insensitively, \
+        see `duplicate_people`) before the unique index of emails \
+            is created - they are merged (see `merge_people`) \
+                if `MERGE_PEOPLE` is set, otherwise `ValueError` is raised
+    - create missing indexes (see `create_indexes`)
 
-        - `self` - `Worker` object
-        - `p` - `Base` object (`Event`, `Place` or `Person`) \
-            which will be updated
-        - `properties` - dictionary of possible properties """
+    Arguments:
 
-        for prop in properties:
-            self_prop = getattr(self, prop)
-            if self_prop is not None:
-                setattr(p, prop, self_prop)
+    - `connection` - `sqlalchemy.Connection` object"""
+
+    if connection.dialect.name == "sqlite":
+        columns = connection.exec_driver_sql(
+            "PRAGMA table_info(person_event)").all()
+        if not any(c.pk for c in columns):
+            connection.exec_driver_sql(
+                "ALTER TABLE person_event RENAME TO person_event_old")
+            for index in participation.indexes:
+                connection.exec_driver_sql(
+                    f"DROP INDEX IF EXISTS {index.name}")
+            participation.create(connection)
+            connection.exec_driver_sql(
+                """INSERT OR IGNORE INTO person_event (event_id, person_id)
+                SELECT event_id, person_id FROM person_event_old
+                WHERE event_id IS NOT NULL AND person_id IS NOT NULL""")
+            connection.exec_driver_sql("DROP TABLE person_event_old")
+    add_columns(connection)
+    if connection.dialect.name == "sqlite":
+        add_autoincrement(connection)
+    if "ix_People_email" not in {
+            i["name"] for i in inspect(connection).get_indexes("People")}:
+        duplicates = duplicate_people(connection)
+        if duplicates and not MERGE_PEOPLE:
+            kept, ids = next(iter(duplicates.items()))
+            raise ValueError(
+                f"{sum(map(len, duplicates.values()))} people share emails "
+                f"with others (e.g. ids {[kept, *ids]}) - fix the emails "
+                f"or merge the people (configure(merge_people=True) "
+                f"or --merge_people option of the client)")
+        merge_people(connection, duplicates)
+    create_indexes(connection)
+
+
+def add_columns(connection: Connection) -> None:
+    """Add nullable columns of `Base.metadata` missing in the database \
+        (`create_all` does not alter existing tables).
 
+    Arguments:
 
-class PersonWorker(Worker):
-    """Worker for `Person` class. \
-        Performs adding, updating, \
-            fetching info about one or all `Person` objects, \
-                looking up `Person` objects with particular surname \
-                    and deleting."""
+    - `connection` - `sqlalchemy.Connection` object"""
 
-    properties = {"id": "Person id",
-                  "name": "Person name",
-                  "surname": "Person surname",
-                  "email": "Person email",
-                  "participates":
-                  "List of event ids in which this person participates"}
-    """Dictionary with description of the properties \
-        of the `Person` objects."""
+    inspector = inspect(connection)
+    for t in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(t.name)}
+        for c in t.columns:
+            if c.name not in existing and c.nullable:
+                connection.exec_driver_sql(
+                    f'ALTER TABLE "{t.name}" ADD COLUMN "{c.name}" '
+                    f'{c.type.compile(connection.dialect)}')
 
-    list_properties = ["participates"]
-    """List of `Person` properties that are lists."""
 
-    id: int | None
-    name: str | None
-    surname: str | None
-    email: str | None
-    participates: list[int] | list[Event]
+def add_autoincrement(connection: Connection) -> None:
+    """Rebuild `Events` table of an SQLite database created \
+        without `AUTOINCREMENT` - rows keep their ids (so links, \
+            collisions and the interval and search indexes stay valid) \
+                and the sequence of ids starts after the greatest id \
+                    of live and archived events. Triggers of the indexes \
+                        are created again by `create_interval_index` \
+                            and `create_search_index`.
 
-    def __init__(self: PersonWorker, dict: dict[str, Any]):
-        super().__init__(dict, PersonWorker.properties)
+    Arguments:
 
-    def add(self: PersonWorker, session: Session) -> Person:
-        """Add a `Person` object to a database \
-            basing on `self` properties. Return created `Person` object.
+    - `connection` - `sqlalchemy.Connection` object (in a transaction)"""
+
+    sql = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' "
+        "AND name = 'Events'").scalar()
+    if sql is None or "AUTOINCREMENT" in sql.upper():
+        return
+
+    events: Table = Event.__table__  # type: ignore[assignment]
+    # references of other tables to Events are kept
+    connection.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+    connection.exec_driver_sql('ALTER TABLE "Events" RENAME TO events_old')
+    connection.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+    for index in events.indexes:
+        connection.exec_driver_sql(f'DROP INDEX IF EXISTS "{index.name}"')
+    events.create(connection)
+    columns = ", ".join(f'"{c.name}"' for c in events.columns)
+    connection.exec_driver_sql(
+        f'INSERT INTO "Events" ({columns}) SELECT {columns} FROM events_old')
+    connection.exec_driver_sql(
+        "DELETE FROM sqlite_sequence WHERE name = 'Events'")
+    connection.exec_driver_sql(
+        """INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'Events', COALESCE(MAX(id), 0) FROM (
+            SELECT id FROM events_old
+            UNION ALL SELECT id FROM events_archive)""")
+    connection.exec_driver_sql("DROP TABLE events_old")
+
+
+def duplicate_people(connection: Connection) -> dict[int, list[int]]:
+    """Return ids of people sharing an email (compared case-insensitively) \
+        with a person with a lower id - by the lowest id.
 
-        Arguments:
+    Arguments:
 
-        - `self` - `PersonWorker` object
-        - `session` - `sqlalchemy.orm.Session` object"""
+    - `connection` - `sqlalchemy.Connection` object"""
 
-        p = Person(name=self.name, surname=self.surname, email=self.email)
-        events_db = session.query(Event).filter(
-            Event.id.in_(self.participates)).all()
-        p.participates = events_db
-        session.add(p)
-        session.flush()
-        return p
+    people: Table = Person.__table__  # type: ignore[assignment]
+    email = func.lower(people.c.email)
+    first = select(func.min(people.c.id).label("id"), email.label("email"))\
+        .group_by(email).having(func.count() > 1).subquery()
+    duplicates: dict[int, list[int]] = {}
+    for id, kept in connection.execute(
+            select(people.c.id, first.c.id)
+            .join(first, email == first.c.email)
+            .where(people.c.id != first.c.id).order_by(people.c.id)):
+        duplicates.setdefault(kept, []).append(id)
+    return duplicates
 
-    def update(self: PersonWorker, session: Session) -> Person | None:
-        """Update a `Person` object in a database \
-            basing on `self` properties. Return updated `Person` object.
 
-        Arguments:
+def merge_people(connection: Connection,
+                 duplicates: dict[int, list[int]]) -> None:
+    """Merge people sharing an email (see `duplicate_people`) into the one \
+        with the lowest id - links of the others to events (also archived \
+            ones) are moved to that person and the others are deleted \
+                (and logged in `change_log` and by `logger`).
 
-        - `self` - `PersonWorker` object
-        - `session` - `sqlalchemy.orm.Session` object"""
+    Arguments:
 
-        if self.participates is not None:
-            self.participates = session.query(Event).filter(
-                Event.id.in_(self.participates)).all()
-        p = session.query(Person).filter(Person.id == self.id).first()
-        super().updateWorker(p, PersonWorker.properties)
-        session.flush()
-        return p
+    - `connection` - `sqlalchemy.Connection` object
+    - `duplicates` - ids of merged people by the id of the kept person"""
+
+    people: Table = Person.__table__  # type: ignore[assignment]
+    for kept, ids in duplicates.items():
+        log_changes(connection, Event, connection.scalars(
+            select(participation.c.event_id.distinct())
+            .where(participation.c.person_id.in_(ids))), "update")
+        for links in [participation, participation_archive]:
+            other = links.alias()
+            connection.execute(insert(links).from_select(
+                ["event_id", "person_id"],
+                select(links.c.event_id, literal_column(str(kept)))
+                .where(links.c.person_id.in_(ids), ~exists().where(
+                    other.c.event_id == links.c.event_id,
+                    other.c.person_id == kept))
+                .distinct()))
+            connection.execute(delete(links)
+                               .where(links.c.person_id.in_(ids)))
+        connection.execute(delete(people).where(people.c.id.in_(ids)))
+        log_changes(connection, Person, [kept], "update")
+        log_changes(connection, Person, ids, "delete")
+        logger.warning("Merged people %s sharing an email into person %d",
+                       ids, kept)
+
+
+def create_indexes(connection: Connection) -> None:
+    """Create indexes of `Base.metadata` missing in the database \
+        (`create_all` creates indexes only together with new tables).
 
-    def info(self: PersonWorker, session: Session) -> Person | None:
-        """Get info about a `Person` object from a database \
-            with `id` equal to `self.id`. Return `Person` object.
+    Arguments:
 
-        Arguments:
+    - `connection` - `sqlalchemy.Connection` object"""
 
-        - `self` - `PersonWorker` object
-        - `session` - `sqlalchemy.orm.Session` object"""
+    for t in Base.metadata.sorted_tables:
+        for index in t.indexes:
+            index.create(connection, checkfirst=True)
 
-        p = session.query(Person).filter(Person.id == self.id).first()
-        return p
 
-    def info_all(self: PersonWorker, session: Session) -> list[Person]:
-        """Get info about all `Person` objects from a database. \
-            Return list of `Person` objects.
+def has_interval_index(session: Session) -> bool:
+    """Check if the engine of `session` maintains `interval_index`.
 
-        Arguments:
+    Arguments:
 
-        - `self` - `PersonWorker` object
-        - `session` - `sqlalchemy.orm.Session` object"""
+    - `session` - `sqlalchemy.orm.Session` object"""
 
-        people = session.query(Person).all()
-        return people
+    return session.get_bind().pool in _interval_indexed_pools
 
-    def lookup(self: PersonWorker, session: Session) -> list[Person]:
-        """Get info about all `Person` objects \
-            with `surname` equal to `self.surname`. \
-                Return list of `Person` objects.
 
-        Arguments:
+# Collision table ---------------------------
 
-        - `self` - `PersonWorker` object
-        - `session` - `sqlalchemy.orm.Session` object"""
+event_collisions = Table(
+    "event_collisions",
+    Base.metadata,
+    Column("event_id", ForeignKey("Events.id"), primary_key=True),
+    Column("other_id", ForeignKey("Events.id"), primary_key=True),
+    Index("ix_event_collisions_other", "other_id"))
+"""Materialized pairs of colliding events (each pair in both orders, \
+    so collisions of an event are one range of the primary key). \
+        Kept up to date on flushes (see `store_collisions`) \
+            and regenerated from scratch by `rebuild_collisions`."""
+
+collision_columns = ("start_date", "end_date", "series_end",
+                     *(c.key for c in recurrence_columns))
+"""Columns of `Event` which changes affect its collisions."""
+
+
+def collision_pairs(connection: Connection, ids: Iterable[int]) \
+        -> set[tuple[int, int]]:
+    """Return pairs `(id, other id)` of colliding events \
+        for events with given ids (pairs of two given events in both orders). \
+            Events overlapping the span of all occurrences are joined \
+                with one query per chunk of `id_chunks` \
+                    (through `interval_index` if available), pairs \
+                        of recurring events are then checked \
+                            with `recurring_collisions`.
 
-        people = session.query(Person).filter(
-            Person.surname == self.surname).all()
-        return people
+    Arguments:
 
-    def delete(self: PersonWorker, session: Session) -> dict[str, str]:
-        """Delete a `Person` object from a database \
-            with `id` equal to `self.id`. \
-                Return dictionary with information about `id` \
-                    of the deleted person.
+    - `connection` - `sqlalchemy.Connection` object
+    - `ids` - ids of inserted or updated events"""
+
+    events = Event.__table__
+    a, b = events.alias("a"), events.alias("b")
+    query = select(a.c.id, b.c.id.label("other_id"),
+                   or_(a.c.repeat.is_not(None),
+                       b.c.repeat.is_not(None)).label("recurring"))\
+        .join_from(a, b, and_(
+            b.c.start_date <= func.coalesce(a.c.series_end, a.c.end_date),
+            func.coalesce(b.c.series_end, b.c.end_date) >= a.c.start_date,
+            b.c.id != a.c.id))
+    if connection.engine.pool in _interval_indexed_pools:
+        # R*Tree bounds are rounded outwards, so the exact check is kept
+        ra, rb = interval_index.alias("ra"), interval_index.alias("rb")
+        query = query.join(ra, ra.c.id == a.c.id)\
+            .join(rb, and_(rb.c.id == b.c.id, rb.c.start_ts <= ra.c.end_ts,
+                           rb.c.end_ts >= ra.c.start_ts))
+
+    ids = list(ids)
+    pairs: set[tuple[int, int]] = set()
+    recurring: list[tuple[int, int]] = []
+    for condition in id_chunks(a.c.id, ids):
+        for r in connection.execute(query.where(condition)):
+            if r.recurring:
+                recurring.append((r.id, r.other_id))
+            else:
+                pairs.add((r.id, r.other_id))
+
+    if recurring:
+        needed = list({i for pair in recurring for i in pair})
+        rows: dict[int, Row[Any]] = {}
+        for i in range(0, len(needed), IN_CHUNK):
+            for r in connection.execute(
+                    select(Event.id, Event.start_date, Event.end_date,
+                           *recurrence_columns)
+                    .where(Event.id.in_(needed[i:i + IN_CHUNK]))):
+                rows[r.id] = r
+        pairs.update(recurring_collisions(
+            ((x, rows[x]), (y, rows[y])) for x, y in recurring))
+    return pairs
+
+
+def update_collisions(connection: Connection, ids: Iterable[int],
+                      deleted: Iterable[int] = ()) -> set[int]:
+    """Recompute pairs of `event_collisions` involving given events only \
+        (see `collision_pairs`). Return ids of the other events \
+            which collisions were changed.
 
-        Arguments:
+    Arguments:
 
-        - `self` - `PersonWorker` object
-        - `session` - `sqlalchemy.orm.Session` object"""
+    - `connection` - `sqlalchemy.Connection` object
+    - `ids` - ids of inserted or updated events
+    - `deleted` - ids of events to be deleted (their pairs are removed)"""
+
+    ids = list(ids)
+    gone = list({*ids, *deleted})
+    affected: set[int] = set()
+    for condition, other in zip(id_chunks(event_collisions.c.event_id, gone),
+                                id_chunks(event_collisions.c.other_id, gone)):
+        affected.update(connection.scalars(
+            select(event_collisions.c.other_id).where(condition)))
+        connection.execute(delete(event_collisions).where(
+            or_(condition, other)))
+
+    pairs = collision_pairs(connection, ids)
+    rows = [{"event_id": x, "other_id": y}
+            for x, y in pairs | {(y, x) for x, y in pairs}]
+    for i in range(0, len(rows), IN_CHUNK):
+        connection.execute(insert(event_collisions), rows[i:i + IN_CHUNK])
+    affected.update(y for _, y in pairs)
+    return affected - set(gone)
+
+
+def rebuild_collisions(connection: Connection) -> int:
+    """Regenerate `event_collisions` from scratch - all events are read \
+        once, ordered by the start date, and swept as by \
+            `EventWorker.collisions_all`. Return the number of pairs.
 
-        p = session.query(Person).filter(Person.id == self.id).first()
-        session.delete(p)
-        return {"msg": f"Deleted person {self.id}"}
+    Arguments:
 
+    - `connection` - `sqlalchemy.Connection` object"""
 
-class PlaceWorker(Worker):
-    """Worker for `Place` class. \
-        Performs adding, updating, \
-            fetching info about one or all `Place` objects, \
-                looking up `Place` objects with particular name \
-                    and deleting."""
+    connection.execute(delete(event_collisions))
+    rows = connection.execute(
+        select(Event.start_date, Event.end_date, Event.id,
+               last_end.label("last_end"), *recurrence_columns)
+        .order_by(Event.start_date, Event.end_date, Event.id)).all()
+    pairs = recurring_collisions(sweep(
+        (r.start_date, r.last_end, (r.id, r)) for r in rows))
+    count = 0
+    while chunk := list(itertools.islice(pairs, IN_CHUNK)):
+        connection.execute(insert(event_collisions), [
+            {"event_id": x, "other_id": y}
+            for a, b in chunk for x, y in [(a, b), (b, a)]])
+        count += len(chunk)
+    return count
 
-    properties = {"id": "Place id",
-                  "name": "Place name",
-                        "street_name": "Street name",
-                        "street_number": "Street number"}
-    """Dictionary with description of the properties of the `Place` objects."""
 
-    id: int
-    name: str | None
-    street_name: str | None
-    street_number: int | None
+def written_collisions(session: Session, ids: set[int]) -> None:
+    """Invalidate cached results of events which collisions were changed \
+        (and remember them to invalidate again after commit).
 
-    list_properties: list[str] = []
-    """List of `Place` properties that are lists."""
+    Arguments:
 
-    def __init__(self: PlaceWorker, dict: dict[str, Any]) -> None:
-        super().__init__(dict, PlaceWorker.properties)
+    - `session` - `sqlalchemy.orm.Session` object
+    - `ids` - ids of the events"""
 
-    def add(self: PlaceWorker, session: Session) -> Place | None:
-        """Add a `Place` object to a database \
-            basing on `self` properties. Return created `Place` object.
+    if ids:
+        tags: set[Tag] = {(Event.__tablename__, i) for i in ids}
+        cache.invalidate(tags)
+        session.info.setdefault("written", set()).update(tags)
 
-        Arguments:
 
-        - `self` - `PlaceWorker` object
-        - `session` - `sqlalchemy.orm.Session` object"""
+def remove_collisions(session: Session, context: Any,
+                      instances: Any) -> None:
+    """Remove pairs of deleted events from `event_collisions` \
+        (before the events they refer to)."""
 
-        p = Place(name=self.name, street_name=self.street_name,
-                  street_number=self.street_number)
-        session.add(p)
-        session.flush()
-        return p
+    ids = [o.id for o in session.deleted if isinstance(o, Event)]
+    if not ids:
+        return
+    written_collisions(session, update_collisions(
+        session.connection(), [], ids))
 
-    def update(self: PlaceWorker, session: Session) -> Place | None:
-        """Update a `Place` object in a \
-            database basing on `self` properties. \
-                Return updated `Place` object.
 
-        Arguments:
+def store_collisions(session: Session, context: Any) -> None:
+    """Recompute pairs of flushed new events and of events \
+        with changed dates or recurrence (see `collision_columns`)."""
 
-        - `self` - `PlaceWorker` object
-        - `session` - `sqlalchemy.orm.Session` object"""
+    new = [o for o in session.new if isinstance(o, Event)]
+    dirty = [o for o in session.dirty if isinstance(o, Event)]
+    if not new and not dirty:
+        return
+    ids = [o.id for o in new]
+    ids += [o.id for o in dirty
+            if any(inspect(o).attrs[k].history.has_changes()
+                   for k in collision_columns)]
+    if ids:
+        written_collisions(session, update_collisions(
+            session.connection(), ids))
 
-        p = session.query(Place).filter(Place.id == self.id).first()
-        super().updateWorker(p, PlaceWorker.properties)
-        session.flush()
-        return p
 
-    def info(self: PlaceWorker, session: Session) -> Place | None:
-        """Get info about a `Place` object from a database \
-            with `id` equal to `self.id`. Return `Place` object.
+def colliding_events(session: Session, ids: Iterable[int]) \
+        -> dict[int, list[Event]]:
+    """Read collisions of events from `event_collisions` \
+        (with one indexed join per `IN_CHUNK` ids). \
+            Return dictionary mapping ids to lists of colliding `Event` \
+                objects (ordered by id).
 
-        Arguments:
+    Arguments:
 
-        - `self` - `PlaceWorker` object
-        - `session` - `sqlalchemy.orm.Session` object"""
+    - `session` - `sqlalchemy.orm.Session` object
+    - `ids` - ids of events"""
 
-        p = session.query(Place).filter(Place.id == self.id).first()
-        return p
+    ids = list(ids)
+    found: dict[int, list[Event]] = {i: [] for i in ids}
+    for i in range(0, len(ids), IN_CHUNK):
+        for event_id, e in session.execute(
+                select(event_collisions.c.event_id, Event)
+                .select_from(event_collisions)
+                .join(Event, Event.id == event_collisions.c.other_id)
+                .where(event_collisions.c.event_id.in_(ids[i:i + IN_CHUNK]))
+                .order_by(event_collisions.c.event_id, Event.id)):
+            found[event_id].append(e)
+    return found
 
-    def info_all(self: PlaceWorker, session: Session) -> list[Place]:
-        """Get info about all `Place` objects from a database. \
-            Return list of `Place` objects.
 
-        Arguments:
+# Full-text search ---------------------------
 
-        - `self` - `PlaceWorker` object
-        - `session` - `sqlalchemy.orm.Session` object"""
+search_columns: dict[str, list[str]] = {
+    "Events": ["name", "description"],
+    "People": ["name", "surname", "email"],
+    "Places": ["name", "street_name"]
+}
+"""Columns of each table indexed for full-text search."""
 
-        places = session.query(Place).all()
-        return places
 
-    def lookup(self: PlaceWorker, session: Session) -> list[Place]:
-        """Get info about all `Place` objects \
-            with `name` equal to `self.name`. \
-                Return list of `Place` objects.
+def search_index(model: type[Base]) -> Any:
+    """Return the SQLite FTS5 virtual table (external content table) \
+        indexing `search_columns` of `model` (keyed by `rowid` \
+            equal to the object id). Kept in sync by triggers.
 
-        Arguments:
+    Arguments:
 
-        - `self` - `PlaceWorker` object
-        - `session` - `sqlalchemy.orm.Session` object"""
+    - `model` - `Event`, `Place` or `Person`"""
+
+    name = model.__tablename__
+    return table(f"{name.lower()}_fts", column("rowid"), column("rank"),
+                 *[column(c) for c in search_columns[name]])
+
+
+def _search_index_ddl(name: str) -> list[str]:
+    """Return statements creating the FTS5 table of table `name` \
+        and its triggers."""
+
+    fts = f"{name.lower()}_fts"
+    cols = ", ".join(search_columns[name])
+    new = ", ".join(f"new.{c}" for c in search_columns[name])
+    old = ", ".join(f"old.{c}" for c in search_columns[name])
+    delete = f"""INSERT INTO {fts}({fts}, rowid, {cols})
+            VALUES ('delete', old.id, {old});"""
+    insert = f"""INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});"""
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols},
+        content='{name}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+        # triggers of older versions ignored bulk loads
+        f"DROP TRIGGER IF EXISTS {fts}_insert",
+        f"""CREATE TRIGGER {fts}_insert
+        AFTER INSERT ON {name}
+        WHEN NOT EXISTS (SELECT 1 FROM bulk_loads) BEGIN
+            {insert}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_update
+        AFTER UPDATE OF {cols} ON {name} BEGIN
+            {delete}
+            {insert}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_delete
+        AFTER DELETE ON {name} BEGIN
+            {delete}
+        END"""
+    ]
+
+
+_searchable_pools: weakref.WeakSet[Pool] = weakref.WeakSet()
+"""Connection pools of engines maintaining the FTS5 tables."""
+
+
+def create_search_index(connection: Connection) -> bool:
+    """Create FTS5 tables with their triggers for tables \
+        from `search_columns` (if they do not exist yet) \
+            and fill new ones with the existing rows. \
+                Return `False` if the database does not support FTS5 \
+                    (`Worker.search` then falls back to `LIKE` patterns).
 
-        places = session.query(Place).filter(Place.name == self.name).all()
-        return places
+    Arguments:
 
-    def delete(self: PlaceWorker, session: Session) -> dict[str, str]:
-        """Delete a `Place` object from a database \
-            with `id` equal to `self.id`. \
-                Return dictionary with information about `id` \
-                    of the deleted place.
+    - `connection` - `sqlalchemy.Connection` object"""
+
+    if connection.dialect.name != "sqlite":
+        return False
+    for name in search_columns:
+        fts = f"{name.lower()}_fts"
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = :fts"),
+            {"fts": fts}).first()
+        try:
+            for ddl in _search_index_ddl(name):
+                connection.execute(text(ddl))
+        except OperationalError:
+            return False
+        if exists is None:
+            connection.execute(text(
+                f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    return True
+
+
+def has_search_index(session: Session) -> bool:
+    """Check if the engine of `session` maintains the FTS5 tables \
+        (see `search_index`).
 
-        Arguments:
+    Arguments:
 
-        - `self` - `PlaceWorker` object
-        - `session` - `sqlalchemy.orm.Session` object"""
+    - `session` - `sqlalchemy.orm.Session` object"""
 
-        p = session.query(Place).filter(Place.id == self.id).first()
-        session.delete(p)
-        return {"msg": f"Deleted place {self.id}"}
+    return session.get_bind().pool in _searchable_pools
 
 
-class EventWorker(Worker):
-    """Worker for `Event` class. \
-        Performs adding, updating, \
-            fetching info about one or all `Event` objects, \
-                looking up `Event` objects with particular name \
-                    and deleting."""
+@contextlib.contextmanager
+def deferred_indexes(connection: Connection, model: type[Base]) \
+        -> Iterator[list[int]]:
+    """Suspend the insert triggers of `interval_index` and of the FTS5 table \
+        of `model` (see `bulk_loads`) and add rows with ids appended \
+            to the yielded list to them at once afterwards \
+                (with one `INSERT ... SELECT` per chunk of `id_chunks`). \
+                    The transaction must be rolled back on errors.
 
-    properties = {"id": "Event id",
-                  "name": "Event name",
-                        "start_date":
-                          "Start date of the event ('dd-mm-yyyy hh:mm')",
-                        "end_date":
-                          "End date of the event ('dd-mm-yyyy hh:mm')",
-                        "description": "Description (at least 3 characters)",
-                        "invitees": "List of invited people ids",
-                        "place_id": "Id of the event place"}
+    Arguments:
 
-    """Dictionary with description of the properties of the `Event` objects."""
+    - `connection` - `sqlalchemy.Connection` object (in a transaction)
+    - `model` - `Event`, `Place` or `Person`"""
+
+    ids: list[int] = []
+    if connection.dialect.name != "sqlite":
+        yield ids
+        return
+    connection.execute(insert(bulk_loads).values(id=1))
+    yield ids
+    connection.execute(delete(bulk_loads))
+
+    name = model.__tablename__
+    statements = []
+    if model is Event and connection.engine.pool in _interval_indexed_pools:
+        statements.append(f"INSERT INTO events_rtree {_interval_rows}")
+    if name in search_columns and connection.engine.pool in _searchable_pools:
+        cols = ", ".join(search_columns[name])
+        statements.append(f"""INSERT INTO {name.lower()}_fts(rowid, {cols})
+            SELECT id, {cols} FROM {name}""")
+    for condition in id_chunks(column("id"), ids):
+        # ids of inserted rows are integers - safe as literals
+        where = condition.compile(dialect=connection.dialect,
+                                  compile_kwargs={"literal_binds": True})
+        for statement in statements:
+            connection.execute(text(f"{statement} WHERE {where}"))
+
+
+def match_query(words: str) -> str:
+    """Convert words typed by a user to an FTS5 query \
+        matching rows containing words starting with each of them \
+            (special characters are quoted).
 
-    id: int
-    name: str | None
-    start_date: str | None
-    end_date: str | None
-    description: str | None
-    invitees: list[Person] | list[int] | None
-    place_id: int | None
-    collides: list[Event] | list[int] | None
+    Arguments:
+
+    - `words` - words separated by whitespace"""
+
+    return " ".join('"' + w.replace('"', '""') + '"*' for w in words.split())
+
+
+T = TypeVar("T")
+B = TypeVar("B", bound=Base)
+Q = TypeVar("Q", Query[Any], Select[Any])
+
+
+def sweep(intervals: Iterable[tuple[datetime.datetime, datetime.datetime, T]])\
+        -> Iterator[tuple[T, T]]:
+    """Yield all pairs of overlapping intervals \
+        (in time O(n log n + k) for `n` intervals and `k` pairs). \
+            Intervals are closed - touching intervals overlap, \
+                as in `collision_pairs`.
+
+    Arguments:
+
+    - `intervals` - iterable of `(start, end, item)` tuples \
+        sorted by `start`; pairs of `item`s are yielded \
+            (the earlier started one first)"""
+
+    active: list[tuple[datetime.datetime, int, T]] = []
+    for n, (start, end, item) in enumerate(intervals):
+        while active and active[0][0] < start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            yield other, item
+        heapq.heappush(active, (end, n, item))
+
+
+def recurring_collisions(pairs: Iterable[tuple[tuple[T, Row[Any]],
+                                               tuple[T, Row[Any]]]]) \
+        -> Iterator[tuple[T, T]]:
+    """Yield these pairs of events which really collide \
+        - pairs of single events overlap already, \
+            recurrence patterns of the other pairs are compared \
+                (see `Recurrence.collides`).
+
+    Arguments:
+
+    - `pairs` - pairs of `(item, row)` tuples \
+        (e.g. from `sweep` over spans of events); \
+            rows with the dates and `recurrence_columns` of events"""
+
+    for (first, a), (second, b) in pairs:
+        if (a.repeat is None and b.repeat is None) \
+                or Recurrence.of(a).collides(Recurrence.of(b)):
+            yield first, second
+
+
+def free_intervals(busy: Iterable[tuple[datetime.datetime, datetime.datetime]],
+                   begin: datetime.datetime, end: datetime.datetime,
+                   length: datetime.timedelta) \
+        -> Iterator[tuple[datetime.datetime, datetime.datetime]]:
+    """Yield gaps between `busy` intervals inside `[begin, end]` \
+        not shorter than `length` (in one pass over the intervals - \
+            overlapping busy intervals are merged on the fly).
+
+    Arguments:
+
+    - `busy` - iterable of `(start, end)` tuples sorted by `start`
+    - `begin` - beginning of the searched window
+    - `end` - end of the searched window
+    - `length` - minimal length of a yielded gap"""
+
+    free_from = begin
+    for start, stop in busy:
+        if start >= end:
+            break
+        if start - free_from >= length:
+            yield free_from, start
+        free_from = max(free_from, stop)
+    if end - free_from >= length:
+        yield free_from, end
+
+
+def grouped_conflicts(rows: Iterable[Row[Any]], owner: str) \
+        -> Iterator[dict[str, Any]]:
+    """Yield pairs of colliding events sharing the same owner \
+        (a person or a place) - a separate `sweep` is run for each owner.
+
+    Arguments:
+
+    - `rows` - rows with `owner`, `id`, `name`, `start_date`, \
+        `end_date`, `series_end` and `recurrence_columns`, \
+            grouped (e.g. ordered) by `owner`
+    - `owner` - key of the owner id in yielded dictionaries \
+        (e.g. `"person_id"`)"""
+
+    for owner_id, group in itertools.groupby(rows, key=lambda r: r.owner):
+        events = sorted({r.id: r for r in group}.values(),
+                        key=lambda r: (r.start_date, r.end_date, r.id))
+        intervals = ((r.start_date, r.series_end or r.end_date,
+                      ({"id": r.id, "name": r.name}, r)) for r in events)
+        for first, second in recurring_collisions(sweep(intervals)):
+            yield {owner: owner_id, "first": first, "second": second}
+
+
+batch_errors = (ValueError, TypeError, AttributeError, SQLAlchemyError)
+"""Errors of single instructions reported by `act_many` \
+    (instead of aborting the whole batch)."""
+
+IN_CHUNK = 500
+"""Maximal number of ids in one `IN (...)` clause."""
+
+
+def id_chunks(column: Any, ids: Iterable[int]) -> Iterator[Any]:
+    """Yield conditions on `column` matching together exactly given ids \
+        - one `BETWEEN` per run of at least `IN_CHUNK // 10` consecutive ids \
+            (e.g. of rows inserted at once), the other ids in `IN (...)` \
+                clauses of at most `IN_CHUNK` ids.
+
+    Arguments:
+
+    - `column` - SQL expression of the id (e.g. `Event.id`)
+    - `ids` - ids to be matched"""
+
+    single: list[int] = []
+    for _, run in itertools.groupby(enumerate(sorted(set(ids))),
+                                    lambda p: p[1] - p[0]):
+        run_ids = [i for _, i in run]
+        if len(run_ids) >= IN_CHUNK // 10:
+            yield column.between(run_ids[0], run_ids[-1])
+        else:
+            single += run_ids
+    for i in range(0, len(single), IN_CHUNK):
+        yield column.in_(single[i:i + IN_CHUNK])
+
+
+upsert_columns = ["name", "surname", "email"]
+"""Columns of people written by `PersonWorker.upsert_many`."""
+
+upsert_inserts: dict[str, Callable[..., Any]] = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert
+}
+"""`INSERT` constructs with `ON CONFLICT` clause of each dialect."""
+
+
+def fetch_by_ids(session: Session, model: type[B], ids: Iterable[int]) \
+        -> dict[int, B]:
+    """Fetch objects of class `model` with given ids \
+        (with one query per `IN_CHUNK` ids). \
+            Return dictionary mapping ids to found objects.
+
+    Arguments:
+
+    - `session` - `sqlalchemy.orm.Session` object
+    - `model` - `Event`, `Place` or `Person`
+    - `ids` - ids of objects to be fetched"""
+
+    ids = list(ids)
+    found: dict[int, B] = {}
+    for i in range(0, len(ids), IN_CHUNK):
+        for p in session.query(model).filter(
+                model.id.in_(ids[i:i + IN_CHUNK])):
+            found[p.id] = p
+    return found
+
+
+@functools.cache
+def serializer(model: type[Base]) -> Callable[[Any], dict[str, Any]]:
+    """Return a function serializing the mapped columns of `model` objects \
+        (compiled once per class).
+
+    Arguments:
+
+    - `model` - `Event`, `Place` or `Person`"""
+
+    keys = tuple(c.key for c in model.__mapper__.column_attrs)
+    values = operator.attrgetter(*keys)
+
+    def serialize(obj: Any) -> dict[str, Any]:
+        return dict(zip(keys, values(obj)))
+    return serialize
+
+
+def serialize_rows(session: Session, model: type[Base], stmt: Select[Any],
+                   chunk: int = IN_CHUNK) -> Iterator[dict[str, Any]]:
+    """Yield rows of `model` serialized as by `serialize` of `model` \
+        without creating database objects (read-only fast path). \
+            Rows are fetched `chunk` at once and related rows of each chunk \
+                are fetched with one query per relationship.
+
+    Arguments:
+
+    - `session` - `sqlalchemy.orm.Session` object
+    - `model` - `Event`, `Place` or `Person`
+    - `stmt` - Core `SELECT` of the columns of `model` table
+    - `chunk` - number of rows fetched at once (at most `IN_CHUNK`)"""
+
+    result = session.execute(stmt.execution_options(yield_per=chunk))
+    keys = tuple(result.keys())
+    for rows in result.partitions():
+        res = [dict(zip(keys, r)) for r in rows]
+        for key, rel in model.__mapper__.relationships.items():
+            target = rel.mapper.class_
+            columns = target.__table__.columns  # type: ignore[attr-defined]
+            if rel.direction is MANYTOONE:
+                (remote, local), = rel.synchronize_pairs
+                owners = {r[local.key] for r in res} - {None}
+            else:
+                (local, remote), = rel.synchronize_pairs
+                owners = {r[local.key] for r in res}
+            query = select(remote.label("owner"), *columns)\
+                .where(remote.in_(owners))
+            if rel.secondary is not None:
+                (other, secondary), = rel.secondary_synchronize_pairs
+                query = query.join(target, other == secondary)\
+                    .order_by(remote, other)
+            else:
+                query = query.order_by(remote, target.id)  # type: ignore
+
+            found: dict[Any, list[dict[str, Any]]] = {}
+            related_rows = session.execute(query)
+            related_keys = tuple(related_rows.keys())[1:]
+            for owner, *row in related_rows:
+                found.setdefault(owner, []).append(
+                    dict(zip(related_keys, row)))
+            for r in res:
+                related = found.get(r[local.key], [])
+                if rel.direction is MANYTOONE:
+                    if related:
+                        r[key] = related[0]
+                else:
+                    r[key] = related
+        yield from res
+
+
+# Change log ---------------------------
+
+change_log = Table(
+    "change_log",
+    Base.metadata,
+    Column("seq", Integer, primary_key=True),
+    Column("table", String, nullable=False),
+    Column("id", Integer, nullable=False),
+    Column("op", String, nullable=False),
+    Column("changed_at", DateTime, nullable=False),
+    Index("ix_change_log_table_id", "table", "id", "seq"),
+    sqlite_autoincrement=True)
+"""Added, updated and deleted rows of `People`, `Events` and `Places` \
+    (by table names of `workers`) in order of the sequence number `seq` \
+        (never reused, also after `compact_changes`)."""
+
+CHANGES_LIMIT = 1000
+"""Default maximal number of entries returned by `changes`."""
+
+
+def log_changes(connection: Connection, model: type[Base],
+                ids: Iterable[int], op: str) -> None:
+    """Append entries of written rows to `change_log`. Added and updated \
+        rows (still in the table) are logged with one `INSERT ... SELECT` \
+            per chunk of `id_chunks` (in order of ids), deleted rows \
+                with one executemany `INSERT`.
+
+    Arguments:
+
+    - `connection` - `sqlalchemy.Connection` object
+    - `model` - `Event`, `Place` or `Person`
+    - `ids` - ids of the written rows
+    - `op` - `"add"`, `"update"` or `"delete"`"""
+
+    table = change_tables[model.__tablename__]
+    now = datetime.datetime.now()
+    if op != "delete":
+        entries = select(literal(table), model.id, literal(op),
+                         literal(now, DateTime))
+        # ids of related objects may come unconverted (e.g. strings)
+        for condition in id_chunks(model.id, map(int, ids)):
+            connection.execute(insert(change_log).from_select(
+                ["table", "id", "op", "changed_at"], entries.where(condition)))
+        return
+    rows = [{"table": table, "id": i, "op": op, "changed_at": now}
+            for i in ids]
+    if rows:
+        connection.execute(insert(change_log), rows)
+
+
+def log_flushed(session: Session, context: Any) -> None:
+    """Log flushed new, modified and deleted objects in `change_log` \
+        - also objects added to (or removed from) their relationships \
+            as modified (see `written_tags`)."""
+
+    logged: dict[tuple[str, int], str] = {}
+    states: list[tuple[InstanceState[Any], str]] = []
+    for objs, op in [(session.new, "add"), (session.dirty, "update"),
+                     (session.deleted, "delete")]:
+        for o in objs:
+            if isinstance(o, Base) and (op != "update"
+                                        or session.is_modified(o)):
+                state = inspect(o)
+                # identities of new objects are set after this event
+                id = state.identity[0] if op == "delete" else o.id
+                logged[(type(o).__tablename__, id)] = op
+                states.append((state, op))
+    for state, op in states:
+        for tag in written_tags(state, op == "update"):
+            if len(tag) == 2 and tag[1] is not None:
+                logged.setdefault(tag, "update")  # type: ignore[arg-type]
+
+    models = {m.class_.__tablename__: m.class_
+              for m in Base.registry.mappers}
+    ops = ["add", "update", "delete"]
+    for (table, op), group in itertools.groupby(
+            sorted(logged.items(), key=lambda i: (ops.index(i[1]), i[0])),
+            key=lambda i: (i[0][0], i[1])):
+        log_changes(session.connection(), models[table],
+                    [id for (_, id), _ in group], op)
+
+
+def changes(since: int = 0, limit: int | None = CHANGES_LIMIT) \
+        -> list[dict[str, Any]]:
+    """Return entries of `change_log` with sequence numbers greater \
+        than `since` (at most `limit` of them), ordered by `seq`. \
+            A consumer passes `seq` of the last entry as the next `since`. \
+                After `compact_changes` only the latest entry of a row \
+                    may be left, so an `update` may be the first entry \
+                        of a row unknown to the consumer.
+
+    Arguments:
+
+    - `since` - sequence number of the last entry already read
+    - `limit` - maximal number of entries"""
+
+    stmt = select(change_log).where(change_log.c.seq > since)\
+        .order_by(change_log.c.seq)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    with init() as session:
+        res = session.execute(stmt)
+        keys = list(map(str, res.keys()))
+        return [dict(zip(keys, r)) for r in res]
+
+
+def compact_changes(before: datetime.datetime) -> dict[str, int]:
+    """Remove entries of `change_log` logged before `before` \
+        which are followed by a later entry of the same row \
+            (the latest entry of each row, also a deletion, is kept, \
+                so consumers reading from any sequence number \
+                    still learn the current state of each row). \
+                        Return dictionary with the number of removed entries.
+
+    Arguments:
+
+    - `before` - cutoff date"""
+
+    later = change_log.alias()
+    latest = select(func.max(later.c.seq)).where(
+        later.c.table == change_log.c.table,
+        later.c.id == change_log.c.id).scalar_subquery()
+    with init(write=True) as session:
+        removed = session.execute(delete(change_log).where(
+            change_log.c.changed_at < before,
+            change_log.c.seq < latest)).rowcount
+        session.commit()
+    return {"compacted": removed}
+
+
+# Occupancy ---------------------------
+
+occupancy = sot.Occupancy(**OCCUPANCY_OPTIONS)
+"""Process-wide booked slots of places (built lazily from events, \
+    see `build_occupancy`)."""
+
+
+def sync_occupancy(session: Session) -> None:
+    """Drop blocks of `occupancy` with events changed since the last sync \
+        - read from `change_log`, so also changes made by other processes \
+            (or bypassing the ORM) are applied.
+
+    Arguments:
+
+    - `session` - `sqlalchemy.orm.Session` object"""
+
+    last = session.scalar(select(func.max(change_log.c.seq))) or 0
+    if occupancy.seq is not None and last > occupancy.seq:
+        ids = list(session.scalars(
+            select(change_log.c.id.distinct()).where(
+                change_log.c.seq > occupancy.seq, change_log.c.seq <= last,
+                change_log.c.table == change_tables[Event.__tablename__])))
+        extents = []
+        for i in range(0, len(ids), IN_CHUNK):
+            extents += session.execute(
+                select(Event.start_date, last_end)
+                .where(Event.id.in_(ids[i:i + IN_CHUNK]))).all()
+        occupancy.drop(ids, extents)
+    elif occupancy.seq is None:
+        occupancy.blocks.clear()
+    occupancy.seq = last
+
+
+def build_occupancy(session: Session, block: int) -> None:
+    """Build a block of `occupancy` - read events of places overlapping it \
+        (occurrences of recurring events are expanded) \
+            and mark their slots at once.
+
+    Arguments:
+
+    - `session` - `sqlalchemy.orm.Session` object
+    - `block` - number of the block"""
+
+    begin = sot.ORIGIN + occupancy.block_begin(block) * sot.MINUTE
+    end = begin + occupancy.width * occupancy.resolution * sot.MINUTE
+    query = select(Event.id, Event.place_id, Event.start_date,
+                   Event.end_date)\
+        .where(Event.place_id.is_not(None), Event.start_date < end)
+    intervals: list[tuple[int, int, datetime.datetime, datetime.datetime]] \
+        = list(session.execute(query.where(Event.repeat.is_(None),
+                                           Event.end_date >= begin)))
+    for r in session.execute(query.add_columns(*recurrence_columns)
+                             .where(Event.repeat.is_not(None),
+                                    last_end >= begin)):
+        intervals += [(r.id, r.place_id, start, stop) for start, stop
+                      in Recurrence.of(r).occurrences(begin, end)]
+
+    events, places, starts, ends = zip(*intervals) if intervals \
+        else ((), (), (), ())
+    occupancy.put(block, sot.np.array(places, dtype=sot.np.int64),
+                  sot.minutes(starts), sot.minutes(ends), set(events))
+
+
+def booked_slots(session: Session, places: Iterable[int],
+                 begin: datetime.datetime, end: datetime.datetime) \
+        -> tuple[Any, int]:
+    """Return boolean matrix of booked slots of `places` in the time range \
+        from `begin` to `end` and minute (after `sot.ORIGIN`) \
+            of the beginning of its first slot (see `sot.Occupancy.booked`). \
+                Blocks of changed events are dropped and missing blocks \
+                    are built first.
+
+    Arguments:
+
+    - `session` - `sqlalchemy.orm.Session` object
+    - `places` - ids of places
+    - `begin`, `end` - time range"""
+
+    sot.require_numpy()
+    with occupancy.lock:
+        sync_occupancy(session)
+        for block in occupancy.missing(begin, end):
+            build_occupancy(session, block)
+        return occupancy.booked(places, begin, end)
+
+
+# Archive ---------------------------
+
+events_archive = Table(
+    "events_archive",
+    Base.metadata,
+    *(Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable)
+      for c in Event.__table__.columns),
+    Index("ix_events_archive_start_end", "start_date", "end_date"))
+"""Events moved out of the `Events` table by `archive` \
+    (with the same columns, without the indexes of live events)."""
+
+participation_archive = Table(
+    "person_event_archive",
+    Base.metadata,
+    Column("event_id", Integer, primary_key=True),
+    Column("person_id", Integer, primary_key=True))
+"""Links of archived events with invited people (ids of `People` rows \
+    which may be deleted later)."""
+
+ARCHIVE_CHUNK = 500
+"""Default number of events moved to the archive in one transaction."""
+
+
+def duration_hours(session: Session, start: Any, end: Any) -> Any:
+    """Return SQL expression of the number of hours \
+        from `start` to `end` (in the dialect of the engine of `session`).
+
+    Arguments:
+
+    - `session` - `sqlalchemy.orm.Session` object
+    - `start` - SQL expression of the beginning (e.g. `Event.start_date`)
+    - `end` - SQL expression of the end (e.g. `Event.end_date`)"""
+
+    if session.get_bind().dialect.name == "sqlite":
+        return (func.julianday(end) - func.julianday(start)) * 24
+    return func.extract("epoch", end - start) / 3600
+
+
+# DB workers ---------------------------
+
+class Worker(abc.ABC):
+    """Base class for database workers - performing actions on database."""
+
+    page_properties = {"after_id":
+                       "Fetch only records with greater id (page cursor)",
+                       "limit": "Maximum number of fetched records"}
+    """Dictionary with description of the keyset pagination properties \
+        (common for all workers)."""
+
+    search_properties = {"query": "Words to search for \
+(also prefixes of words)"}
+    """Dictionary with description of the full-text search properties \
+        (common for all workers)."""
+
+    optional_properties: dict[str, str] = {}
+    """Dictionary with description of the properties of objects \
+        which may be omitted when adding an object."""
+
+    after_id: int | None
+    limit: int | None
+    query: str | None
+
+    model: type[Base]
+    """Database class of the worker."""
+
+    load_options: tuple[Any, ...] = ()
+    """Eager loading options of queries returning objects."""
+
+    stream_chunk = 500
+    """Number of rows fetched at once by streaming actions."""
+
+    related: dict[str, type[Base]] = {}
+    """List properties holding ids of related objects \
+        with classes of these objects."""
+
+    def __init__(self: Worker, dict: dict[str, Any],
+                 properties: dict[str, Any]) -> None:
+        """Initialize a worker - set attributes listed in `properties` \
+            (and in `page_properties` and `optional_properties`) \
+                basing on the dictionary `dict`."""
+
+        for prop in properties:
+            setattr(self, prop, dict[prop] if prop in dict else None)
+        for prop in Worker.page_properties | Worker.search_properties \
+                | type(self).optional_properties:
+            setattr(self, prop, dict.get(prop))
+
+    def page(self: Worker, query: Q,
+             id: InstrumentedAttribute[Any]) -> Q:
+        """Restrict `query` to one page of records ordered by `id` \
+            - records with `id` greater than `self.after_id` \
+                (at most `self.limit` of them). \
+                    Return the restricted query.
+
+        Arguments:
+
+        - `self` - `Worker` object
+        - `query` - `sqlalchemy.orm.Query` object (or Core `SELECT`)
+        - `id` - primary key column of the queried table"""
+
+        query = query.order_by(id)
+        if self.after_id is not None:
+            query = query.filter(id > self.after_id)
+        if self.limit is not None:
+            query = query.limit(self.limit)
+        return query
+
+    def search(self: Worker, session: Session) -> list[Base]:
+        """Full-text search - get objects containing words starting \
+            with all words of `self.query` \
+                (in columns from `search_columns`), the best matching first \
+                    (at most `self.limit` of them). Return list of objects.
+
+        Arguments:
+
+        - `self` - `Worker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        model = type(self).model
+        if not (self.query or "").split():
+            return []
+        query = session.query(model).options(*type(self).load_options)
+
+        if has_search_index(session):
+            fts = search_index(model)
+            query = query.join(fts, fts.c.rowid == model.id)\
+                .filter(literal_column(fts.name).op("MATCH")(
+                    match_query(self.query or "")))\
+                .order_by(fts.c.rank, model.id)
+        else:
+            for w in (self.query or "").split():
+                query = query.filter(or_(*[
+                    getattr(model, c).contains(w, autoescape=True)
+                    for c in search_columns[model.__tablename__]]))
+            query = query.order_by(model.id)
+
+        if self.limit is not None:
+            query = query.limit(self.limit)
+        return query.all()
+
+    @abc.abstractmethod
+    def create(self: Worker) -> Base:
+        """Create a new database object basing on `self` properties \
+            (list properties must already hold related objects, not ids)."""
+
+    @classmethod
+    def add_many(cls: type[Worker], session: Session,
+                 instrs: list[dict[str, Any]]) -> list[Base | Exception]:
+        """Add many objects at once - related objects of all of them \
+            are fetched with one query per relationship \
+                (missing lists are treated as empty) \
+                    and all objects are inserted with one flush. \
+                        Return a list with the created object \
+                            (or an exception which prevented creating it) \
+                                for each instruction.
+
+        Arguments:
+
+        - `cls` - worker class (e.g. `PersonWorker`)
+        - `session` - `sqlalchemy.orm.Session` object
+        - `instrs` - list of dictionaries with properties of new objects"""
+
+        workers = [cls(i) for i in instrs]
+        for prop, model in cls.related.items():
+            found = fetch_by_ids(session, model, {
+                i for w in workers for i in getattr(w, prop) or []})
+            for w in workers:
+                setattr(w, prop, [found[i] for i in dict.fromkeys(
+                    getattr(w, prop) or []) if i in found])
+
+        res: list[Base | Exception] = []
+        try:
+            with session.begin_nested():
+                for w in workers:
+                    try:
+                        res.append(w.create())
+                    except batch_errors as e:
+                        res.append(e)
+                session.add_all([p for p in res if isinstance(p, Base)])
+                session.flush()
+        except batch_errors:
+            # find the failing objects - insert them one by one
+            for n, p in enumerate(res):
+                if isinstance(p, Base):
+                    try:
+                        with session.begin_nested():
+                            session.add(p)
+                            session.flush()
+                    except batch_errors as e:
+                        res[n] = e
+        return res
+
+    def updateWorker(self: Worker, p: Base | None,
+                     properties: dict[str, Any]) -> None:
+        """Update a database object - set attributes of `p` \
+            listed in `properties` basing on the `self` properties \
+                (`self` *does not have to* contain all properties \
+                    from `properties`).
+
+        Arguments:
+
+        - `self` - `Worker` object
+        - `p` - `Base` object (`Event`, `Place` or `Person`) \
+            which will be updated
+        - `properties` - dictionary of possible properties """
+
+        for prop in properties:
+            self_prop = getattr(self, prop)
+            if self_prop is not None:
+                setattr(p, prop, self_prop)
+
+
+class PersonWorker(Worker):
+    """Worker for `Person` class. \
+        Performs adding, updating, upserting (by email), \
+            fetching info about one or all `Person` objects, \
+                looking up `Person` objects with particular surname \
+                    and deleting."""
+
+    properties = {"id": "Person id",
+                  "name": "Person name",
+                  "surname": "Person surname",
+                  "email": "Person email",
+                  "participates":
+                  "List of event ids in which this person participates"}
+    """Dictionary with description of the properties \
+        of the `Person` objects."""
+
+    list_properties = ["participates"]
+    """List of `Person` properties that are lists."""
+
+    related = {"participates": Event}
+
+    load_options = (selectinload(Person.participates),)
+    """Eager loading options - exactly what `Person.serialize` touches."""
+
+    model = Person
+
+    id: int | None
+    name: str | None
+    surname: str | None
+    email: str | None
+    participates: list[int] | list[Event]
+
+    upsert_chunk = 500
+    """Number of people written at once by `upsert_many`."""
+
+    def __init__(self: PersonWorker, dict: dict[str, Any]):
+        super().__init__(dict, PersonWorker.properties)
+
+    def create(self: PersonWorker) -> Person:
+        """Create a `Person` object basing on `self` properties \
+            (`participates` must hold `Event` objects)."""
+
+        p = Person(name=self.name, surname=self.surname, email=self.email)
+        if self.participates is not None:
+            p.participates = self.participates
+        return p
+
+    def add(self: PersonWorker, session: Session) -> Person:
+        """Add a `Person` object to a database \
+            basing on `self` properties. Return created `Person` object.
+
+        Arguments:
+
+        - `self` - `PersonWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        self.participates = session.query(Event).filter(
+            Event.id.in_(self.participates)).all()
+        p = self.create()
+        session.add(p)
+        session.flush()
+        return p
+
+    def update(self: PersonWorker, session: Session) -> Person | None:
+        """Update a `Person` object in a database \
+            basing on `self` properties. Return updated `Person` object.
+
+        Arguments:
+
+        - `self` - `PersonWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        if self.participates is not None:
+            self.participates = session.query(Event).filter(
+                Event.id.in_(self.participates)).all()
+        p = session.query(Person).filter(Person.id == self.id).first()
+        super().updateWorker(p, PersonWorker.properties)
+        session.flush()
+        return p
+
+    @classmethod
+    def upsert_many(cls: type[PersonWorker], session: Session,
+                    instrs: list[dict[str, Any]]) \
+            -> list[tuple[str, int] | Exception]:
+        """Add or update many people at once, matching them by `email` \
+            - with one `INSERT ... ON CONFLICT DO UPDATE` statement \
+                per `upsert_chunk` people (rows with an unchanged name \
+                    and surname are not written, `participates` is ignored). \
+                        Of people with the same email only the last one \
+                            is written. Return a list with the status \
+                                (`"created"`, `"updated"` or `"unchanged"`) \
+                                    and the id of the person \
+                                        (or an exception which prevented \
+                                            writing it) for each instruction. \
+                                                `ValueError` is raised \
+                                                    for databases without \
+                                                        `upsert_inserts`.
+
+        Arguments:
+
+        - `cls` - `PersonWorker`
+        - `session` - `sqlalchemy.orm.Session` object
+        - `instrs` - list of dictionaries with properties of people"""
+
+        dialect = session.get_bind().dialect.name
+        if dialect not in upsert_inserts:
+            raise ValueError(f"Upsert is not supported by {dialect}")
+
+        res: list[tuple[str, int] | Exception | None] = []
+        rows: dict[str, tuple[int, dict[str, Any]]] = {}
+        for n, instr in enumerate(instrs):
+            w = cls(instr)
+            w.participates = []
+            try:
+                for c in upsert_columns:
+                    if getattr(w, c) is None:
+                        raise ValueError(f"Missing {c}")
+                p = w.create()  # validated, never added to the session
+            except batch_errors as e:
+                res.append(e)
+                continue
+            if p.email in rows:
+                res[rows[p.email][0]] = ValueError(
+                    f"Email {p.email} repeated later")
+            rows[p.email] = (n, {c: getattr(p, c) for c in upsert_columns})
+            res.append(None)
+
+        people: Table = Person.__table__  # type: ignore[assignment]
+        values = list(rows.values())
+        for i in range(0, len(values), cls.upsert_chunk):
+            chunk = values[i:i + cls.upsert_chunk]
+            stored = {r.email: r for r in session.execute(
+                select(people.c.id, people.c.name, people.c.surname,
+                       people.c.email)
+                .where(people.c.email.in_([v["email"] for _, v in chunk])))}
+            written = []
+            for n, v in chunk:
+                r = stored.get(v["email"])
+                if r is not None and (r.name, r.surname) \
+                        == (v["name"], v["surname"]):
+                    res[n] = ("unchanged", r.id)
+                else:
+                    written.append((n, v))
+            if not written:
+                continue
+
+            stmt = upsert_inserts[dialect](people)\
+                .values([v for _, v in written])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[people.c.email],
+                set_={"name": stmt.excluded.name,
+                      "surname": stmt.excluded.surname})\
+                .returning(people.c.id, people.c.email)
+            ids = {email: id for id, email in session.execute(stmt)}
+            for n, v in written:
+                res[n] = ("updated" if v["email"] in stored else "created",
+                          ids[v["email"]])
+            for op in ["add", "update"]:
+                log_changes(session.connection(), Person, [
+                    ids[v["email"]] for _, v in written
+                    if (v["email"] in stored) == (op == "update")], op)
+            written_people(session, ids.values(), [
+                s for _, v in written for s in [v["surname"], getattr(
+                    stored.get(v["email"]), "surname", None)]])
+        return res  # type: ignore[return-value]
+
+    def info(self: PersonWorker, session: Session) -> Person | None:
+        """Get info about a `Person` object from a database \
+            with `id` equal to `self.id`. Return `Person` object.
+
+        Arguments:
+
+        - `self` - `PersonWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        p = session.query(Person).options(*PersonWorker.load_options)\
+            .filter(Person.id == self.id).first()
+        return p
+
+    def info_all(self: PersonWorker, session: Session) -> list[Person]:
+        """Get info about all `Person` objects from a database \
+            (or about one page of them, see `Worker.page`). \
+                Return list of `Person` objects ordered by `id`.
+
+        Arguments:
+
+        - `self` - `PersonWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        people = self.page(session.query(Person).options(
+            *PersonWorker.load_options), Person.id).all()
+        return people
+
+    def info_stream(self: PersonWorker, session: Session) \
+            -> Iterator[dict[str, Any]]:
+        """Yield serialized `Person` objects as in `info_all`, \
+            fetching `Worker.stream_chunk` rows at once \
+                (without creating `Person` objects, see `serialize_rows`).
+
+        Arguments:
+
+        - `self` - `PersonWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        query = self.page(select(*Person.__table__.columns), Person.id)
+        yield from serialize_rows(session, Person, query, Worker.stream_chunk)
+
+    def conflicts(self: PersonWorker, session: Session) \
+            -> Iterator[dict[str, Any]]:
+        """Yield pairs of colliding events to which the person \
+            with `id` equal to `self.id` is invited \
+                (all people are checked if `self.id` is `None`).
+
+        Arguments:
+
+        - `self` - `PersonWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        stmt = select(participation.c.person_id.label("owner"), Event.id,
+                      Event.name, Event.start_date, Event.end_date,
+                      Event.series_end, *recurrence_columns)\
+            .join(Event, Event.id == participation.c.event_id)
+        if self.id is not None:
+            stmt = stmt.where(participation.c.person_id == self.id)
+        rows = session.execute(stmt.order_by(participation.c.person_id)
+                               .execution_options(yield_per=1000))
+        yield from grouped_conflicts(rows, "person_id")
+
+    def conflicts_all(self: PersonWorker, session: Session) \
+            -> Iterator[dict[str, Any]]:
+        """Yield pairs of colliding events sharing an invitee, \
+            for all people.
+
+        Arguments:
+
+        - `self` - `PersonWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        self.id = None
+        yield from self.conflicts(session)
+
+    def lookup(self: PersonWorker, session: Session) -> list[Person]:
+        """Get info about all `Person` objects \
+            with `surname` equal to `self.surname`. \
+                Return list of `Person` objects.
+
+        Arguments:
+
+        - `self` - `PersonWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        people = session.query(Person).options(*PersonWorker.load_options)\
+            .filter(Person.surname == self.surname).all()
+        return people
+
+    def delete(self: PersonWorker, session: Session) -> dict[str, str]:
+        """Delete a `Person` object from a database \
+            with `id` equal to `self.id`. \
+                Return dictionary with information about `id` \
+                    of the deleted person.
+
+        Arguments:
+
+        - `self` - `PersonWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        p = session.query(Person).filter(Person.id == self.id).first()
+        session.delete(p)
+        return {"msg": f"Deleted person {self.id}"}
+
+
+class PlaceWorker(Worker):
+    """Worker for `Place` class. \
+        Performs adding, updating, \
+            fetching info about one or all `Place` objects \
+                (or places available in a time range), \
+                    looking up `Place` objects with particular name \
+                        and deleting."""
+
+    properties = {"id": "Place id",
+                  "name": "Place name",
+                        "street_name": "Street name",
+                        "street_number": "Street number"}
+    """Dictionary with description of the properties of the `Place` objects."""
+
+    available_properties = {
+        "day_from": "Beginning of the daily time window ('hh:mm')",
+        "day_to": "End of the daily time window ('hh:mm')",
+        "weekdays": "Days of the week (0 - Monday, ..., 6 - Sunday)",
+        "places": "List of checked place ids (all places by default)"}
+    """Dictionary with description of the properties \
+        of `available` action (besides `EventWorker.range_properties`)."""
+
+    id: int
+    name: str | None
+    street_name: str | None
+    street_number: int | None
+    range_from: datetime.datetime | None
+    range_to: datetime.datetime | None
+    day_from: str | None
+    day_to: str | None
+    weekdays: list[int] | None
+    places: list[int] | None
+
+    list_properties: list[str] = []
+    """List of `Place` properties that are lists."""
+
+    load_options = (selectinload(Place.hosts_event),)
+    """Eager loading options - exactly what `Place.serialize` touches."""
+
+    model = Place
+
+    def __init__(self: PlaceWorker, dict: dict[str, Any]) -> None:
+        super().__init__(dict, PlaceWorker.properties)
+        self.range_from = dict.get("from")
+        self.range_to = dict.get("to")
+        for prop in PlaceWorker.available_properties:
+            setattr(self, prop, dict.get(prop))
+
+    def create(self: PlaceWorker) -> Place:
+        """Create a `Place` object basing on `self` properties."""
+
+        return Place(name=self.name, street_name=self.street_name,
+                     street_number=self.street_number)
+
+    def add(self: PlaceWorker, session: Session) -> Place | None:
+        """Add a `Place` object to a database \
+            basing on `self` properties. Return created `Place` object.
+
+        Arguments:
+
+        - `self` - `PlaceWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        p = self.create()
+        session.add(p)
+        session.flush()
+        return p
+
+    def available(self: PlaceWorker, session: Session) \
+            -> list[dict[str, Any]]:
+        """Get places (all or `self.places`) free in all time slots \
+            between `self.range_from` and `self.range_to` \
+                overlapping the daily time window from `self.day_from` \
+                    to `self.day_to` on `self.weekdays` \
+                        (every day and all day if not given). \
+                            Booked slots of all places are checked at once \
+                                (see `booked_slots`). \
+                                    Return list of serialized places \
+                                        (ordered by id) with `utilization` \
+                                            - share of booked slots \
+                                                of the whole time range.
+
+        Arguments:
+
+        - `self` - `PlaceWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        if self.range_from is None or self.range_to is None:
+            raise ValueError("Missing time range")
+        if self.range_to <= self.range_from:
+            raise ValueError("End of the time range must be after its start")
+        ids = sorted({int(i) for i in self.places}) if self.places \
+            else list(session.scalars(select(Place.id).order_by(Place.id)))
+
+        booked, begin = booked_slots(session, ids, self.range_from,
+                                     self.range_to)
+        resolution = occupancy.resolution
+        mask = sot.slot_mask(
+            begin, booked.shape[1], resolution,
+            datetime.time.fromisoformat(self.day_from)
+            if self.day_from else None,
+            datetime.time.fromisoformat(self.day_to)
+            if self.day_to else None,
+            [int(d) for d in self.weekdays]
+            if self.weekdays is not None else None)
+        free = sot.available(booked, mask)
+        used = sot.utilization(booked, sot.np.ones_like(mask))
+
+        found = fetch_by_ids(session, Place, ids)
+        return [found[i].serialize_basic()
+                | {"utilization": round(float(u), 4)}
+                for i, f, u in zip(ids, free, used) if f and i in found]
+
+    def update(self: PlaceWorker, session: Session) -> Place | None:
+        """Update a `Place` object in a \
+            database basing on `self` properties. \
+                Return updated `Place` object.
+
+        Arguments:
+
+        - `self` - `PlaceWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        p = session.query(Place).filter(Place.id == self.id).first()
+        super().updateWorker(p, PlaceWorker.properties)
+        session.flush()
+        return p
+
+    def info(self: PlaceWorker, session: Session) -> Place | None:
+        """Get info about a `Place` object from a database \
+            with `id` equal to `self.id`. Return `Place` object.
+
+        Arguments:
+
+        - `self` - `PlaceWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        p = session.query(Place).options(*PlaceWorker.load_options)\
+            .filter(Place.id == self.id).first()
+        return p
+
+    def info_all(self: PlaceWorker, session: Session) -> list[Place]:
+        """Get info about all `Place` objects from a database \
+            (or about one page of them, see `Worker.page`). \
+                Return list of `Place` objects ordered by `id`.
+
+        Arguments:
+
+        - `self` - `PlaceWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        places = self.page(session.query(Place).options(
+            *PlaceWorker.load_options), Place.id).all()
+        return places
+
+    def info_stream(self: PlaceWorker, session: Session) \
+            -> Iterator[dict[str, Any]]:
+        """Yield serialized `Place` objects as in `info_all`, \
+            fetching `Worker.stream_chunk` rows at once \
+                (without creating `Place` objects, see `serialize_rows`).
+
+        Arguments:
+
+        - `self` - `PlaceWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        query = self.page(select(*Place.__table__.columns), Place.id)
+        yield from serialize_rows(session, Place, query, Worker.stream_chunk)
+
+    def conflicts(self: PlaceWorker, session: Session) \
+            -> Iterator[dict[str, Any]]:
+        """Yield pairs of colliding events held in the place \
+            with `id` equal to `self.id` \
+                (all places are checked if `self.id` is `None`).
+
+        Arguments:
+
+        - `self` - `PlaceWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        stmt = select(Event.place_id.label("owner"), Event.id, Event.name,
+                      Event.start_date, Event.end_date, Event.series_end,
+                      *recurrence_columns)
+        if self.id is not None:
+            stmt = stmt.where(Event.place_id == self.id)
+        rows = session.execute(
+            stmt.order_by(Event.place_id, Event.start_date, Event.end_date)
+            .execution_options(yield_per=1000))
+        yield from grouped_conflicts(rows, "place_id")
+
+    def conflicts_all(self: PlaceWorker, session: Session) \
+            -> Iterator[dict[str, Any]]:
+        """Yield pairs of colliding events held in the same place, \
+            for all places.
+
+        Arguments:
+
+        - `self` - `PlaceWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        self.id = None
+        yield from self.conflicts(session)
+
+    def lookup(self: PlaceWorker, session: Session) -> list[Place]:
+        """Get info about all `Place` objects \
+            with `name` equal to `self.name`. \
+                Return list of `Place` objects.
+
+        Arguments:
+
+        - `self` - `PlaceWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        places = session.query(Place).options(*PlaceWorker.load_options)\
+            .filter(Place.name == self.name).all()
+        return places
+
+    def delete(self: PlaceWorker, session: Session) -> dict[str, str]:
+        """Delete a `Place` object from a database \
+            with `id` equal to `self.id`. \
+                Return dictionary with information about `id` \
+                    of the deleted place.
+
+        Arguments:
+
+        - `self` - `PlaceWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        p = session.query(Place).filter(Place.id == self.id).first()
+        session.delete(p)
+        return {"msg": f"Deleted place {self.id}"}
+
+
+class EventWorker(Worker):
+    """Worker for `Event` class. \
+        Performs adding, updating, \
+            fetching info about one or all `Event` objects, \
+                looking up `Event` objects with particular name \
+                    and deleting."""
+
+    properties = {"id": "Event id",
+                  "name": "Event name",
+                        "start_date":
+                          "Start date of the event ('dd-mm-yyyy hh:mm')",
+                        "end_date":
+                          "End date of the event ('dd-mm-yyyy hh:mm')",
+                        "description": "Description (at least 3 characters)",
+                        "invitees": "List of invited people ids",
+                        "place_id": "Id of the event place"}
+
+    """Dictionary with description of the properties of the `Event` objects."""
+
+    optional_properties = {
+        "repeat": f"Repeat the event ({', '.join(FREQUENCIES)})",
+        "repeat_every": "Number of days, weeks or months between occurrences",
+        "repeat_count": "Number of occurrences",
+        "repeat_until": "Last possible start of an occurrence \
+('dd-mm-yyyy hh:mm')",
+        "repeat_except": "Dates of skipped occurrences ('dd-mm-yyyy')"}
+    """Dictionary with description of the recurrence properties \
+        of the `Event` objects (a single event if `repeat` is not given)."""
+
+    range_properties = {"from":
+                        "Beginning of the time range ('dd-mm-yyyy hh:mm')",
+                        "to": "End of the time range ('dd-mm-yyyy hh:mm')"}
+    """Dictionary with description of the properties of `range` action \
+        (stored as `range_from` and `range_to` attributes)."""
+
+    slot_properties = {"duration": "Minimal length of a free slot (minutes)"}
+    """Dictionary with description of the properties \
+        of `free_slots` action (besides `range_properties`)."""
+
+    stats_horizon = datetime.timedelta(days=366)
+    """Without the end of the time range `stats` expands recurring events \
+        at most this long after now."""
+
+    id: int
+    name: str | None
+    start_date: str | None
+    end_date: str | None
+    description: str | None
+    invitees: list[Person] | list[int] | None
+    place_id: int | None
+    collides: list[Event] | list[int] | None
+    repeat: str | None
+    repeat_every: int | None
+    repeat_count: int | None
+    repeat_until: datetime.datetime | None
+    repeat_except: list[str] | str | None
+    range_from: datetime.datetime | None
+    range_to: datetime.datetime | None
+    duration: int | None
 
     list_properties: list[str] = ["invitees"]
     """List of `Event` properties that are lists."""
 
+    related = {"invitees": Person}
+
+    load_options = (selectinload(Event.invitees), joinedload(Event.place))
+    """Eager loading options - exactly what `Event.serialize` touches."""
+
+    model = Event
+
     def __init__(self: EventWorker, dict: dict[str, Any]) -> None:
         super().__init__(dict, EventWorker.properties)
+        self.range_from = dict.get("from")
+        self.range_to = dict.get("to")
+        self.duration = dict.get("duration")
+
+    def create(self: EventWorker) -> Event:
+        """Create an `Event` object basing on `self` properties \
+            (`invitees` must hold `Person` objects)."""
+
+        return Event(name=self.name, start_date=self.start_date,
+                     end_date=self.end_date, description=self.description,
+                     invitees=self.invitees, place_id=self.place_id,
+                     repeat=self.repeat, repeat_every=self.repeat_every,
+                     repeat_count=self.repeat_count,
+                     repeat_until=self.repeat_until,
+                     repeat_except=self.repeat_except)
 
     @staticmethod
     def time_collision(event: Event, session: Session) -> list[Event]:
-        """Return list of `Event` objects with which `event` collides.
+        """Return list of `Event` objects with which `event` collides \
+            (read from `event_collisions`, updated on flush).
+
+        Arguments:
+
+        - `event` - flushed `Event` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        return colliding_events(session, [event.id])[event.id]
+
+    def range(self: EventWorker, session: Session) -> list[dict[str, Any]]:
+        """Get events taking place (at least partially) \
+            in the time range from `self.range_from` to `self.range_to` \
+                (unbounded if not given), optionally only these \
+                    in the place with `id` equal to `self.place_id` \
+                        and these with any of `self.invitees` invited. \
+                            Occurrences of recurring events in the range \
+                                are expanded lazily (each one separately, \
+                                    with its own `start_date` and `end_date`) \
+                                        - `ValueError` is raised without \
+                                            `self.range_to` if an event \
+                                                repeated forever matches. \
+                                                    Return list of serialized \
+                                                        events sorted by start.
+
+        Arguments:
+
+        - `self` - `EventWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        query = session.query(Event).options(*EventWorker.load_options)
+        if self.place_id is not None:
+            # range scan of ix_events_place
+            query = query.filter(Event.place_id == self.place_id)
+        elif has_interval_index(session) \
+                and (self.range_from, self.range_to) != (None, None):
+            query = query.join(interval_index,
+                               interval_index.c.id == Event.id)
+            if self.range_to is not None:
+                query = query.filter(
+                    interval_index.c.start_ts <= timestamp(self.range_to))
+            if self.range_from is not None:
+                query = query.filter(
+                    interval_index.c.end_ts >= timestamp(self.range_from))
+        if self.range_to is not None:
+            query = query.filter(Event.start_date <= self.range_to)
+        if self.range_from is not None:
+            query = query.filter(last_end >= self.range_from)
+        if self.invitees:
+            query = query.filter(Event.id.in_(
+                select(participation.c.event_id).where(
+                    participation.c.person_id.in_(self.invitees))))
+
+        res: list[dict[str, Any]] = []
+        for e in query.order_by(Event.start_date, Event.end_date, Event.id):
+            if e.repeat is None:
+                res.append(e.serialize())
+                continue
+            if self.range_to is None and e.series_end == FOREVER:
+                raise ValueError(f"Missing end of the time range "
+                                 f"(event {e.id} is repeated forever)")
+            serialized = e.serialize()
+            for start, end in Recurrence.of(e).occurrences(self.range_from,
+                                                           self.range_to):
+                res.append(serialized | {"start_date": start,
+                                         "end_date": end})
+        res.sort(key=lambda r: (r["start_date"], r["end_date"], r["id"]))
+        return res
+
+    def free_slots(self: EventWorker, session: Session) \
+            -> list[dict[str, Any]]:
+        """Find time slots between `self.range_from` and `self.range_to` \
+            at least `self.duration` minutes long (any length if not given) \
+                in which none of `self.invitees` (person ids) \
+                    takes part in an event and the place with `id` \
+                        equal to `self.place_id` (if given) is not booked. \
+                            Busy intervals are read sorted by start \
+                                (with occurrences of recurring events \
+                                    expanded lazily and merged in) \
+                                        and merged in one pass \
+                                            (`free_intervals`). \
+                                                Return list of dictionaries \
+                                                    with `start` and `end`.
+
+        Arguments:
+
+        - `self` - `EventWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        if self.range_from is None or self.range_to is None:
+            raise ValueError("Missing time range")
+        length = datetime.timedelta(minutes=self.duration or 0)
+
+        owners = []
+        if self.invitees:
+            owners.append(exists().where(
+                participation.c.event_id == Event.id,
+                participation.c.person_id.in_(self.invitees)))
+        if self.place_id is not None:
+            owners.append(Event.place_id == self.place_id)
+
+        busy: Iterable[tuple[datetime.datetime, datetime.datetime]] = []
+        if owners:
+            query = select(Event.start_date, Event.end_date)\
+                .where(Event.start_date < self.range_to,
+                       last_end > self.range_from, or_(*owners))
+            if has_interval_index(session):
+                # events of the window first, then their owners (by key)
+                query = query.where(Event.id.in_(
+                    select(interval_index.c.id).where(
+                        interval_index.c.start_ts <= timestamp(self.range_to),
+                        interval_index.c.end_ts >= timestamp(
+                            self.range_from))))
+            single = session.execute(
+                query.where(Event.repeat.is_(None))
+                .order_by(Event.start_date)
+                .execution_options(yield_per=Worker.stream_chunk))
+            recurring = session.execute(
+                query.add_columns(*recurrence_columns)
+                .where(Event.repeat.is_not(None))).all()
+            # occurrences of recurring events are merged into the stream
+            busy = heapq.merge(single, *[
+                Recurrence.of(r).occurrences(self.range_from, self.range_to)
+                for r in recurring])
+        return [{"start": start, "end": end} for start, end in free_intervals(
+            busy, self.range_from, self.range_to, length)]
+
+    def stats(self: EventWorker, session: Session) -> dict[str, Any]:
+        """Summarize events starting in the time range \
+            from `self.range_from` to `self.range_to` \
+                (unbounded if not given) - numbers of events per place, \
+                    per person and per day and booked hours per place. \
+                        Single events are aggregated with `GROUP BY` \
+                            in the database, occurrences of recurring events \
+                                are expanded lazily and added \
+                                    (without `self.range_to` up to the latest \
+                                        start of an event, but at most \
+                                            `stats_horizon` after now). \
+                                                Return dictionary with totals \
+                                                    and lists `places`, \
+                                                        `people` and `days`.
+
+        Arguments:
+
+        - `self` - `EventWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        window = []
+        if self.range_from is not None:
+            window.append(Event.start_date >= self.range_from)
+        if self.range_to is not None:
+            window.append(Event.start_date <= self.range_to)
+        single = and_(Event.repeat.is_(None), *window)
+
+        places = {r.place_id: {
+            "place_id": r.place_id, "name": r.name, "events": r.events,
+            "hours": r.hours} for r in session.execute(
+            select(Event.place_id, Place.name,
+                   func.count().label("events"),
+                   func.sum(duration_hours(session, Event.start_date,
+                                           Event.end_date)).label("hours"))
+            .join_from(Event, Place, Place.id == Event.place_id, isouter=True)
+            .where(single).group_by(Event.place_id, Place.name))}
+        people = {r.person_id: {
+            "person_id": r.person_id, "name": r.name, "surname": r.surname,
+            "events": r.events} for r in session.execute(
+            select(participation.c.person_id, Person.name, Person.surname,
+                   func.count().label("events"))
+            .join_from(participation, Event,
+                       Event.id == participation.c.event_id)
+            .join(Person, Person.id == participation.c.person_id)
+            .where(single)
+            .group_by(participation.c.person_id, Person.name,
+                      Person.surname))}
+        day = func.date(Event.start_date)
+        days = {str(d): n for d, n in session.execute(
+            select(day, func.count()).where(single).group_by(day))}
+
+        end = self.range_to
+        if end is None:
+            latest = session.scalar(select(func.max(Event.start_date)))
+            if latest is not None:
+                end = min(latest,
+                          datetime.datetime.now() + self.stats_horizon)
+        query = select(Event.id, Event.place_id, Place.name, Event.start_date,
+                       Event.end_date, *recurrence_columns)\
+            .join_from(Event, Place, Place.id == Event.place_id, isouter=True)\
+            .where(Event.repeat.is_not(None), Event.start_date <= end)
+        if self.range_from is not None:
+            query = query.where(last_end >= self.range_from)
+        recurring = session.execute(query).all() if end is not None else []
+
+        invited: dict[int, list[Row[Any]]] = {}
+        ids = [r.id for r in recurring]
+        for i in range(0, len(ids), IN_CHUNK):
+            for r in session.execute(
+                    select(participation.c.event_id, Person.id, Person.name,
+                           Person.surname)
+                    .join(Person, Person.id == participation.c.person_id)
+                    .where(participation.c.event_id.in_(
+                        ids[i:i + IN_CHUNK]))):
+                invited.setdefault(r.event_id, []).append(r)
+
+        for r in recurring:
+            starts = [start for start, _ in Recurrence.of(r).occurrences(
+                self.range_from, end)
+                if self.range_from is None or start >= self.range_from]
+            if not starts:
+                continue
+            place = places.setdefault(r.place_id, {
+                "place_id": r.place_id, "name": r.name, "events": 0,
+                "hours": 0.0})
+            place["events"] += len(starts)
+            place["hours"] = (place["hours"] or 0.0) + len(starts) \
+                * (r.end_date - r.start_date).total_seconds() / 3600
+            for p in invited.get(r.id, []):
+                person = people.setdefault(p.id, {
+                    "person_id": p.id, "name": p.name,
+                    "surname": p.surname, "events": 0})
+                person["events"] += len(starts)
+            for start in starts:
+                d = start.date().isoformat()
+                days[d] = days.get(d, 0) + 1
+
+        for place in places.values():
+            place["hours"] = round(place["hours"] or 0.0, 2)
+        return {
+            "from": self.range_from, "to": self.range_to,
+            "events": sum(p["events"] for p in places.values()),
+            "hours": round(sum(p["hours"] for p in places.values()), 2),
+            "places": sorted(places.values(), key=lambda p: (
+                p["place_id"] is None, p["place_id"] or 0)),
+            "people": [people[i] for i in sorted(people)],
+            "days": [{"day": d, "events": n} for d, n in sorted(days.items())]
+        }
+
+    def archived(self: EventWorker, session: Session) \
+            -> list[dict[str, Any]]:
+        """Get archived events (see `archive`) taking place (at least \
+            partially) in the time range from `self.range_from` \
+                to `self.range_to` (unbounded if not given), optionally \
+                    only these in the place with `id` equal \
+                        to `self.place_id` (or one page of them, \
+                            see `Worker.page`). Return list of dictionaries \
+                                with columns of the events and `invitees` \
+                                    - ids of invited people.
 
         Arguments:
 
-        - `event` - `Event` object
+        - `self` - `EventWorker` object
         - `session` - `sqlalchemy.orm.Session` object"""
 
-        return session.query(Event).filter(
-            ((event.start_date <= Event.start_date)
-             & (Event.start_date <= event.end_date))
-            | ((Event.start_date <= event.start_date)
-               & (event.start_date <= Event.end_date)))\
-            .filter(Event.id != event.id).all()
+        a = events_archive
+        query = self.page(select(a), a.c.id)
+        if self.range_to is not None:
+            query = query.where(a.c.start_date <= self.range_to)
+        if self.range_from is not None:
+            query = query.where(func.coalesce(a.c.series_end, a.c.end_date)
+                                >= self.range_from)
+        if self.place_id is not None:
+            query = query.where(a.c.place_id == self.place_id)
+
+        result = session.execute(query)
+        # plain strings (`quoted_name` keys are rejected by `orjson`)
+        keys = tuple(map(str, result.keys()))
+        res = [dict(zip(keys, r)) for r in result]
+
+        invitees: dict[int, list[int]] = {}
+        ids = [r["id"] for r in res]
+        for i in range(0, len(ids), IN_CHUNK):
+            for event_id, person_id in session.execute(
+                    select(participation_archive.c.event_id,
+                           participation_archive.c.person_id)
+                    .where(participation_archive.c.event_id.in_(
+                        ids[i:i + IN_CHUNK]))
+                    .order_by(participation_archive.c.event_id,
+                              participation_archive.c.person_id)):
+                invitees.setdefault(event_id, []).append(person_id)
+        for r in res:
+            r["invitees"] = invitees.get(r["id"], [])
+        return res
 
     def add(self: EventWorker, session: Session) -> Event | None:
         """Add an `Event` object to a database \
@@ -613,9 +2670,7 @@ class EventWorker(Worker):
         if self.invitees is not None:
             self.invitees = session.query(Person).filter(
                 Person.id.in_(self.invitees)).all()
-        p = Event(name=self.name, start_date=self.start_date,
-                  end_date=self.end_date, description=self.description,
-                  invitees=self.invitees, place_id=self.place_id)
+        p = self.create()
         session.add(p)
         session.flush()
 
@@ -648,8 +2703,14 @@ class EventWorker(Worker):
             p.start_date = datetime.datetime(1, 1, 1, 0, 1)
         if getattr(self, "end_date") is not None:
             p.end_date = datetime.datetime(9999, 12, 31, 23, 59)
-
-        super().updateWorker(p, EventWorker.properties)
+        # a new limit of occurrences replaces the old one
+        if self.repeat_count is not None:
+            p.repeat_until = None
+        if self.repeat_until is not None:
+            p.repeat_count = None
+
+        super().updateWorker(p, EventWorker.properties
+                             | EventWorker.optional_properties)
         session.flush()
 
         res = p
@@ -659,28 +2720,97 @@ class EventWorker(Worker):
 
     def info(self: EventWorker, session: Session) -> Event | None:
         """Get info about an `Event` object from a database \
-            with `id` equal to `self.id`. Return `Event` object.
+            with `id` equal to `self.id`. Return `Event` object \
+                with `collides` property (see `colliding_events`).
 
         Arguments:
 
         - `self` - `EventWorker` object
         - `session` - `sqlalchemy.orm.Session` object"""
 
-        p = session.query(Event).filter(Event.id == self.id).first()
+        p = session.query(Event).options(*EventWorker.load_options)\
+            .filter(Event.id == self.id).first()
+        if p is not None:
+            p.collides = EventWorker.time_collision(p, session)
         return p
 
+    def collisions_all(self: EventWorker, session: Session) \
+            -> Iterator[dict[str, Any]]:
+        """Yield all pairs of colliding events as dictionaries \
+            `{"first": {"id", "name"}, "second": {"id", "name"}}`. \
+                Events are read once, ordered by the start date, \
+                    and pairs are streamed using `sweep` \
+                        (recurring events are swept with their whole span \
+                            and checked with `recurring_collisions`).
+
+        Arguments:
+
+        - `self` - `EventWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        rows = session.execute(
+            select(Event.start_date, Event.end_date, Event.id, Event.name,
+                   last_end.label("last_end"), *recurrence_columns)
+            .order_by(Event.start_date, Event.end_date, Event.id)
+            .execution_options(yield_per=1000))
+        intervals = ((r.start_date, r.last_end,
+                      ({"id": r.id, "name": r.name}, r)) for r in rows)
+        for first, second in recurring_collisions(sweep(intervals)):
+            yield {"first": first, "second": second}
+
     def info_all(self: EventWorker, session: Session) -> list[Event]:
-        """Get info about all `Event` objects from a database. \
-            Return list of `Event` objects.
+        """Get info about all `Event` objects from a database \
+            (or about one page of them, see `Worker.page`). \
+                Return list of `Event` objects ordered by `id` \
+                    with `collides` property (see `colliding_events`).
 
         Arguments:
 
         - `self` - `EventWorker` object
         - `session` - `sqlalchemy.orm.Session` object"""
 
-        events = session.query(Event).all()
+        events = self.page(session.query(Event).options(
+            *EventWorker.load_options), Event.id).all()
+        found = colliding_events(session, [e.id for e in events])
+        for e in events:
+            e.collides = found[e.id]
         return events
 
+    def info_stream(self: EventWorker, session: Session) \
+            -> Iterator[dict[str, Any]]:
+        """Yield serialized `Event` objects as in `info_all`, \
+            fetching `Worker.stream_chunk` rows at once \
+                (without creating `Event` objects, see `serialize_rows`, \
+                    apart from the colliding ones).
+
+        Arguments:
+
+        - `self` - `EventWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        query = self.page(select(*Event.__table__.columns), Event.id)
+        rows = serialize_rows(session, Event, query, Worker.stream_chunk)
+        while chunk := list(itertools.islice(rows, Worker.stream_chunk)):
+            found = colliding_events(session, [r["id"] for r in chunk])
+            for r in chunk:
+                r["collides"] = [c.serialize_basic() for c in found[r["id"]]]
+            yield from chunk
+
+    def rebuild(self: EventWorker, session: Session) -> dict[str, str]:
+        """Regenerate the table of colliding events from scratch \
+            (see `rebuild_collisions`). Return dictionary with information \
+                about the number of colliding pairs.
+
+        Arguments:
+
+        - `self` - `EventWorker` object
+        - `session` - `sqlalchemy.orm.Session` object"""
+
+        count = rebuild_collisions(session.connection())
+        # pairs are written without objects - unseen by the cache
+        cache.clear()
+        return {"msg": f"Rebuilt collisions: {count} pairs of events"}
+
     def lookup(self: EventWorker, session: Session) -> list[Event]:
         """Get info about all `Event` objects \
             with `name` equal to `self.name`. Return list of `Event` objects.
@@ -690,7 +2820,8 @@ class EventWorker(Worker):
         - `self` - `EventWorker` object
         - `session` - `sqlalchemy.orm.Session` object"""
 
-        events = session.query(Event).filter(Event.name == self.name).all()
+        events = session.query(Event).options(*EventWorker.load_options)\
+            .filter(Event.name == self.name).all()
         return events
 
     def delete(self: EventWorker, session: Session) -> dict[str, str]:
@@ -709,16 +2840,521 @@ class EventWorker(Worker):
         return {"msg": f"Deleted event {self.id}"}
 
 
-def init() -> Session:
-    """Initialize a session (`sqlalchemy.orm.Session` object) and return it."""
+def configure(url: str | None = None,
+              pragmas: dict[str, Any] | None = None,
+              occupancy_options: dict[str, Any] | None = None,
+              merge_people: bool | None = None,
+              **pool_options: Any) -> None:
+    """Set the database URL, SQLite pragmas, options of booked slots \
+        of places, merging of people in schema upgrades \
+            and/or the connection pool options. \
+            The current engine (if any) is disposed \
+                and will be rebuilt lazily with the new settings \
+                    (as well as booked slots of places), cached results \
+                        of `act` are dropped.
+
+    Arguments:
+
+    - `url` - database URL (e.g. `"sqlite:///schedule.db"`)
+    - `pragmas` - pragmas from `SQLITE_PRAGMAS` to be overridden \
+        (e.g. `{"journal_mode": "delete"}`)
+    - `occupancy_options` - options from `OCCUPANCY_OPTIONS` \
+        to be overridden (e.g. `{"resolution": 30}`)
+    - `merge_people` - new value of `MERGE_PEOPLE`
+    - `pool_options` - options from `POOL_OPTIONS` to be overridden \
+        (e.g. `pool_size`, `max_overflow`, `pool_timeout`)"""
+
+    global DB_URL, MERGE_PEOPLE, _engine, _write_engine, _session_factory, \
+        occupancy
+
+    with _engine_lock:
+        if url is not None:
+            DB_URL = url
+        if merge_people is not None:
+            MERGE_PEOPLE = merge_people
+        SQLITE_PRAGMAS.update(pragmas or {})
+        OCCUPANCY_OPTIONS.update(occupancy_options or {})
+        occupancy = sot.Occupancy(**OCCUPANCY_OPTIONS)
+        POOL_OPTIONS.update(pool_options)
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+        _write_engine = None
+        _session_factory = None
+        # results of the previous database
+        cache.clear()
+
+
+def sqlite_transactions(engine: Engine) -> None:
+    """Let SQLAlchemy (not the `sqlite3` driver) begin transactions \
+        of `engine`, so that savepoints (used by `act_many`) \
+            are nested in the transaction instead of committing on release. \
+                Transactions of connections with execution option \
+                    `sqlite_write` (see `init`) begin with `BEGIN IMMEDIATE` \
+                        - in WAL mode a read transaction upgraded to a write \
+                            one fails at once (without `busy_timeout`) \
+                                if another writer committed meanwhile.
+
+    Arguments:
+
+    - `engine` - `sqlalchemy.Engine` object of SQLite database"""
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection: Any, connection_record: Any) -> None:
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin(connection: Connection) -> None:
+        connection.exec_driver_sql(
+            "BEGIN IMMEDIATE" if connection.get_execution_options().get(
+                "sqlite_write") else "BEGIN")
+
+
+def sqlite_pragmas(engine: Engine) -> None:
+    """Set `SQLITE_PRAGMAS` on every new connection of `engine` \
+        (pragmas are per connection, so each pooled one needs them).
+
+    Arguments:
+
+    - `engine` - `sqlalchemy.Engine` object of SQLite database"""
+
+    pragmas = dict(SQLITE_PRAGMAS)
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def prepare_engine(engine: Engine) -> None:
+    """Set up connections of `engine` (see `sqlite_transactions` \
+        and `sqlite_pragmas`).
+
+    Arguments:
+
+    - `engine` - `sqlalchemy.Engine` object"""
+
+    if engine.dialect.name == "sqlite":
+        sqlite_transactions(engine)
+        sqlite_pragmas(engine)
+
+
+def file_backed(url: str) -> bool:
+    """Return whether `url` is not an in-memory SQLite database \
+        (e.g. `"sqlite://"`, which SQLAlchemy keeps in a single connection \
+            of `SingletonThreadPool` or `StaticPool`).
+
+    Arguments:
+
+    - `url` - database URL"""
+
+    u = make_url(url)
+    return u.get_backend_name() != "sqlite" or (
+        u.database not in (None, "", ":memory:")
+        and u.query.get("mode") != "memory")
+
+
+def pool_options(url: str) -> dict[str, Any]:
+    """Return `POOL_OPTIONS` for a file-backed database \
+        (no options otherwise - the pools of in-memory SQLite databases \
+            do not accept them).
+
+    Arguments:
+
+    - `url` - database URL"""
+
+    return dict(POOL_OPTIONS) if file_backed(url) else {}
+
+
+def create_schema(connection: Connection) -> None:
+    """Create (or upgrade) the schema with the interval and search indexes \
+        and remember which of them the engine of `connection` maintains. \
+            A new `event_collisions` table is filled with existing events.
+
+    Arguments:
+
+    - `connection` - `sqlalchemy.Connection` object (in a transaction)"""
+
+    collisions_exist = inspect(connection).has_table(event_collisions.name)
+    Base.metadata.create_all(connection)
+    upgrade_schema(connection)
+    if create_interval_index(connection):
+        _interval_indexed_pools.add(connection.engine.pool)
+    if create_search_index(connection):
+        _searchable_pools.add(connection.engine.pool)
+    if not collisions_exist:
+        rebuild_collisions(connection)
+
 
-    engine = create_engine("sqlite:///schedule.db", echo=False)
-    Base.metadata.create_all(engine)
-    return Session(engine)
+def get_engine() -> Engine:
+    """Return the process-wide engine. \
+        It is built (and the schema is created) on the first call only."""
+
+    global _engine, _write_engine, _session_factory
+
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(DB_URL, echo=False,
+                                       **pool_options(DB_URL))
+                prepare_engine(engine)
+                # the same pool, transactions taking the write lock at once
+                _write_engine = engine.execution_options(sqlite_write=True)
+                with _write_engine.begin() as connection:
+                    create_schema(connection)
+                _session_factory = sessionmaker(engine)
+                listen_session_events(_session_factory)
+                _engine = engine
+    return _engine
+
+
+def get_session_factory() -> sessionmaker[Session]:
+    """Return the process-wide `sqlalchemy.orm.sessionmaker` \
+        bound to the engine from `get_engine`."""
+
+    get_engine()
+    assert _session_factory is not None
+    return _session_factory
+
+
+def _reset_after_fork() -> None:
+    """Drop pooled connections inherited from the parent process \
+        (they must not be shared between processes)."""
+
+    if _engine is not None:
+        _engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def init(write: bool = False) -> Session:
+    """Initialize a session (`sqlalchemy.orm.Session` object) and return it. \
+        The session uses the pooled process-wide engine.
+
+    Arguments:
+
+    - `write` - whether the session writes to the database \
+        (its SQLite transactions take the write lock when they begin, \
+            see `sqlite_transactions`)"""
+
+    factory = get_session_factory()
+    return factory(bind=_write_engine) if write else factory()
+
+
+workers: dict[str, type[Worker]] = {
+    "people": PersonWorker,
+    "events": EventWorker,
+    "places": PlaceWorker
+}
+"""Workers for each table."""
+
+change_tables: dict[str, str] = {
+    w.model.__tablename__: t for t, w in workers.items()}
+"""Table names of `workers` (used in `change_log`) for each database table."""
+
+
+def serialize_result(s: Base | list[Base] | dict[str, Any] | None) \
+        -> dict[str, Any] | list[dict[str, Any]]:
+    """Serialize a result of a worker action.
+
+    Arguments:
+
+    - `s` - database object, list of database objects (or dictionaries), \
+        message dictionary or `None` (if nothing was found)"""
+
+    if s is None:
+        return {"msg": "Not found"}
+    if isinstance(s, dict):
+        return s
+    if isinstance(s, list):
+        return [r if isinstance(r, dict) else r.serialize() for r in s]
+    return s.serialize()
+
+
+# Result cache ---------------------------
+
+Tag = tuple[str, Any] | tuple[str, str, Any]
+"""Row of a table `(table name, id)` or a looked up value \
+    `(table name, "lookup", value)` on which a cached result depends."""
+
+lookup_columns: dict[str, str] = {
+    "People": "surname",
+    "Events": "name",
+    "Places": "name"
+}
+"""Column compared by `lookup` action for each table."""
+
+
+class ResultCache():
+    """Cache of serialized results (LRU with time to live). \
+        Each entry is tagged with rows (and looked up values) it depends on \
+            and it is invalidated when any of them is written."""
+
+    def __init__(self: ResultCache, maxsize: int, ttl: float) -> None:
+        """Initialize an empty cache.
+
+        Arguments:
+
+        - `maxsize` - maximal number of entries (the least recently used \
+            are evicted)
+        - `ttl` - number of seconds after which an entry expires"""
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: collections.OrderedDict[
+            Any, tuple[float, Any, set[Tag]]] = collections.OrderedDict()
+        self.tagged: dict[Tag, set[Any]] = {}
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self: ResultCache, key: Any) -> Any:
+        """Return a cached value (or `None` if it is missing or expired).
+
+        Arguments:
+
+        - `key` - hashable key of the value"""
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self: ResultCache, key: Any, value: Any, tags: set[Tag],
+            version: int) -> None:
+        """Cache a value - unless anything was invalidated since `version` \
+            (the value could have been read before the write).
+
+        Arguments:
+
+        - `key` - hashable key of the value
+        - `value` - value to be cached
+        - `tags` - rows (and looked up values) the value depends on
+        - `version` - `self.version` before the value was read"""
+
+        with self.lock:
+            if version != self.version or self.maxsize <= 0:
+                return
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self.tagged.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.maxsize:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self: ResultCache, tags: Iterable[Tag]) -> None:
+        """Remove entries depending on any of `tags`.
+
+        Arguments:
+
+        - `tags` - written rows (and looked up values)"""
+
+        with self.lock:
+            self.version += 1
+            for tag in tags:
+                for key in self.tagged.get(tag, set()).copy():
+                    self._remove(key)
+
+    def clear(self: ResultCache) -> None:
+        """Remove all entries (e.g. after writes bypassing the ORM)."""
+
+        with self.lock:
+            self.version += 1
+            self.entries.clear()
+            self.tagged.clear()
+
+    def stats(self: ResultCache) -> dict[str, int]:
+        """Return numbers of hits, misses and cached entries."""
+
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self.entries)}
+
+    def _remove(self: ResultCache, key: Any) -> None:
+        _, _, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.tagged[tag]
+            keys.discard(key)
+            if not keys:
+                del self.tagged[tag]
+
+
+cache = ResultCache(**CACHE_OPTIONS)
+"""Process-wide cache of results of `cached_actions` performed by `act`."""
+
+cached_actions = ["info", "lookup"]
+"""Actions which results are cached by `act`."""
+
+
+def read_tags(model: type[Base], res: dict[str, Any] | list[dict[str, Any]],
+              instr: dict[str, Any]) -> set[Tag]:
+    """Return rows (and the looked up value) a serialized result depends on \
+        - serialized objects and objects nested in them.
+
+    Arguments:
+
+    - `model` - `Event`, `Place` or `Person`
+    - `res` - serialized object (or list of them)
+    - `instr` - instruction of the action"""
+
+    table = model.__tablename__
+    column = lookup_columns[table]
+    tags: set[Tag] = {(table, "lookup", instr.get(column)),
+                      (table, instr.get("id"))}
+    for r in res if isinstance(res, list) else [res]:
+        if "id" not in r:
+            continue
+        tags.add((table, r["id"]))
+        tags.update((table, c["id"]) for c in r.get("collides") or [])
+        for key, rel in model.__mapper__.relationships.items():
+            related = r.get(key) or []
+            target = rel.mapper.class_.__tablename__
+            for o in related if isinstance(related, list) else [related]:
+                tags.add((target, o["id"]))
+    return tags
+
+
+def written_tags(state: InstanceState[Any], persistent: bool) -> set[Tag]:
+    """Return rows (and looked up values) whose serialized form \
+        is changed by a flushed object - the object itself, \
+            objects added to (or removed from) its relationships \
+                and its old and new looked up value.
+
+    Arguments:
+
+    - `state` - state of a new, modified or deleted object
+    - `persistent` - the object was modified \
+        (otherwise all values are treated as changed)"""
+
+    mapper = state.mapper
+    table = mapper.class_.__tablename__
+    tags: set[Tag] = {(table, state.dict.get("id"))}
+
+    def changed(key: str) -> list[Any]:
+        history = state.attrs[key].history
+        return list(history.added or ()) + list(history.deleted or ()) \
+            + ([] if persistent else list(history.unchanged or ()))
+
+    for key, rel in mapper.relationships.items():
+        target = rel.mapper.class_.__tablename__
+        tags.update((target, inspect(o).dict.get("id"))
+                    for o in changed(key) if o is not None)
+        if rel.direction is MANYTOONE:
+            for column in rel.local_columns:
+                tags.update((target, v) for v in changed(column.key)
+                            if v is not None)
+    tags.update((table, "lookup", v) for v in changed(lookup_columns[table]))
+    return tags
+
+
+def collect_written(session: Session, context: Any) -> None:
+    """Invalidate cached results depending on flushed objects \
+        (and remember them to invalidate again after commit)."""
+
+    tags: set[Tag] = set()
+    for objs, persistent in [(session.new, False), (session.dirty, True),
+                             (session.deleted, False)]:
+        for o in objs:
+            if isinstance(o, Base):
+                tags |= written_tags(inspect(o), persistent)
+    if tags:
+        cache.invalidate(tags)
+        session.info.setdefault("written", set()).update(tags)
+
+
+def written_people(session: Session, ids: Iterable[int],
+                   surnames: Iterable[str | None]) -> None:
+    """Invalidate cached results of people written without objects, \
+        of their events and of lookups of their (old and new) surnames \
+            (and remember them to invalidate again after commit).
+
+    Arguments:
+
+    - `session` - `sqlalchemy.orm.Session` object
+    - `ids` - ids of the people
+    - `surnames` - old and new surnames of the people"""
+
+    ids = list(ids)
+    tags: set[Tag] = {(Person.__tablename__, i) for i in ids}
+    tags.update((Person.__tablename__, "lookup", s) for s in surnames)
+    for i in range(0, len(ids), IN_CHUNK):
+        tags.update((Event.__tablename__, e) for e in session.scalars(
+            select(participation.c.event_id).where(
+                participation.c.person_id.in_(ids[i:i + IN_CHUNK]))))
+    cache.invalidate(tags)
+    session.info.setdefault("written", set()).update(tags)
+
+
+def invalidate_written(session: Session) -> None:
+    """Invalidate cached results depending on committed objects."""
+
+    tags = session.info.pop("written", None)
+    if tags:
+        cache.invalidate(tags)
+
+
+def forget_written(session: Session) -> None:
+    """Forget flushed objects of a rolled back transaction."""
+
+    session.info.pop("written", None)
+
+
+session_listeners: list[tuple[str, Callable[..., None]]] = [
+    ("before_flush", remove_collisions),
+    ("after_flush", store_collisions),
+    ("after_flush", log_flushed),
+    ("after_flush", collect_written),
+    ("after_commit", invalidate_written),
+    ("after_rollback", forget_written)
+]
+"""Listeners (in order) keeping collisions, `change_log` and `cache` \
+    in step with flushed objects - registered only on sessions of `init` \
+        (and of `sch_async_tools.init`), not on every `Session`."""
+
+
+def listen_session_events(target: sessionmaker[Session] | type[Session]) \
+        -> None:
+    """Register `session_listeners` on sessions of a session factory.
+
+    Arguments:
+
+    - `target` - `sqlalchemy.orm.sessionmaker` object \
+        or a subclass of `sqlalchemy.orm.Session` (e.g. of async sessions)"""
+
+    for identifier, listener in session_listeners:
+        event.listen(target, identifier, listener)
+
+
+def cache_key(instr: dict[str, Any]) -> tuple[Any, ...]:
+    """Return a key of the result of an instruction in `cache` \
+        - table, action and given (not list) properties of the worker.
+
+    Arguments:
+
+    - `instr` - dictionary with info about the action"""
+
+    properties = workers[instr["table"]].properties
+    return (instr["table"], instr["action"], tuple(sorted(
+        (k, v) for k, v in instr.items()
+        if k in properties and v is not None and not isinstance(v, list))))
 
 
 def act(instr: dict[str, Any]) -> dict[str, Any] | list[dict[str, Any]]:
-    """Perform an action on a database according to `dict`.
+    """Perform an action on a database according to `dict`. \
+        Results of `cached_actions` are read through `cache` \
+            (they are shared, so they must not be modified).
 
     Arguments:
 
@@ -726,34 +3362,189 @@ def act(instr: dict[str, Any]) -> dict[str, Any] | list[dict[str, Any]]:
         that we want to perform (name of that action, table, \
             parameters of the query)"""
 
-    engine = create_engine("sqlite:///schedule.db", echo=False)
-    Base.metadata.create_all(engine)
-
     action = instr["action"]
     table = instr["table"]
 
-    workers = {
-        "people": PersonWorker,
-        "events": EventWorker,
-        "places": PlaceWorker
-    }
+    if action in cached_actions:
+        key = cache_key(instr)
+        version = cache.version
+        res = cache.get(key)
+        if res is not None:
+            return res
 
     s: Worker = workers[table](instr)
 
-    with init() as session:
-        DBItem = Person | Event | Place
-        s2: DBItem | list[DBItem] | dict[str,
-                                         str] = getattr(s, action)(session)
-        if s2 is None:
-            res: dict[str, Any] | list[dict[str, Any]] = {"msg": "Not found"}
+    with init(action in write_actions) as session:
+        res = serialize_result(getattr(s, action)(session))
+        session.commit()
+
+    if action in cached_actions:
+        cache.put(key, res, read_tags(type(s).model, res, instr), version)
+    return res
+
+
+write_actions = ["add", "update", "delete", "rebuild"]
+"""Actions of `act` writing to the database."""
+
+batch_actions = ["add", "update", "delete", "upsert"]
+"""Actions which can be performed by `act_many`."""
+
+
+def act_many(instrs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Perform many actions (`add`, `update`, `delete` or `upsert`) \
+        on a database in one transaction (see `perform_many`).
+
+    Arguments:
+
+    - `instrs` - list of dictionaries with info about actions \
+        that we want to perform (name of the action, table, \
+            parameters of the query)"""
+
+    with init(write=True) as session:
+        res = perform_many(session, instrs)
+        session.commit()
+
+    return res
+
+
+def perform_many(session: Session, instrs: list[dict[str, Any]]) \
+        -> list[dict[str, Any]]:
+    """Perform many actions (`add`, `update`, `delete` or `upsert`) \
+        in `session`. Consecutive `add` actions on the same table \
+            are performed at once (see `Worker.add_many`), \
+                as well as consecutive `upsert` actions on people \
+                    (see `PersonWorker.upsert_many`). \
+                        Return a list with a result for each instruction: \
+                            `{"ok": True, "id": ...}` \
+                                (with `"status"` after upsert \
+                                    or `{"ok": True, "msg": ...}` \
+                                        after deletion) \
+                                            or `{"ok": False, "error": ...}`. \
+                                                Failed instructions do not \
+                                                    affect the other ones.
+
+    Arguments:
+
+    - `session` - `sqlalchemy.orm.Session` object
+    - `instrs` - list of dictionaries with info about actions"""
+
+    res: list[dict[str, Any]] = []
+
+    for (table, action), group in itertools.groupby(
+            instrs, key=lambda i: (i.get("table"), i.get("action"))):
+        group_instrs = list(group)
+        if table not in workers or action not in batch_actions:
+            res += [{"ok": False,
+                     "error": f"Unsupported action {action} on {table}"}
+                    for _ in group_instrs]
+        elif action == "add":
+            for p in workers[table].add_many(session, group_instrs):
+                res.append({"ok": False, "error": str(p)}
+                           if isinstance(p, Exception)
+                           else {"ok": True, "id": p.id})
+        elif action == "upsert":
+            if workers[table] is not PersonWorker:
+                res += [{"ok": False,
+                         "error": f"Unsupported action {action} on {table}"}
+                        for _ in group_instrs]
+                continue
+            try:
+                with session.begin_nested():
+                    upserted = PersonWorker.upsert_many(session, group_instrs)
+            except batch_errors as e:
+                upserted = [e] * len(group_instrs)
+            for u in upserted:
+                res.append({"ok": False, "error": str(u)}
+                           if isinstance(u, Exception)
+                           else {"ok": True, "id": u[1], "status": u[0]})
         else:
-            if not isinstance(s2, dict):
-                if isinstance(s2, list):
-                    res = [r.serialize() for r in s2]
+            for instr in group_instrs:
+                try:
+                    with session.begin_nested():
+                        s = getattr(workers[table](instr), action)(session)
+                except batch_errors as e:
+                    res.append({"ok": False, "error": str(e)})
+                    continue
+                if s is None:
+                    res.append({"ok": False, "error": "Not found"})
+                elif isinstance(s, dict):
+                    res.append({"ok": True} | s)
                 else:
-                    res = s2.serialize()
-            else:
-                res = s2
-        session.commit()
+                    res.append({"ok": True, "id": s.id})
 
     return res
+
+
+def act_stream(instr: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    """Perform a streaming action (e.g. `collisions_all`) \
+        on a database according to `instr` and yield its results \
+            one by one. The session is open until the results are exhausted.
+
+    Arguments:
+
+    - `instr` - dictionary with info about action \
+        that we want to perform (name of that action, table, \
+            parameters of the query)"""
+
+    s: Worker = workers[instr["table"]](instr)
+
+    with init() as session:
+        yield from getattr(s, instr["action"])(session)
+        session.commit()
+
+
+def archive(before: datetime.datetime,
+            chunk_size: int = ARCHIVE_CHUNK) -> dict[str, Any]:
+    """Move events which ended (with all occurrences) before `before` \
+        with their links to invited people to `events_archive` \
+            and `participation_archive`. Events are moved oldest first, \
+                `chunk_size` of them in one transaction, \
+                    so other writers wait at most for one chunk. \
+                        Archived events are logged as deleted \
+                            in `change_log` (and their invitees \
+                                as updated). Return dictionary \
+                                    with numbers of archived events \
+                                        and of transactions (`chunks`).
+
+    Arguments:
+
+    - `before` - cutoff date
+    - `chunk_size` - number of events moved in one transaction"""
+
+    events: Table = Event.__table__  # type: ignore[assignment]
+    archived = chunks = 0
+
+    with init(write=True) as session:
+        while True:
+            # range scan of ix_events_start_end
+            ids = list(session.scalars(
+                select(Event.id)
+                .where(Event.start_date < before, last_end < before)
+                .order_by(Event.start_date).limit(chunk_size)))
+            if not ids:
+                break
+            connection = session.connection()
+            update_collisions(connection, [], ids)
+            connection.execute(insert(events_archive).from_select(
+                [c.name for c in events.columns],
+                select(events).where(events.c.id.in_(ids))))
+            connection.execute(insert(participation_archive).from_select(
+                ["event_id", "person_id"],
+                select(participation.c.event_id, participation.c.person_id)
+                .where(participation.c.event_id.in_(ids))))
+            people = set(connection.scalars(
+                select(participation.c.person_id)
+                .where(participation.c.event_id.in_(ids))))
+            connection.execute(delete(participation)
+                               .where(participation.c.event_id.in_(ids)))
+            connection.execute(delete(events)
+                               .where(events.c.id.in_(ids)))
+            log_changes(connection, Event, ids, "delete")
+            log_changes(connection, Person, people, "update")
+            session.commit()
+            # rows are moved without objects - unseen by the cache
+            cache.clear()
+            archived += len(ids)
+            chunks += 1
+
+    return {"archived": archived, "chunks": chunks}
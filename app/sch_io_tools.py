@@ -0,0 +1,552 @@
+# --------- SCHEDULE PROJECT ---------
+# ------- Jadwiga Swierczynska -------
+# ------------ 30.12.2023 ------------
+
+"""Import and export tools - streaming data between database \
+    and CSV/JSONL files"""
+
+from __future__ import annotations
+import csv
+import datetime
+import gzip
+import io
+import itertools
+import json
+import operator
+import types
+import zlib
+from typing import Any, IO, BinaryIO, Iterable, Iterator
+from sqlalchemy import insert, select, Connection, Table
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+import sch_db_tools as dbt
+
+
+IMPORT_CHUNK = 5000
+"""Default number of rows inserted (and committed) at once by imports."""
+
+EXPORT_CHUNK = 5000
+"""Number of rows fetched at once by exports."""
+
+models: dict[str, type[dbt.Base]] = {
+    "people": dbt.Person,
+    "events": dbt.Event,
+    "places": dbt.Place
+}
+"""Database classes for each table."""
+
+links: dict[str, tuple[str, str, str, type[dbt.Base]]] = {
+    "people": ("participates", "person_id", "event_id", dbt.Event),
+    "events": ("invitees", "event_id", "person_id", dbt.Person)
+}
+"""List properties stored in `person_event` table for each table \
+    - name of the property, column of the row's id, \
+        column of the related ids and class of related objects."""
+
+date_columns = ["start_date", "end_date", "repeat_until", "series_end"]
+int_columns = ["id", "street_number", "place_id", "repeat_every",
+               "repeat_count"]
+
+
+def parse_date(s: str | datetime.datetime) -> datetime.datetime:
+    """Parse a date in ISO format or in format `dd-mm-yyyy hh:mm` \
+        (as in the command-line application).
+
+    Arguments:
+
+    - `s` - string to be parsed (or already parsed date)"""
+
+    if isinstance(s, datetime.datetime):
+        return s
+    try:
+        return datetime.datetime.fromisoformat(s)
+    except ValueError:
+        return datetime.datetime.strptime(s, "%d-%m-%Y %H:%M")
+
+
+def convert(row: dict[str, Any]) -> dict[str, Any]:
+    """Convert values of a row read from a file \
+        (CSV values are strings - empty strings are treated as missing, \
+            lists are separated by spaces). Return converted row.
+
+    Arguments:
+
+    - `row` - dictionary read from CSV or JSONL file"""
+
+    res: dict[str, Any] = {}
+    for k, v in row.items():
+        if v is None or v == "":
+            continue
+        if k in date_columns:
+            v = parse_date(v)
+        elif k in int_columns:
+            v = int(v)
+        elif k in ("participates", "invitees"):
+            v = [int(i) for i in (v.split() if isinstance(v, str) else v)]
+        elif k == "repeat_except" and not isinstance(v, str):
+            v = " ".join(v)
+        res[k] = v
+    return res
+
+
+def validate(model: type[dbt.Base], properties: Iterable[str],
+             row: dict[str, Any]) -> dict[str, Any]:
+    """Run the `validates` rules of `model` on values from `row` \
+        in the order of `properties` (as when creating an object), \
+            without creating the (costly) database object. \
+                Return the row with values returned by the rules \
+                    (stored as by the database classes, \
+                        e.g. normalized `repeat_except`).
+
+    Arguments:
+
+    - `model` - `Event`, `Place` or `Person`
+    - `properties` - names of the properties
+    - `row` - dictionary with converted values"""
+
+    validators = model.__mapper__.validators
+    obj = types.SimpleNamespace(**{p: None for p in properties})
+    res = dict(row)
+    for p in properties:
+        if p in row:
+            v = row[p]
+            if p in validators:
+                v = validators[p][0](obj, p, v)
+            setattr(obj, p, v)
+            res[p] = v
+    return res
+
+
+def read_rows(file: IO[str], format: str) -> Iterator[dict[str, Any]]:
+    """Yield rows (dictionaries) read from `file` one by one.
+
+    Arguments:
+
+    - `file` - opened text file
+    - `format` - `"csv"` (with a header line) \
+        or `"jsonl"` (one JSON object per line)"""
+
+    if format == "csv":
+        yield from csv.DictReader(file)
+    else:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_rows(connection: Connection, t: Table,
+               values: list[dict[str, Any]]) -> int:
+    """Insert rows to table `t` of an SQLite database with one \
+        `executemany` call of the driver's cursor (values are converted \
+            by the types of the columns, as by SQLAlchemy, without its \
+                per-row overhead). Return `last_insert_rowid()`.
+
+    Arguments:
+
+    - `connection` - `sqlalchemy.Connection` object
+    - `t` - table
+    - `values` - list of rows (each with the same columns)"""
+
+    columns = list(values[0])
+    dialect = connection.dialect
+    processors = [t.c[c].type.dialect_impl(dialect).bind_processor(dialect)
+                  for c in columns]
+    quote = dialect.identifier_preparer
+    statement = (f"INSERT INTO {quote.format_table(t)} "
+                 f"({', '.join(quote.quote(c) for c in columns)}) "
+                 f"VALUES ({', '.join('?' * len(columns))})")
+    rows = [[v[c] if p is None else p(v[c])
+             for c, p in zip(columns, processors)] for v in values]
+    dbapi = dialect.loaded_dbapi
+    cursor = connection.connection.cursor()
+    try:
+        cursor.executemany(statement, rows)
+        return cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+    except dbapi.Error as e:
+        raise DBAPIError.instance(statement, rows, e, dbapi.Error)
+    finally:
+        cursor.close()
+
+
+def insert_rows(connection: Connection, t: Table,
+                values: list[dict[str, Any]]) -> list[int]:
+    """Insert rows to table `t` and return their ids (assigned \
+        by the database to rows without them) in the order of `values`. \
+            On SQLite the rows are inserted at once by `write_rows` \
+                - they get consecutive ids ending with `last_insert_rowid()`, \
+                    as nobody else can insert during the write transaction \
+                        (`BEGIN IMMEDIATE`); rows with given ids \
+                            are inserted one by one. Other databases use \
+                                one `INSERT ... RETURNING` statement.
+
+    Arguments:
+
+    - `connection` - `sqlalchemy.Connection` object (in a write transaction)
+    - `t` - table
+    - `values` - list of rows (each with the same columns)"""
+
+    if not values:
+        return []
+    if connection.dialect.name != "sqlite":
+        return list(connection.scalars(
+            insert(t).returning(t.c.id, sort_by_parameter_order=True),
+            values))
+    if any(v.get("id") is not None for v in values):
+        return [write_rows(connection, t, [v]) for v in values]
+    last = write_rows(connection, t, values)
+    return list(range(last - len(values) + 1, last + 1))
+
+
+def insert_chunk(session: Session, table: str, values: list[dict[str, Any]],
+                 related: list[list[int]]) -> list[int]:
+    """Insert validated rows (see `insert_rows`) and their links \
+        to related objects (see `write_rows`) skipping ids \
+            of non-existing objects. Interval \
+                and search indexes get the rows at once afterwards \
+                    (see `dbt.deferred_indexes`). Return ids of the rows \
+                        (to be logged and checked for collisions \
+                            by `finish_import`).
+
+    Arguments:
+
+    - `session` - `sqlalchemy.orm.Session` object
+    - `table` - table name (`"people"`, `"events"` or `"places"`)
+    - `values` - list of rows (each with all columns of the table)
+    - `related` - list of related ids for each row"""
+
+    t: Table = models[table].__table__  # type: ignore[assignment]
+
+    connection = session.connection()
+    with dbt.deferred_indexes(connection, models[table]) as ids:
+        ids += insert_rows(connection, t, values)
+
+    if table in links and any(related):
+        # links to non-existing objects are skipped
+        _, own, other, model = links[table]
+        wanted = {i for r in related for i in r}
+        existing: set[int] = set()
+        for condition in dbt.id_chunks(model.id, wanted):
+            existing.update(connection.scalars(
+                select(model.id).where(condition)))
+        rows = [{own: id, other: i} for id, r in zip(ids, related)
+                for i in r if i in existing]
+        if rows and connection.dialect.name == "sqlite":
+            write_rows(connection, dbt.participation, rows)
+        elif rows:
+            connection.execute(insert(dbt.participation), rows)
+    return ids
+
+
+def finish_import(session: Session, table: str, ids: list[int]) -> None:
+    """Log imported rows (see `dbt.log_changes`) and objects linked \
+        to them (as updated, as when adding objects) and store collisions \
+            of imported events (see `dbt.update_collisions`) - once \
+                for all chunks of an import.
+
+    Arguments:
+
+    - `session` - `sqlalchemy.orm.Session` object
+    - `table` - table name (`"people"`, `"events"` or `"places"`)
+    - `ids` - ids of all imported rows"""
+
+    connection = session.connection()
+    dbt.log_changes(connection, models[table], ids, "add")
+    if table in links:
+        _, own, other, model = links[table]
+        linked: set[int] = set()
+        for condition in dbt.id_chunks(dbt.participation.c[own], ids):
+            linked.update(connection.scalars(
+                select(dbt.participation.c[other]).where(condition)))
+        dbt.log_changes(connection, model, linked, "update")
+    if table == "events":
+        dbt.update_collisions(connection, ids)
+
+
+def import_rows(table: str, rows: Iterable[dict[str, Any]],
+                chunk_size: int = IMPORT_CHUNK) -> dict[str, Any]:
+    """Import rows to a table. Rows are validated \
+        (with the `validates` rules of the database classes), \
+            inserted and committed in chunks of `chunk_size` rows. \
+                Ids of related objects are resolved in bulk \
+                    (ids of non-existing objects are skipped, \
+                        as in `add` action). Imported rows are logged \
+                            and their collisions stored once at the end \
+                                (see `finish_import`). Return \
+                                    a dictionary with numbers \
+                                        of imported and failed rows \
+                                            and the errors.
+
+    Arguments:
+
+    - `table` - table name (`"people"`, `"events"` or `"places"`)
+    - `rows` - iterable of dictionaries (e.g. from `read_rows`)
+    - `chunk_size` - number of rows inserted and committed at once"""
+
+    model = models[table]
+    properties = dbt.workers[table].properties \
+        | dbt.workers[table].optional_properties
+    columns = [c.name for c in model.__table__.columns]
+    required = [c.name for c in model.__table__.columns
+                if not c.nullable and not c.primary_key]
+    link = links[table][0] if table in links else None
+
+    ids: list[int] = []
+    errors: list[dict[str, Any]] = []
+    numbered = enumerate(rows, 1)
+
+    with dbt.init(write=True) as session:
+        while chunk := list(itertools.islice(numbered, chunk_size)):
+            values: list[dict[str, Any]] = []
+            related: list[list[int]] = []
+            lines: list[int] = []
+            for n, row in chunk:
+                try:
+                    row = convert(row)
+                    for c in required:
+                        if row.get(c) is None:
+                            raise ValueError(f"Missing {c}")
+                    row = validate(model, properties, row)
+                    value = {c: row.get(c) for c in columns}
+                    if "series_end" in value:
+                        value["series_end"] = dbt.series_end(value)
+                except (ValueError, TypeError) as e:
+                    errors.append({"row": n, "error": str(e)})
+                    continue
+                values.append(value)
+                related.append(list(dict.fromkeys(row.get(link) or []))
+                               if link else [])
+                lines.append(n)
+
+            try:
+                with session.begin_nested():
+                    ids += insert_chunk(session, table, values, related)
+            except dbt.batch_errors:
+                # find the failing rows - insert them one by one
+                for v, r, n in zip(values, related, lines):
+                    try:
+                        with session.begin_nested():
+                            ids += insert_chunk(session, table, [v], [r])
+                    except dbt.batch_errors as e:
+                        errors.append({"row": n, "error": str(e)})
+            session.commit()
+            # rows are inserted without objects - unseen by the cache
+            dbt.cache.clear()
+
+        finish_import(session, table, ids)
+        session.commit()
+        dbt.cache.clear()
+
+    return {"table": table, "imported": len(ids),
+            "failed": len(errors), "errors": errors}
+
+
+def import_file(table: str, file: IO[str], format: str | None = None,
+                chunk_size: int = IMPORT_CHUNK) -> dict[str, Any]:
+    """Import a CSV or JSONL file to a table (see `import_rows`).
+
+    Arguments:
+
+    - `table` - table name (`"people"`, `"events"` or `"places"`)
+    - `file` - opened text file
+    - `format` - `"csv"` or `"jsonl"` \
+        (by default guessed from the file name, JSONL if unknown)
+    - `chunk_size` - number of rows inserted and committed at once"""
+
+    if format is None:
+        format = "csv" if getattr(file, "name", "").endswith(".csv") \
+            else "jsonl"
+    return import_rows(table, read_rows(file, format), chunk_size)
+
+
+def upsert_rows(rows: Iterable[dict[str, Any]],
+                chunk_size: int = dbt.PersonWorker.upsert_chunk) \
+        -> dict[str, Any]:
+    """Add or update people matched by email \
+        (see `dbt.PersonWorker.upsert_many`), committing `chunk_size` rows \
+            at once. Return a dictionary with numbers of created, updated, \
+                unchanged and failed rows and the errors.
+
+    Arguments:
+
+    - `rows` - iterable of dictionaries (e.g. from `read_rows`)
+    - `chunk_size` - number of rows written and committed at once"""
+
+    counts = {"created": 0, "updated": 0, "unchanged": 0}
+    errors: list[dict[str, Any]] = []
+    numbered = enumerate(rows, 1)
+
+    with dbt.init(write=True) as session:
+        while chunk := list(itertools.islice(numbered, chunk_size)):
+            instrs: list[dict[str, Any]] = []
+            lines: list[int] = []
+            for n, row in chunk:
+                try:
+                    instrs.append(convert(row))
+                except (ValueError, TypeError) as e:
+                    errors.append({"row": n, "error": str(e)})
+                    continue
+                lines.append(n)
+
+            res = dbt.PersonWorker.upsert_many(session, instrs)
+            session.commit()
+            for n, r in zip(lines, res):
+                if isinstance(r, Exception):
+                    errors.append({"row": n, "error": str(r)})
+                else:
+                    counts[r[0]] += 1
+
+    return {"table": "people"} | counts \
+        | {"failed": len(errors), "errors": errors}
+
+
+def upsert_file(file: IO[str], format: str | None = None,
+                chunk_size: int = dbt.PersonWorker.upsert_chunk) \
+        -> dict[str, Any]:
+    """Add or update people from a CSV or JSONL file (see `upsert_rows`).
+
+    Arguments:
+
+    - `file` - opened text file
+    - `format` - `"csv"` or `"jsonl"` \
+        (by default guessed from the file name, JSONL if unknown)
+    - `chunk_size` - number of rows written and committed at once"""
+
+    if format is None:
+        format = "csv" if getattr(file, "name", "").endswith(".csv") \
+            else "jsonl"
+    return upsert_rows(read_rows(file, format), chunk_size)
+
+
+# Export ---------------------------
+
+def export_rows(table: str) -> Iterator[dict[str, Any]]:
+    """Yield all rows of a table (ordered by id) as dictionaries, \
+        in the format accepted by `import_rows` \
+            (related ids are read with the rows by one outer join, \
+                in order, and aggregated into a string of ids separated \
+                    by spaces - the same on every database). \
+                        Rows are read with one `SELECT` without creating \
+                            database objects.
+
+    Arguments:
+
+    - `table` - table name (`"people"`, `"events"` or `"places"`)"""
+
+    t: Table = models[table].__table__  # type: ignore[assignment]
+    stmt = select(*t.columns).order_by(t.c.id)
+    if table not in links:
+        with dbt.init() as session:
+            for row in session.execute(
+                    stmt.execution_options(yield_per=EXPORT_CHUNK)):
+                yield row._asdict()
+        return
+
+    prop, own, other, _ = links[table]
+    related = dbt.participation.c[other]
+    stmt = stmt.add_columns(related.label(prop))\
+        .outerjoin(dbt.participation, dbt.participation.c[own] == t.c.id)\
+        .order_by(related).execution_options(yield_per=EXPORT_CHUNK)
+    with dbt.init() as session:
+        for _, rows in itertools.groupby(session.execute(stmt),
+                                         operator.attrgetter("id")):
+            first, *others = rows
+            row = first._asdict()
+            if row[prop] is not None:
+                ids = [row[prop], *(getattr(r, prop) for r in others)]
+                row[prop] = " ".join(map(str, ids))
+            yield row
+
+
+def export_lines(table: str, format: str) -> Iterator[str]:
+    """Yield lines of a CSV (with a header line) or JSONL export of a table \
+        (see `export_rows`). Dates are written in ISO format.
+
+    Arguments:
+
+    - `table` - table name (`"people"`, `"events"` or `"places"`)
+    - `format` - `"csv"` or `"jsonl"`"""
+
+    rows = export_rows(table)
+
+    if format == "csv":
+        columns = [c.name for c in models[table].__table__.columns]
+        if table in links:
+            columns.append(links[table][0])
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, columns)
+        writer.writeheader()
+        for row in rows:
+            for c in date_columns:
+                if row.get(c) is not None:
+                    row[c] = row[c].isoformat()
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    else:
+        link = links[table][0] if table in links else None
+        for row in rows:
+            if link is not None:
+                row[link] = [int(i) for i in (row[link] or "").split()]
+            yield json.dumps(row, default=datetime.datetime.isoformat) + "\n"
+
+
+def export_chunks(table: str, format: str, compress: bool = False) \
+        -> Iterator[bytes]:
+    """Yield an export of a table (see `export_lines`) as chunks of bytes, \
+        optionally compressed with gzip.
+
+    Arguments:
+
+    - `table` - table name (`"people"`, `"events"` or `"places"`)
+    - `format` - `"csv"` or `"jsonl"`
+    - `compress` - compress the export with gzip"""
+
+    lines = (line.encode() for line in export_lines(table, format))
+    if not compress:
+        yield from lines
+        return
+
+    compressor = zlib.compressobj(wbits=31)
+    for line in lines:
+        chunk = compressor.compress(line)
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+def export_file(table: str, file: BinaryIO, format: str | None = None,
+                compress: bool = False) -> dict[str, Any]:
+    """Export a table to a file (see `export_lines`). \
+        Return a dictionary with the number of exported rows.
+
+    Arguments:
+
+    - `table` - table name (`"people"`, `"events"` or `"places"`)
+    - `file` - file opened for writing in binary mode
+    - `format` - `"csv"` or `"jsonl"` \
+        (by default guessed from the file name, JSONL if unknown)
+    - `compress` - compress the export with gzip \
+        (also if the file name ends with `.gz`)"""
+
+    name = getattr(file, "name", "")
+    name = name if isinstance(name, str) else ""
+    if name.endswith(".gz"):
+        compress = True
+        name = name[:-3]
+    if format is None:
+        format = "csv" if name.endswith(".csv") else "jsonl"
+
+    out: BinaryIO = gzip.GzipFile(fileobj=file, mode="wb") if compress \
+        else file
+    exported = 0
+    for line in export_lines(table, format):
+        out.write(line.encode())
+        exported += 1
+    if compress:
+        out.close()
+    file.flush()
+
+    if format == "csv":
+        exported -= 1
+    return {"table": table, "exported": exported}
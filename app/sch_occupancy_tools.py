@@ -0,0 +1,267 @@
+# --------- SCHEDULE PROJECT ---------
+# ------- Jadwiga Swierczynska -------
+# ------------ 30.12.2023 ------------
+
+"""Occupancy tools - booked time slots of places as NumPy arrays \
+    (availability, utilization and free windows of many places \
+        computed by vectorized operations)"""
+
+from __future__ import annotations
+import datetime
+import threading
+from typing import Any, Iterable
+
+try:
+    import numpy as np
+except ImportError:  # optional - needed only for occupancy of places
+    np = None
+
+
+ORIGIN = datetime.datetime(2000, 1, 3)
+"""Beginning of slot 0 (a Monday) - slots are counted from it \
+    (slots before it have negative numbers)."""
+
+MINUTE = datetime.timedelta(minutes=1)
+
+
+def require_numpy() -> None:
+    """Raise `ModuleNotFoundError` if NumPy is not installed."""
+
+    if np is None:
+        raise ModuleNotFoundError(
+            "Occupancy of places requires numpy package")
+
+
+def minutes(dates: Iterable[datetime.datetime]) -> Any:
+    """Return array (`int64`) of minutes from `ORIGIN` to `dates` \
+        (rounded down).
+
+    Arguments:
+
+    - `dates` - dates to be converted"""
+
+    return np.fromiter(((d - ORIGIN) // MINUTE for d in dates),
+                       dtype=np.int64)
+
+
+def booked_rows(rows: Any, starts: Any, ends: Any, height: int, begin: int,
+                width: int, resolution: int) -> Any:
+    """Return boolean matrix `height` x `width` of booked slots \
+        (`resolution` minutes each, the first one starting `begin` minutes \
+            after `ORIGIN`) - slot `j` of row `rows[i]` is booked \
+                if it overlaps the interval from `starts[i]` to `ends[i]` \
+                    (minutes after `ORIGIN`). Intervals are marked at once \
+                        by a difference array summed along rows.
+
+    Arguments:
+
+    - `rows` - array of row numbers of intervals
+    - `starts`, `ends` - arrays of minutes of intervals
+    - `height` - number of rows
+    - `begin` - minute of the beginning of the first slot
+    - `width` - number of slots
+    - `resolution` - length of a slot in minutes"""
+
+    first = np.clip((starts - begin) // resolution, 0, width)
+    last = np.clip(-((begin - ends) // resolution), 0, width)
+    # a zero-length event still books the slot it starts in
+    last = np.where((last == first) & (starts == ends) & (first < width),
+                    first + 1, last)
+    diff = np.zeros((height, width + 1), dtype=np.int32)
+    np.add.at(diff, (rows, first), 1)
+    np.add.at(diff, (rows, last), -1)
+    return np.cumsum(diff[:, :-1], axis=1) > 0
+
+
+def slot_mask(begin: int, width: int, resolution: int,
+              day_from: datetime.time | None = None,
+              day_to: datetime.time | None = None,
+              weekdays: Iterable[int] | None = None) -> Any:
+    """Return boolean array of `width` slots (the first one starting \
+        `begin` minutes after `ORIGIN`) overlapping the daily time window \
+            from `day_from` to `day_to` (the whole day if not given) \
+                on `weekdays` (every day if not given).
+
+    Arguments:
+
+    - `begin` - minute of the beginning of the first slot
+    - `width` - number of slots
+    - `resolution` - length of a slot in minutes
+    - `day_from`, `day_to` - daily time window
+    - `weekdays` - days of the week (0 - Monday, ..., 6 - Sunday)"""
+
+    starts = begin + resolution * np.arange(width, dtype=np.int64)
+    day = starts % (24 * 60)
+    mask = np.ones(width, dtype=bool)
+    if day_from is not None:
+        mask &= day + resolution > day_from.hour * 60 + day_from.minute
+    if day_to is not None:
+        mask &= day < day_to.hour * 60 + day_to.minute
+    if weekdays is not None:
+        mask &= np.isin(starts // (24 * 60) % 7, list(weekdays))
+    return mask
+
+
+def available(booked: Any, mask: Any) -> Any:
+    """Return boolean array - which rows of `booked` have no booked slot \
+        selected by `mask`.
+
+    Arguments:
+
+    - `booked` - boolean matrix of booked slots (rows - places)
+    - `mask` - boolean array of selected slots"""
+
+    return ~(booked & mask).any(axis=1)
+
+
+def utilization(booked: Any, mask: Any) -> Any:
+    """Return array - share of booked slots selected by `mask` \
+        in each row of `booked` (0 if no slot is selected).
+
+    Arguments:
+
+    - `booked` - boolean matrix of booked slots (rows - places)
+    - `mask` - boolean array of selected slots"""
+
+    selected = int(mask.sum())
+    if selected == 0:
+        return np.zeros(booked.shape[0])
+    return (booked & mask).sum(axis=1) / selected
+
+
+def free_windows(booked: Any, mask: Any, begin: int, resolution: int) \
+        -> list[tuple[datetime.datetime, datetime.datetime]]:
+    """Return list of `(start, end)` of maximal runs of slots selected \
+        by `mask` in which no row of `booked` is booked \
+            (e.g. windows in which all places are free).
+
+    Arguments:
+
+    - `booked` - boolean matrix of booked slots (rows - places)
+    - `mask` - boolean array of selected slots
+    - `begin` - minute of the beginning of the first slot
+    - `resolution` - length of a slot in minutes"""
+
+    free = np.concatenate(([False], mask & ~booked.any(axis=0), [False]))
+    edges = np.flatnonzero(np.diff(free.astype(np.int8)))
+    return [(ORIGIN + (begin + resolution * int(s)) * MINUTE,
+             ORIGIN + (begin + resolution * int(e)) * MINUTE)
+            for s, e in zip(edges[::2], edges[1::2])]
+
+
+class Occupancy():
+    """Booked slots of places in blocks of `block_days` days \
+        - each block holds sorted ids of places booked in it \
+            and a boolean matrix of their slots. Blocks are built \
+                on demand and dropped when events in them change \
+                    (blocks of each event are remembered)."""
+
+    def __init__(self: Occupancy, resolution: int = 15,
+                 block_days: int = 7) -> None:
+        """Initialize empty occupancy.
+
+        Arguments:
+
+        - `resolution` - length of a slot in minutes \
+            (a divisor of the length of a day)
+        - `block_days` - number of days in one block"""
+
+        if resolution <= 0 or (24 * 60) % resolution:
+            raise ValueError("Resolution must divide the length of a day")
+        self.resolution = resolution
+        self.width = block_days * 24 * 60 // resolution
+        """Number of slots in one block."""
+        self.blocks: dict[int, tuple[Any, Any]] = {}
+        self.event_blocks: dict[int, set[int]] = {}
+        self.seq: int | None = None
+        """Sequence number of the last applied change of events."""
+        self.lock = threading.Lock()
+
+    def block_of(self: Occupancy, date: datetime.datetime) -> int:
+        """Return number of the block containing `date`."""
+
+        return (date - ORIGIN) // MINUTE // (self.resolution * self.width)
+
+    def block_begin(self: Occupancy, block: int) -> int:
+        """Return minute (after `ORIGIN`) of the beginning of `block`."""
+
+        return block * self.resolution * self.width
+
+    def put(self: Occupancy, block: int, ids: Any, starts: Any, ends: Any,
+            events: Iterable[int]) -> None:
+        """Build a block from booked intervals of places.
+
+        Arguments:
+
+        - `block` - number of the block
+        - `ids` - array of place ids of intervals
+        - `starts`, `ends` - arrays of minutes of intervals
+        - `events` - ids of events of the intervals"""
+
+        places, rows = np.unique(ids, return_inverse=True)
+        self.blocks[block] = (places, booked_rows(
+            rows, starts, ends, len(places), self.block_begin(block),
+            self.width, self.resolution))
+        for e in events:
+            self.event_blocks.setdefault(e, set()).add(block)
+
+    def drop(self: Occupancy, events: Iterable[int],
+             extents: Iterable[tuple[datetime.datetime,
+                                     datetime.datetime]]) -> None:
+        """Drop blocks of changed events - blocks in which they were \
+            (when the blocks were built) and blocks overlapping \
+                their current `extents`.
+
+        Arguments:
+
+        - `events` - ids of changed events
+        - `extents` - `(start, end)` of current extents of the events \
+            (from the start to the end of the last occurrence)"""
+
+        dropped: set[int] = set()
+        for e in events:
+            dropped |= self.event_blocks.pop(e, set())
+        for start, end in extents:
+            first, last = self.block_of(start), self.block_of(end)
+            dropped.update(b for b in self.blocks if first <= b <= last)
+        for b in dropped:
+            self.blocks.pop(b, None)
+
+    def missing(self: Occupancy, begin: datetime.datetime,
+                end: datetime.datetime) -> list[int]:
+        """Return numbers of blocks overlapping the time range \
+            from `begin` to `end` which are not built."""
+
+        return [b for b in range(self.block_of(begin),
+                                 self.block_of(end) + 1)
+                if b not in self.blocks]
+
+    def booked(self: Occupancy, places: Iterable[int],
+               begin: datetime.datetime, end: datetime.datetime) \
+            -> tuple[Any, int]:
+        """Return boolean matrix of booked slots of `places` (rows) \
+            overlapping the time range from `begin` to `end` \
+                and minute (after `ORIGIN`) of the beginning \
+                    of the first slot. Blocks of the range must be built.
+
+        Arguments:
+
+        - `places` - ids of places
+        - `begin`, `end` - time range"""
+
+        places = np.asarray(list(places), dtype=np.int64)
+        first = (begin - ORIGIN) // MINUTE // self.resolution
+        last = -((ORIGIN - end) // MINUTE // self.resolution)
+        block = self.block_of(begin)
+        parts = []
+        for b in range(block, self.block_of(end) + 1):
+            ids, matrix = self.blocks[b]
+            part = np.zeros((len(places), self.width), dtype=bool)
+            rows = np.searchsorted(ids, places)
+            found = rows < len(ids)
+            found[found] = ids[rows[found]] == places[found]
+            part[found] = matrix[rows[found]]
+            parts.append(part)
+        offset = first - block * self.width
+        return (np.concatenate(parts, axis=1)[:, offset:offset + max(
+            last - first, 1)], first * self.resolution)
@@ -4,7 +4,7 @@
 
 """Tools for printing data - objects from database or dicts from API"""
 
-from typing import Any
+from typing import Any, Iterable
 
 
 def print_data_people(p: dict[str, Any]) -> None:
@@ -61,6 +61,14 @@ def print_data_events(p: dict[str, Any]) -> None:
     print(f"Name: {p['name']}")
     print(f"Start date: {p['start_date']}")
     print(f"End date: {p['end_date']}")
+    if p.get('repeat') is not None:
+        print(f"Repeats: {p['repeat']}, every {p['repeat_every'] or 1}")
+        if p['repeat_count'] is not None:
+            print(f"Occurrences: {p['repeat_count']}")
+        if p['repeat_until'] is not None:
+            print(f"Until: {p['repeat_until']}")
+        if p['repeat_except'] is not None:
+            print(f"Except: {p['repeat_except']}")
     print(f"Description: {p['description']}")
     print(f"Place id: {p['place_id']}")
     if 'place' in p and p['place'] is not None:
@@ -78,6 +86,196 @@ Person name: {e['name']}, Person surname: {e['surname']}""")
     print("\n")
 
 
+def print_data_collisions(p: dict[str, Any]) -> None:
+    """Print a pair of colliding events \
+        (as yielded by `collisions_all` action).
+
+    Arguments:
+
+    - `p` - dictionary with `first` and `second` event \
+        (both with `id` and `name`)"""
+
+    print(f"Event id: {p['first']['id']}, Name: {p['first']['name']} "
+          f"collides with event id: {p['second']['id']}, "
+          f"Name: {p['second']['name']}")
+
+
+def print_data_conflicts(p: dict[str, Any]) -> None:
+    """Print a pair of colliding events of one person or place \
+        (as yielded by `conflicts` and `conflicts_all` actions).
+
+    Arguments:
+
+    - `p` - dictionary with `person_id` or `place_id` \
+        and `first` and `second` event (both with `id` and `name`)"""
+
+    if "person_id" in p:
+        print(f"Person id: {p['person_id']}")
+    else:
+        print(f"Place id: {p['place_id']}")
+    print_data_collisions(p)
+
+
+def print_data_slots(p: dict[str, Any]) -> None:
+    """Print a free time slot (as returned by `free_slots` action).
+
+    Arguments:
+
+    - `p` - dictionary with `start` and `end` of the slot"""
+
+    print(f"Free: {p['start']} - {p['end']}")
+
+
+def print_data_stats(p: dict[str, Any]) -> None:
+    """Print a summary of events (as returned by `stats` action).
+
+    Arguments:
+
+    - `p` - dictionary with the time range, totals \
+        and lists `places`, `people` and `days`"""
+
+    print(f"Events from {p['from'] or 'the beginning'} "
+          f"to {p['to'] or 'the end'}: {p['events']}, "
+          f"booked hours: {p['hours']}")
+    print("Places:")
+    for r in p["places"]:
+        print(f"Place id: {r['place_id']}, Name: {r['name']}, "
+              f"Events: {r['events']}, Hours: {r['hours']}")
+    print("People:")
+    for r in p["people"]:
+        print(f"Person id: {r['person_id']}, Name: {r['name']}, "
+              f"Surname: {r['surname']}, Events: {r['events']}")
+    print("Days:")
+    for r in p["days"]:
+        print(f"{r['day']}: {r['events']}")
+    print("\n")
+
+
+def print_data_archived(p: dict[str, Any]) -> None:
+    """Print data of an archived event (as returned by `archived` action).
+
+    Arguments:
+
+    - `p` - dictionary with columns of the event \
+        and `invitees` - ids of invited people"""
+
+    print(f"Archived event: {p['id']}")
+    print(f"Name: {p['name']}")
+    print(f"Start date: {p['start_date']}")
+    print(f"End date: {p['end_date']}")
+    print(f"Description: {p['description']}")
+    print(f"Place id: {p['place_id']}")
+    print(f"Participants ids: {' '.join(map(str, p['invitees']))}")
+    print("\n")
+
+
+def print_data_available(p: dict[str, Any]) -> None:
+    """Print data of an available place (as returned by `available` action).
+
+    Arguments:
+
+    - `p` - dictionary with properties of the place \
+        and its `utilization` in the time range"""
+
+    print(f"Available place: {p['id']}")
+    print(f"Name: {p['name']}")
+    print(f"Street name: {p['street_name']}")
+    print(f"Street number: {p['street_number']}")
+    print(f"Utilization: {p['utilization']:.1%}")
+    print("\n")
+
+
+def print_data_archive(p: dict[str, Any]) -> None:
+    """Print a summary of an archival.
+
+    Arguments:
+
+    - `p` - dictionary with numbers of `archived` events \
+        and of transactions (`chunks`)"""
+
+    print(f"Archived {p['archived']} events in {p['chunks']} transactions")
+
+
+def print_data_changes(p: dict[str, Any]) -> None:
+    """Print an entry of the change log.
+
+    Arguments:
+
+    - `p` - dictionary with `seq`, `table`, `id`, `op` and `changed_at`"""
+
+    print(f"{p['seq']}: {p['op']} {p['table']} {p['id']} "
+          f"({p['changed_at']})")
+
+
+def print_data_compact(p: dict[str, Any]) -> None:
+    """Print a summary of a compaction of the change log.
+
+    Arguments:
+
+    - `p` - dictionary with the number of removed entries (`compacted`)"""
+
+    print(f"Removed {p['compacted']} entries of the change log")
+
+
+def print_data_snapshot(p: dict[str, Any]) -> None:
+    """Print a summary of a saved snapshot of events.
+
+    Arguments:
+
+    - `p` - dictionary with numbers of `events`, `occurrences` \
+        and `invitations`, `seq` of the change log and the `file`"""
+
+    print(f"Saved {p['events']} events ({p['occurrences']} occurrences, "
+          f"{p['invitations']} invitations) up to change {p['seq']} "
+          f"to {p['file']}")
+
+
+def print_data_batch(p: dict[str, Any]) -> None:
+    """Print a result of one instruction of a batch.
+
+    Arguments:
+
+    - `p` - dictionary with `ok` and `id`, `msg` or `error`"""
+
+    if not p["ok"]:
+        print(f"Error: {p['error']}")
+    elif "msg" in p:
+        print(p["msg"])
+    elif "status" in p:
+        print(f"Done: {p['id']} ({p['status']})")
+    else:
+        print(f"Done: {p['id']}")
+
+
+def print_data_import(p: dict[str, Any]) -> None:
+    """Print a summary of an import.
+
+    Arguments:
+
+    - `p` - dictionary with `table`, numbers of `imported` \
+        and `failed` rows and list of `errors`"""
+
+    print(f"Imported {p['imported']} records to {p['table']}, "
+          f"failed {p['failed']}")
+    for e in p["errors"]:
+        print(f"Row {e['row']}: {e['error']}")
+
+
+def print_data_upsert(p: dict[str, Any]) -> None:
+    """Print a summary of an upsert.
+
+    Arguments:
+
+    - `p` - dictionary with `table`, numbers of `created`, `updated`, \
+        `unchanged` and `failed` rows and list of `errors`"""
+
+    print(f"Upserted records of {p['table']}: created {p['created']}, "
+          f"updated {p['updated']}, unchanged {p['unchanged']}, "
+          f"failed {p['failed']}")
+    for e in p["errors"]:
+        print(f"Row {e['row']}: {e['error']}")
+
+
 def printer_one(res: dict[str, Any], table: str) -> None:
     """Print serialized database object \
         (or message from the database worker after deletion).
@@ -91,28 +289,53 @@ def printer_one(res: dict[str, Any], table: str) -> None:
     func = {
         "people": print_data_people,
         "events": print_data_events,
-        "places": print_data_places
+        "places": print_data_places,
+        "collisions": print_data_collisions,
+        "conflicts": print_data_conflicts,
+        "slots": print_data_slots,
+        "stats": print_data_stats,
+        "archived": print_data_archived,
+        "archive": print_data_archive,
+        "available": print_data_available,
+        "changes": print_data_changes,
+        "compact": print_data_compact,
+        "snapshot": print_data_snapshot,
+        "batch": print_data_batch,
+        "import": print_data_import,
+        "upsert": print_data_upsert
     }
 
-    if isinstance(res, dict) and "msg" in res:
+    if isinstance(res, dict) and "msg" in res and table != "batch":
         print(res["msg"])
         return
 
     func[table](res)
 
 
-def printer(res: dict[str, Any] | list[dict[str, Any]], table: str) -> None:
-    """Print single object or a list of objects \
+def printer(res: dict[str, Any] | Iterable[dict[str, Any]],
+            table: str) -> None:
+    """Print single object or a list (or any other iterable) of objects \
         - according to the type of `res`.
 
     Arguments:
 
-    - `res` - dictionary or a list of dictionaries \
+    - `res` - dictionary or an iterable of dictionaries \
         to be printed using `printer_one`
     - `table` - table name of the dictionary/dictionaries \
-        to be printed (`"people"`, `"events"` or `"places"`)"""
-    if isinstance(res, list):
+        to be printed (`"people"`, `"events"` or `"places"`) \
+            or `"collisions"`/`"conflicts"` for pairs of colliding events \
+                or `"slots"` for free time slots \
+                or `"stats"` for a summary of events \
+                or `"archived"` for archived events \
+                or `"available"` for available places \
+                or `"archive"` for a summary of an archival \
+                or `"changes"` for entries of the change log \
+                or `"compact"` for a summary of a compaction \
+                or `"snapshot"` for a summary of a saved snapshot \
+                or `"batch"`/`"import"` for results of a batch/an import \
+                or `"upsert"` for a summary of an upsert"""
+    if res is None or isinstance(res, dict):
+        printer_one(res, table)
+    else:
         for r in res:
             printer_one(r, table)
-    else:
-        printer_one(res, table)
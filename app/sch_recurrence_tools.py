@@ -0,0 +1,333 @@
+# --------- SCHEDULE PROJECT ---------
+# ------- Jadwiga Swierczynska -------
+# ------------ 30.12.2023 ------------
+
+"""Recurrence tools - occurrences of recurring events (expanded lazily) \
+    and collisions of recurrence patterns (computed arithmetically)"""
+
+from __future__ import annotations
+import calendar
+import datetime
+import math
+from typing import Any, Iterable, Iterator
+
+
+FREQUENCIES = ["daily", "weekly", "monthly"]
+"""Available frequencies of recurring events."""
+
+FOREVER = datetime.datetime(9999, 12, 31, 23, 59)
+"""End of recurring events repeated without `count` and `until`."""
+
+periods: dict[str, datetime.timedelta] = {
+    "daily": datetime.timedelta(days=1),
+    "weekly": datetime.timedelta(weeks=1)
+}
+"""Fixed periods of frequencies (months have different lengths)."""
+
+CYCLE_DAYS = 146097
+"""Number of days after which the Gregorian calendar repeats (400 years)."""
+
+_TICK = datetime.timedelta(microseconds=1)
+
+
+def parse_exceptions(value: str | Iterable[Any] | None) \
+        -> list[datetime.date]:
+    """Parse dates of skipped occurrences. Return a sorted list of dates.
+
+    Arguments:
+
+    - `value` - string of dates separated by spaces \
+        or an iterable of dates (or strings), \
+            each in ISO format or in format `dd-mm-yyyy`"""
+
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split()
+    dates: set[datetime.date] = set()
+    for v in value:
+        if isinstance(v, datetime.datetime):
+            v = v.date()
+        elif not isinstance(v, datetime.date):
+            try:
+                v = datetime.date.fromisoformat(v)
+            except ValueError:
+                v = datetime.datetime.strptime(v, "%d-%m-%Y").date()
+        dates.add(v)
+    return sorted(dates)
+
+
+def add_months(d: datetime.datetime, months: int) -> datetime.datetime | None:
+    """Return `d` moved by `months` months \
+        (`None` if the day does not exist in that month, \
+            such occurrences of monthly events are skipped).
+
+    Arguments:
+
+    - `d` - date
+    - `months` - number of months"""
+
+    year, month = divmod(d.month - 1 + months, 12)
+    year += d.year
+    if not datetime.MINYEAR <= year <= datetime.MAXYEAR \
+            or d.day > calendar.monthrange(year, month + 1)[1]:
+        return None
+    return d.replace(year=year, month=month + 1)
+
+
+def months_between(a: datetime.datetime, b: datetime.datetime) -> int:
+    """Return the number of whole calendar months from `a` to `b`."""
+
+    return (b.year - a.year) * 12 + b.month - a.month
+
+
+def extended_gcd(a: int, b: int) -> tuple[int, int, int]:
+    """Return `(g, x, y)` such that `g = gcd(a, b) = a * x + b * y`."""
+
+    x0, x1, y0, y1 = 1, 0, 0, 1
+    while b:
+        q, a, b = a // b, b, a % b
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    return a, x0, y0
+
+
+def ceil_div(a: int, b: int) -> int:
+    return -(-a // b)
+
+
+class Recurrence():
+    """Occurrences of an event - the first one from `start` to `end`, \
+        the next ones every `every` days, weeks or months \
+            (at most `count` of them or until `until`), \
+                except these starting on dates from `exceptions`. \
+                    Occurrence `k` is the `k`-th slot of the pattern \
+                        (slots of monthly events without the day \
+                            of the month are skipped)."""
+
+    def __init__(self: Recurrence, start: datetime.datetime,
+                 end: datetime.datetime, repeat: str | None = None,
+                 every: int | None = None, count: int | None = None,
+                 until: datetime.datetime | None = None,
+                 exceptions: str | Iterable[Any] | None = None) -> None:
+        """Initialize a recurrence of an event.
+
+        Arguments:
+
+        - `start` - start of the first occurrence
+        - `end` - end of the first occurrence
+        - `repeat` - frequency from `FREQUENCIES` \
+            (`None` for a single event)
+        - `every` - number of days, weeks or months between occurrences \
+            (1 by default)
+        - `count` - maximal number of occurrences
+        - `until` - maximal start of an occurrence
+        - `exceptions` - dates of skipped occurrences \
+            (see `parse_exceptions`)"""
+
+        self.start = start
+        self.duration = end - start
+        self.repeat = repeat
+        self.every = every or 1
+        self.period = periods[repeat] * self.every if repeat in periods \
+            else None
+
+        self.slots: int | None = None
+        """Number of slots (`None` if unbounded)."""
+        if repeat is None:
+            self.slots = 1
+        elif self.period is not None:
+            if count is not None:
+                self.slots = count
+            if until is not None:
+                self.slots = max(0, (until - start) // self.period + 1)
+        else:
+            if until is not None:
+                self.slots = max(0, months_between(start, until) // self.every
+                                 + 1)
+                if self.slots and self.nth(self.slots - 1) is not None \
+                        and self.nth(self.slots - 1) > until:  # type: ignore
+                    self.slots -= 1
+            if count is not None:
+                found, k = 0, 0
+                while found < count and (self.slots is None
+                                         or k < self.slots):
+                    if self.nth(k) is not None:
+                        found += 1
+                    k += 1
+                self.slots = k
+
+        self.skipped: set[int] = set()
+        """Slots of skipped occurrences."""
+        for d in parse_exceptions(exceptions):
+            k = self.slot(datetime.datetime.combine(d, start.time()))
+            if k is not None:
+                self.skipped.add(k)
+
+    @classmethod
+    def of(cls: type[Recurrence], e: Any) -> Recurrence:
+        """Return the recurrence of an event.
+
+        Arguments:
+
+        - `e` - `Event` object or row with the same columns"""
+
+        return cls(e.start_date, e.end_date, e.repeat, e.repeat_every,
+                   e.repeat_count, e.repeat_until, e.repeat_except)
+
+    def nth(self: Recurrence, k: int) -> datetime.datetime | None:
+        """Return start of slot `k` \
+            (`None` if it is skipped by the monthly pattern).
+
+        Arguments:
+
+        - `k` - number of the slot (from 0)"""
+
+        if self.repeat is None:
+            return self.start if k == 0 else None
+        if self.period is not None:
+            return self.start + self.period * k
+        return add_months(self.start, k * self.every)
+
+    def slot(self: Recurrence, start: datetime.datetime) -> int | None:
+        """Return the slot starting at `start` (or `None`).
+
+        Arguments:
+
+        - `start` - start of an occurrence"""
+
+        if self.period is not None:
+            k, rest = divmod(start - self.start, self.period)
+        else:
+            k, rest = divmod(months_between(self.start, start), self.every)
+        if rest or k < 0 or self.nth(k) != start \
+                or (self.slots is not None and k >= self.slots):
+            return None
+        return k
+
+    def end(self: Recurrence) -> datetime.datetime:
+        """Return the end of the last occurrence \
+            (`FOREVER` if the event is repeated forever)."""
+
+        if self.slots is None:
+            return FOREVER
+        for k in range(self.slots - 1, -1, -1):
+            start = self.nth(k)
+            if start is not None:
+                return start + self.duration
+        return self.start + self.duration
+
+    def occurrences(self: Recurrence,
+                    begin: datetime.datetime | None = None,
+                    end: datetime.datetime | None = None) \
+            -> Iterator[tuple[datetime.datetime, datetime.datetime]]:
+        """Yield `(start, end)` of the occurrences lazily, ordered by start \
+            - only these overlapping the window from `begin` to `end` \
+                (the first slot in the window is computed arithmetically).
+
+        Arguments:
+
+        - `begin` - beginning of the window (unbounded if `None`)
+        - `end` - end of the window (unbounded if `None`)"""
+
+        slots = self.slots
+        if slots is None:  # up to FOREVER
+            slots = (FOREVER - self.start) // self.period + 1 \
+                if self.period is not None \
+                else months_between(self.start, FOREVER) // self.every + 1
+        k = 0
+        if begin is not None and begin - self.duration > self.start:
+            if self.period is not None:
+                k = (begin - self.duration - self.start) // self.period
+            elif self.repeat is not None:
+                k = max(0, months_between(
+                    self.start, begin - self.duration) // self.every - 1)
+        while k < slots:
+            start = self.nth(k)
+            k += 1
+            if start is None or k - 1 in self.skipped:
+                continue
+            if end is not None and start > end:
+                return
+            if begin is None or start + self.duration >= begin:
+                yield start, start + self.duration
+
+    def overlaps(self: Recurrence, begin: datetime.datetime,
+                 end: datetime.datetime) -> bool:
+        """Check if any occurrence overlaps the interval \
+            from `begin` to `end` (intervals are closed).
+
+        Arguments:
+
+        - `begin` - start of the interval
+        - `end` - end of the interval"""
+
+        return next(self.occurrences(begin, end), None) is not None
+
+    def collides(self: Recurrence, other: Recurrence) -> bool:
+        """Check if any occurrences of two events overlap. \
+            Events repeated with fixed periods are compared arithmetically \
+                (by solving a linear Diophantine equation), \
+                    monthly events are expanded in the common span only.
+
+        Arguments:
+
+        - `other` - `Recurrence` object of the other event"""
+
+        if self.repeat is None:
+            return other.overlaps(self.start, self.start + self.duration)
+        if other.repeat is None:
+            return self.overlaps(other.start, other.start + other.duration)
+
+        begin = max(self.start, other.start)
+        end = min(self.end(), other.end())
+        if begin > end:
+            return False
+        if self.period is None or other.period is None:
+            expanded, checked = (self, other) if self.period is None \
+                else (other, self)
+            if end == FOREVER:
+                # both are repeated forever - the calendar, the months
+                # and the period of the other event repeat after `cycle`
+                cycle = CYCLE_DAYS * expanded.every * (
+                    checked.every if checked.period is None else 1)
+                if checked.period is not None:
+                    cycle = math.lcm(cycle, checked.period.days)
+                last = max([begin] + [
+                    r.nth(k) or begin for r in (self, other)
+                    for k in r.skipped])
+                end = last + datetime.timedelta(days=cycle) \
+                    + self.duration + other.duration
+            return any(checked.overlaps(s, e)
+                       for s, e in expanded.occurrences(begin, end))
+        return self._periods_collide(other)
+
+    def _periods_collide(self: Recurrence, other: Recurrence) -> bool:
+        # Slots i of self and j of other overlap iff
+        #   -d2 <= (a2 + j * p2) - (a1 + i * p1) <= d1,
+        # so j * p2 - i * p1 = m * g for some m (g = gcd(p1, p2))
+        # in a range of length d1 + d2. For each m the solutions are
+        # j = x * m + t * p1 / g, i = -y * m + t * p2 / g (p2 x + p1 y = g)
+        # and t is bounded by the numbers of slots.
+        assert self.period is not None and other.period is not None
+        shift = (other.start - self.start) // _TICK
+        p1, p2 = self.period // _TICK, other.period // _TICK
+        d1, d2 = self.duration // _TICK, other.duration // _TICK
+        g, x, y = extended_gcd(p2, p1)
+        q1, q2 = p1 // g, p2 // g
+        tries = len(self.skipped) + len(other.skipped) + 1
+
+        for m in range(ceil_div(-d2 - shift, g), (d1 - shift) // g + 1):
+            i0, j0 = -y * m, x * m
+            low = max(ceil_div(-i0, q2), ceil_div(-j0, q1))
+            highs = []
+            if self.slots is not None:
+                highs.append((self.slots - 1 - i0) // q2)
+            if other.slots is not None:
+                highs.append((other.slots - 1 - j0) // q1)
+            high = min(highs) if highs else low + tries - 1
+            for t in range(low, min(high, low + tries - 1) + 1):
+                if i0 + t * q2 not in self.skipped \
+                        and j0 + t * q1 not in other.skipped:
+                    return True
+        return False
@@ -4,14 +4,77 @@
 
 """Server providing API for actions on database"""
 
+from __future__ import annotations
+import argparse
 import datetime
+import json
 from flask import Flask, request, jsonify, Response
+from flask.json.provider import JSONProvider, DefaultJSONProvider
 import sch_db_tools as dbt
-from typing import Any
+import sch_io_tools as sio
+from typing import Any, Iterable
+
+try:
+    import orjson
+except ImportError:  # optional - faster encoding of responses
+    orjson = None
+
+
+def iso_default(o: Any) -> Any:
+    """Serialize objects unknown to JSON encoders - dates in ISO format, \
+        other objects as by Flask's default provider (e.g. decimals).
+
+    Arguments:
+
+    - `o` - object to be serialized"""
+
+    if isinstance(o, datetime.date):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(JSONProvider):
+    """JSON provider of the server - encodes dates as HTTP dates \
+        (as Flask's default provider, e.g. `"Wed, 10 Jan 2024 10:00:00 GMT"`) \
+            or in ISO format if `iso_dates` is set, and does not sort keys. \
+                Uses `orjson` if it is installed (and no options are given)."""
+
+    iso_dates = False
+    """Whether dates are encoded in ISO format (opt-in, \
+        e.g. with `--iso_dates` option of the server)."""
+
+    def dumps(self: FastJSONProvider, obj: Any, **kwargs: Any) -> str:
+        """Serialize `obj` to a JSON string.
+
+        Arguments:
+
+        - `obj` - data to be serialized (e.g. serialized database objects)
+        - `kwargs` - options of `json.dumps`"""
+
+        default = iso_default if self.iso_dates \
+            else DefaultJSONProvider.default
+        if orjson is not None and not kwargs:
+            # orjson writes dates in ISO format itself
+            option = 0 if self.iso_dates else orjson.OPT_PASSTHROUGH_DATETIME
+            return orjson.dumps(obj, default=default, option=option).decode()
+        kwargs.setdefault("default", default)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self: FastJSONProvider, s: str | bytes, **kwargs: Any) -> Any:
+        """Deserialize a JSON string (e.g. body of a request).
+
+        Arguments:
+
+        - `s` - string or bytes to be deserialized
+        - `kwargs` - options of `json.loads`"""
+
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
 
 
 app: Flask = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///schedule.db"
+app.json = FastJSONProvider(app)
 
 
 def parse_time(s: str) -> datetime.datetime:
@@ -27,8 +90,31 @@ def parse_time(s: str) -> datetime.datetime:
     return datetime.datetime.strptime(s, "%d-%m-%Y %H:%M")
 
 
+def stream_json(items: Iterable[dict[str, Any]]) -> Response:
+    """Return a response streaming `items` as JSON lines \
+        (one item per line, encoded as by `jsonify`).
+
+    Arguments:
+
+    - `items` - iterable of dictionaries"""
+
+    return Response((app.json.dumps(r) + "\n" for r in items),
+                    mimetype="application/x-ndjson")
+
+
 # get parameters from query
 
+def get_page_params() -> dict[str, (None | int)]:
+    """Get keyset pagination parameters from request \
+        (`cursor` - id of the last fetched record and `limit`). \
+            Returns a dictionary with keys from `Worker.page_properties`."""
+
+    cursor = request.args.get("cursor")
+    limit = request.args.get("limit")
+    return {"after_id": int(cursor) if cursor else None,
+            "limit": int(limit) if limit else None}
+
+
 def get_people_params() -> dict[str, (None | str | list[str])]:
     """Get parameters from request. \
         Returns a dictionary with keys from `PersonWorker.properties`."""
@@ -43,11 +129,13 @@ def get_people_params() -> dict[str, (None | str | list[str])]:
 
 
 def get_events_params() -> \
-        dict[str, (None | str | list[str] | datetime.datetime)]:
+        dict[str, (None | str | list[str] | int | datetime.datetime)]:
     """Get parameters from request. \
-        Returns a dictionary with keys from `EventWorker.properties`."""
+        Returns a dictionary with keys from `EventWorker.properties` \
+            and `EventWorker.optional_properties`."""
 
-    params: dict[str, (None | str | list[str] | datetime.datetime)] = {}
+    params: dict[str, (None | str | list[str] | int | datetime.datetime)] \
+        = {}
     for p in dbt.EventWorker.properties:
         if p in dbt.EventWorker.list_properties:
             params[p] = request.args.getlist(p)
@@ -60,6 +148,15 @@ def get_events_params() -> \
     if params["end_date"] is not None and isinstance(params["end_date"], str):
         params["end_date"] = parse_time(params["end_date"])
 
+    # recurrence of the event (see `EventWorker.optional_properties`)
+    params["repeat"] = request.args.get("repeat")
+    for p in ["repeat_every", "repeat_count"]:
+        value = request.args.get(p)
+        params[p] = int(value) if value else None
+    until = request.args.get("repeat_until")
+    params["repeat_until"] = parse_time(until) if until else None
+    params["repeat_except"] = request.args.getlist("repeat_except") or None
+
     return params
 
 
@@ -140,12 +237,20 @@ def put_places() -> Response:
 def get_people() -> Response:
     """Carry out a get request for people. \
         Perform an `info` operation on `people` table, \
-            `jsonify` a result and return it."""
+            `jsonify` a result and return it. \
+                With `all` parameter stream a page of all people \
+                    (after `cursor`, at most `limit` of them) as JSON lines."""
 
     params = get_people_params()
     params["table"] = "people"
     params["action"] = "info"
 
+    if request.args.get("all"):
+        params.update(get_page_params())
+        params["action"] = "info_stream"
+        print(f"Info: all people after {params['after_id']}")
+        return stream_json(dbt.act_stream(params))
+
     resp = dbt.act(params)
 
     print(f"Info: person {params['id']}")
@@ -156,12 +261,20 @@ def get_people() -> Response:
 def get_events() -> Response:
     """Carry out a get request for events. \
         Perform an `info` operation on `events` table, \
-            `jsonify` a result and return it."""
+            `jsonify` a result and return it. \
+                With `all` parameter stream a page of all events \
+                    (after `cursor`, at most `limit` of them) as JSON lines."""
 
     params = get_events_params()
     params["table"] = "events"
     params["action"] = "info"
 
+    if request.args.get("all"):
+        params.update(get_page_params())
+        params["action"] = "info_stream"
+        print(f"Info: all events after {params['after_id']}")
+        return stream_json(dbt.act_stream(params))
+
     resp = dbt.act(params)
 
     print(f"Info: event {params['id']}")
@@ -172,18 +285,246 @@ def get_events() -> Response:
 def get_places() -> Response:
     """Carry out a get request for places. \
         Perform an `info` operation on `places` table, \
-            `jsonify` a result and return it."""
+            `jsonify` a result and return it. \
+                With `all` parameter stream a page of all places \
+                    (after `cursor`, at most `limit` of them) as JSON lines."""
 
     params = get_places_params()
     params["table"] = "places"
     params["action"] = "info"
 
+    if request.args.get("all"):
+        params.update(get_page_params())
+        params["action"] = "info_stream"
+        print(f"Info: all places after {params['after_id']}")
+        return stream_json(dbt.act_stream(params))
+
     resp = dbt.act(params)
 
     print(f"Info: place {params['id']}")
     return jsonify(resp)
 
 
+@app.route('/events/collisions/', methods=['GET'])
+def get_events_collisions() -> Response:
+    """Carry out a get request for all collisions of events. \
+        Perform a `collisions_all` operation on `events` table \
+            and stream the pairs of colliding events \
+                as JSON lines (one pair per line)."""
+
+    params = get_events_params()
+    params["table"] = "events"
+    params["action"] = "collisions_all"
+
+    print("Collisions: all events")
+    return stream_json(dbt.act_stream(params))
+
+
+@app.route('/events/collisions/', methods=['POST'])
+def post_events_collisions() -> Response:
+    """Carry out a post request for collisions of events. \
+        Perform a `rebuild` operation on `events` table \
+            (regenerate the stored collisions), `jsonify` a result \
+                and return it."""
+
+    resp = dbt.act({"table": "events", "action": "rebuild"})
+
+    print("Rebuild: collisions of events")
+    return jsonify(resp)
+
+
+@app.route('/events/range/', methods=['GET'])
+def get_events_range() -> Response:
+    """Carry out a get request for events in a time range. \
+        Perform a `range` operation on `events` table \
+            (events between `from` and `to`, optionally with `place_id` \
+                and `invitees`), `jsonify` a result and return it."""
+
+    params: dict[str, Any] = get_events_params()
+    params["table"] = "events"
+    params["action"] = "range"
+    for p in dbt.EventWorker.range_properties:
+        value = request.args.get(p)
+        params[p] = parse_time(value) if value else None
+    if params["place_id"] is not None:
+        params["place_id"] = int(params["place_id"])
+    params["invitees"] = [int(i) for i in params["invitees"]]
+
+    resp = dbt.act(params)
+
+    print(f"Range: events from {params['from']} to {params['to']}")
+    return jsonify(resp)
+
+
+@app.route('/events/archived/', methods=['GET'])
+def get_events_archived() -> Response:
+    """Carry out a get request for archived events. \
+        Perform an `archived` operation on `events` table \
+            (events between `from` and `to`, optionally with `place_id`, \
+                a page after `after_id` of at most `limit` events), \
+                    `jsonify` a result and return it."""
+
+    params: dict[str, Any] = {"table": "events", "action": "archived"}
+    for p in dbt.EventWorker.range_properties:
+        value = request.args.get(p)
+        params[p] = parse_time(value) if value else None
+    for p in ["place_id", *dbt.Worker.page_properties]:
+        value = request.args.get(p)
+        params[p] = int(value) if value else None
+
+    resp = dbt.act(params)
+
+    print(f"Archived: events from {params['from']} to {params['to']}")
+    return jsonify(resp)
+
+
+@app.route('/events/free_slots/', methods=['GET'])
+def get_events_free_slots() -> Response:
+    """Carry out a get request for free time slots of people. \
+        Perform a `free_slots` operation on `events` table \
+            (slots between `from` and `to` at least `duration` minutes long, \
+                free for all `invitees` and the place with `place_id`), \
+                    `jsonify` a result and return it."""
+
+    params: dict[str, Any] = get_events_params()
+    params["table"] = "events"
+    params["action"] = "free_slots"
+    for p in dbt.EventWorker.range_properties:
+        value = request.args.get(p)
+        params[p] = parse_time(value) if value else None
+    duration = request.args.get("duration")
+    params["duration"] = int(duration) if duration else None
+    if params["place_id"] is not None:
+        params["place_id"] = int(params["place_id"])
+    params["invitees"] = [int(i) for i in params["invitees"]]
+
+    resp = dbt.act(params)
+
+    print(f"Free slots: people {params['invitees']}")
+    return jsonify(resp)
+
+
+@app.route('/places/available/', methods=['GET'])
+def get_places_available() -> Response:
+    """Carry out a get request for available places. \
+        Perform an `available` operation on `places` table \
+            (places free between `from` and `to` in the daily time window \
+                from `day_from` to `day_to` on `weekdays`, \
+                    optionally only `places`), \
+                        `jsonify` a result and return it."""
+
+    params: dict[str, Any] = {"table": "places", "action": "available"}
+    for p in dbt.EventWorker.range_properties:
+        value = request.args.get(p)
+        params[p] = parse_time(value) if value else None
+    for p in ["day_from", "day_to"]:
+        params[p] = request.args.get(p) or None
+    weekdays = request.args.getlist("weekdays")
+    params["weekdays"] = [int(d) for d in weekdays] if weekdays else None
+    params["places"] = [int(i) for i in request.args.getlist("places")]
+
+    resp = dbt.act(params)
+
+    print(f"Available: places from {params['from']} to {params['to']}")
+    return jsonify(resp)
+
+
+@app.route('/people/conflicts/', methods=['GET'])
+def get_people_conflicts() -> Response:
+    """Carry out a get request for double-bookings of people. \
+        Perform a `conflicts` operation on `people` table \
+            (or `conflicts_all` if no `id` is given) and stream the pairs \
+                of colliding events as JSON lines (one pair per line)."""
+
+    params = get_people_params()
+    params["table"] = "people"
+    params["action"] = "conflicts" if params["id"] is not None \
+        else "conflicts_all"
+
+    print(f"Conflicts: person {params['id'] or 'all'}")
+    return stream_json(dbt.act_stream(params))
+
+
+@app.route('/places/conflicts/', methods=['GET'])
+def get_places_conflicts() -> Response:
+    """Carry out a get request for double-bookings of places. \
+        Perform a `conflicts` operation on `places` table \
+            (or `conflicts_all` if no `id` is given) and stream the pairs \
+                of colliding events as JSON lines (one pair per line)."""
+
+    params = get_places_params()
+    params["table"] = "places"
+    params["action"] = "conflicts" if params["id"] is not None \
+        else "conflicts_all"
+
+    print(f"Conflicts: place {params['id'] or 'all'}")
+    return stream_json(dbt.act_stream(params))
+
+
+@app.route('/search', methods=['GET'])
+def get_search() -> Response:
+    """Carry out a get request for a full-text search. \
+        Perform a `search` operation on `table` \
+            (`people`, `events` or `places`) for words from `query` \
+                (at most `limit` results), `jsonify` a result and return it."""
+
+    table = request.args.get("table", "")
+    if table not in dbt.workers:
+        return Response(f"Unknown table {table}\n", status=404)
+    limit = request.args.get("limit")
+    params = {"table": table, "action": "search",
+              "query": request.args.get("query", ""),
+              "limit": int(limit) if limit else None}
+
+    resp = dbt.act(params)
+
+    print(f"Search: {table} {params['query']!r}")
+    return jsonify(resp)
+
+
+@app.route('/stats', methods=['GET'])
+def get_stats() -> Response:
+    """Carry out a get request for statistics of events. \
+        Perform a `stats` operation on `events` table \
+            (events starting between `from` and `to`, both optional), \
+                `jsonify` a result and return it."""
+
+    params: dict[str, Any] = {"table": "events", "action": "stats"}
+    for p in dbt.EventWorker.range_properties:
+        value = request.args.get(p)
+        params[p] = parse_time(value) if value else None
+
+    resp = dbt.act(params)
+
+    print(f"Stats: events from {params['from']} to {params['to']}")
+    return jsonify(resp)
+
+
+@app.route('/changes', methods=['GET'])
+def get_changes() -> Response:
+    """Carry out a get request for the change log. \
+        Get entries with sequence numbers greater than `since` \
+            (by default 0), at most `limit` of them (see `dbt.changes`), \
+                `jsonify` them and return them."""
+
+    since = int(request.args.get("since") or 0)
+    limit = int(request.args.get("limit") or dbt.CHANGES_LIMIT)
+
+    resp = dbt.changes(since, limit)
+
+    print(f"Changes: since {since}")
+    return jsonify(resp)
+
+
+@app.route('/cache/', methods=['GET'])
+def get_cache() -> Response:
+    """Carry out a get request for counters of the result cache \
+        (hits, misses and number of cached results), `jsonify` them \
+            and return them."""
+
+    return jsonify(dbt.cache.stats())
+
+
 # POST <-> Update
 
 @app.route('/people/', methods=['POST'])
@@ -284,5 +625,62 @@ def delete_places() -> Response:
     return jsonify(resp)
 
 
+@app.route('/export/<table>', methods=['GET'])
+def get_export(table: str) -> Response:
+    """Carry out a get request for an export of a table \
+        (`people`, `events` or `places`). Stream all records \
+            in `format` (`jsonl` - default - or `csv`), \
+                compressed with gzip if `gzip` parameter is given."""
+
+    if table not in dbt.workers:
+        return Response(f"Unknown table {table}\n", status=404)
+    format = request.args.get("format", "jsonl")
+    compress = bool(request.args.get("gzip"))
+
+    print(f"Export: {table}")
+    return Response(
+        sio.export_chunks(table, format, compress),
+        mimetype="application/gzip" if compress
+        else "text/csv" if format == "csv" else "application/x-ndjson")
+
+
+# POST <-> Batch
+
+@app.route('/batch', methods=['POST'])
+def post_batch() -> Response:
+    """Carry out a post request with a batch of instructions. \
+        The body is a JSON list of instructions \
+            (each with `table`, `action` and parameters of the action). \
+                Perform all of them in one transaction using `act_many`, \
+                    `jsonify` a list of results and return it."""
+
+    instrs = request.get_json()
+    for instr in instrs:
+        for p in ["start_date", "end_date", "repeat_until"]:
+            if isinstance(instr.get(p), str):
+                instr[p] = parse_time(instr[p])
+
+    resp = dbt.act_many(instrs)
+
+    print(f"Batch: {len(instrs)} instructions")
+    return jsonify(resp)
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Server providing API for actions on database")
+    parser.add_argument(
+        "--db", help=f"Database URL (by default ${dbt.DB_URL_ENV} \
+            or {dbt.DB_URL})")
+    parser.add_argument(
+        "--iso_dates", action="store_true",
+        help="Send dates in ISO format (e.g. 2024-01-10T10:00:00) \
+            instead of HTTP dates")
+    args = parser.parse_args()
+    if args.db is not None:
+        dbt.configure(url=args.db)
+    FastJSONProvider.iso_dates = args.iso_dates
+
+    # build the shared engine (and the schema) once, before serving requests
+    dbt.get_engine()
     app.run()
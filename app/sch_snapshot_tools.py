@@ -0,0 +1,325 @@
+# --------- SCHEDULE PROJECT ---------
+# ------- Jadwiga Swierczynska -------
+# ------------ 30.12.2023 ------------
+
+"""Snapshot tools - columnar snapshot of events for analytics \
+    (NumPy arrays of ids, places, invitees and occurrences \
+        loaded in bulk and stored in a memory-mapped file)"""
+
+from __future__ import annotations
+import datetime
+import itertools
+import json
+import os
+from typing import Any, Iterable
+from sqlalchemy import BigInteger, case, cast, func, select
+from sqlalchemy.orm import Session
+import sch_db_tools as dbt
+from sch_recurrence_tools import Recurrence
+
+try:
+    import numpy as np
+except ImportError:  # optional - needed only for snapshots of events
+    np = None
+
+
+EPOCH = datetime.datetime(1970, 1, 1)
+"""Dates are stored in snapshots as seconds after `EPOCH` \
+    (dates in the database are naive, as `dbt.timestamp`)."""
+
+SECOND = datetime.timedelta(seconds=1)
+
+LOAD_CHUNK = 10000
+"""Number of rows fetched at once by `Snapshot.load`."""
+
+MAGIC = b"SCHSNAP1"
+"""First bytes of a snapshot file."""
+
+ARRAYS = ("ids", "place_ids", "indptr", "invitees", "starts", "ends",
+          "events")
+"""Arrays of a snapshot in the order of a snapshot file."""
+
+
+def require_numpy() -> None:
+    """Raise `ModuleNotFoundError` if NumPy is not installed."""
+
+    if np is None:
+        raise ModuleNotFoundError(
+            "Snapshots of events require numpy package")
+
+
+def seconds(date: datetime.datetime) -> int:
+    """Return number of seconds from `EPOCH` to `date` (rounded down)."""
+
+    return (date - EPOCH) // SECOND
+
+
+def epoch_seconds(session: Session, date: Any) -> Any:
+    """Return SQL expression of the number of seconds from `EPOCH` \
+        to `date` (in the dialect of the engine of `session`).
+
+    Arguments:
+
+    - `session` - `sqlalchemy.orm.Session` object
+    - `date` - SQL expression of the date (e.g. `Event.start_date`)"""
+
+    if session.get_bind().dialect.name == "sqlite":
+        return cast(func.strftime("%s", date), BigInteger)
+    return cast(func.floor(func.extract("epoch", date)), BigInteger)
+
+
+class Snapshot():
+    """Columnar snapshot of events. Events (sorted by id) are described \
+        by arrays `ids` and `place_ids` (-1 if there is no place) \
+            and by a CSR index of invitees - ids of people invited \
+                to event `i` are `invitees[indptr[i]:indptr[i + 1]]`. \
+                    Occurrences (sorted by start) are described by arrays \
+                        `starts` and `ends` (seconds after `EPOCH`) \
+                            and `events` (index of the event of each \
+                                occurrence). Single events have one \
+                                    occurrence, recurring ones are expanded \
+                                        up to `until`. Arrays are `int64`."""
+
+    def __init__(self: Snapshot, arrays: dict[str, Any],
+                 seq: int = 0, until: int | None = None) -> None:
+        """Initialize a snapshot.
+
+        Arguments:
+
+        - `arrays` - dictionary with arrays named as in `ARRAYS`
+        - `seq` - sequence number of the last entry of `dbt.change_log` \
+            included in the snapshot
+        - `until` - end of the expansion of recurring events \
+            (seconds after `EPOCH`, `None` if there are no events)"""
+
+        require_numpy()
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.seq = seq
+        self.until = until
+
+    @classmethod
+    def load(cls: type[Snapshot],
+             until: datetime.datetime | None = None) -> Snapshot:
+        """Load a snapshot of all events from the database in one read \
+            transaction. Events with their invitees are fetched by one bulk \
+                query of integers (dates are converted in the database) \
+                    streamed into arrays, only recurring events are read \
+                        again to expand their occurrences.
+
+        Arguments:
+
+        - `until` - end of the expansion of recurring events \
+            (by default the latest end of an event, so occurrences \
+                colliding with any single event are included)"""
+
+        require_numpy()
+        Event = dbt.Event
+        with dbt.init() as session:
+            seq = session.scalar(select(func.max(dbt.change_log.c.seq))) or 0
+            stmt = select(
+                Event.id, func.coalesce(Event.place_id, -1),
+                epoch_seconds(session, Event.start_date),
+                epoch_seconds(session, Event.end_date),
+                case((Event.repeat.is_(None), 0), else_=1),
+                func.coalesce(dbt.participation.c.person_id, -1))\
+                .outerjoin_from(Event, dbt.participation,
+                                dbt.participation.c.event_id == Event.id)\
+                .order_by(Event.id, dbt.participation.c.person_id)
+            # plain rows of the connection (without ORM result processing)
+            rows = np.fromiter(itertools.chain.from_iterable(
+                session.connection().execute(stmt.execution_options(
+                    yield_per=LOAD_CHUNK))), dtype=np.int64).reshape(-1, 6)
+
+            until = until or session.scalar(select(func.max(
+                Event.end_date)))
+            recurring = session.execute(
+                select(Event.id, Event.start_date, Event.end_date,
+                       *dbt.recurrence_columns)
+                .where(Event.repeat.is_not(None), Event.start_date <= until)
+            ).all() if until is not None else []
+            session.commit()
+
+        new = np.diff(rows[:, 0], prepend=-1) != 0
+        first = np.flatnonzero(new)
+        ids = rows[first, 0]
+        linked = rows[:, 5] >= 0
+        counts = np.bincount((np.cumsum(new) - 1)[linked],
+                             minlength=len(ids))
+
+        single = first[rows[first, 4] == 0]
+        occurrences = np.fromiter(itertools.chain.from_iterable(
+            (seconds(s), seconds(e), index)
+            for r, index in zip(recurring, np.searchsorted(
+                ids, [r.id for r in recurring]))
+            for s, e in Recurrence.of(r).occurrences(None, until)),
+            dtype=np.int64).reshape(-1, 3)
+        starts = np.concatenate((rows[single, 2], occurrences[:, 0]))
+        ends = np.concatenate((rows[single, 3], occurrences[:, 1]))
+        events = np.concatenate((np.searchsorted(ids, rows[single, 0]),
+                                 occurrences[:, 2]))
+        order = np.lexsort((events, ends, starts))
+
+        return cls({
+            "ids": ids,
+            "place_ids": rows[first, 1],
+            "indptr": np.concatenate(([0], np.cumsum(counts))),
+            "invitees": rows[linked, 5],
+            "starts": starts[order],
+            "ends": ends[order],
+            "events": events[order]
+        }, seq, seconds(until) if until is not None else None)
+
+    def save(self: Snapshot, path: str) -> None:
+        """Write the snapshot to a file - a JSON header after `MAGIC` \
+            and its length, followed by the arrays (little-endian `int64`). \
+                The file is replaced at once, so readers never see \
+                    a partially written snapshot.
+
+        Arguments:
+
+        - `path` - path of the file"""
+
+        offset = 0
+        layout: dict[str, tuple[int, int]] = {}
+        for name in ARRAYS:
+            layout[name] = (offset, len(getattr(self, name)))
+            offset += 8 * len(getattr(self, name))
+        header = json.dumps({"seq": self.seq, "until": self.until,
+                             "arrays": layout}).encode()
+        header += b" " * (-len(header) % 8)  # arrays aligned to 8 bytes
+
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for name in ARRAYS:
+                np.ascontiguousarray(getattr(self, name),
+                                     dtype="<i8").tofile(f)
+        os.replace(temporary, path)
+
+    @classmethod
+    def open(cls: type[Snapshot], path: str) -> Snapshot:
+        """Open a snapshot written by `save`. The arrays are read-only views \
+            of the memory-mapped file, so nothing is read until it is used.
+
+        Arguments:
+
+        - `path` - path of the file"""
+
+        require_numpy()
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a snapshot of events")
+            size = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(size))
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        begin = len(MAGIC) + 8 + size
+        return cls({name: data[begin + offset:begin + offset + 8 * length]
+                    .view("<i8") for name, (offset, length)
+                    in header["arrays"].items()},
+                   header["seq"], header["until"])
+
+    def stale(self: Snapshot) -> bool:
+        """Return whether events were changed in the database \
+            after the snapshot was loaded (see `dbt.changes`)."""
+
+        with dbt.init() as session:
+            return session.scalar(select(dbt.change_log.c.seq).where(
+                dbt.change_log.c.seq > self.seq,
+                dbt.change_log.c.table == "events").limit(1)) is not None
+
+    def between(self: Snapshot, begin: datetime.datetime,
+                end: datetime.datetime) -> Any:
+        """Return indices of occurrences overlapping the time range \
+            from `begin` to `end` (sorted by start). Occurrences starting \
+                after `end` are cut off by a binary search.
+
+        Arguments:
+
+        - `begin`, `end` - time range"""
+
+        last = np.searchsorted(self.starts, seconds(end), "right")
+        return np.flatnonzero(self.ends[:last] >= seconds(begin))
+
+    def of_place(self: Snapshot, place_id: int,
+                 occurrences: Any = None) -> Any:
+        """Return indices of occurrences of events in place `place_id` \
+            (sorted by start).
+
+        Arguments:
+
+        - `place_id` - id of the place
+        - `occurrences` - indices of occurrences to be filtered \
+            (all if not given)"""
+
+        if occurrences is None:
+            occurrences = np.arange(len(self.starts))
+        return occurrences[self.place_ids[self.events[occurrences]]
+                           == place_id]
+
+    def of_person(self: Snapshot, person_id: int,
+                  occurrences: Any = None) -> Any:
+        """Return indices of occurrences of events to which person \
+            `person_id` is invited (sorted by start). Events are found \
+                by one scan of `invitees` mapped to events by `indptr`.
+
+        Arguments:
+
+        - `person_id` - id of the person
+        - `occurrences` - indices of occurrences to be filtered \
+            (all if not given)"""
+
+        if occurrences is None:
+            occurrences = np.arange(len(self.starts))
+        invited = np.zeros(len(self.ids), dtype=bool)
+        invited[np.searchsorted(self.indptr, np.flatnonzero(
+            self.invitees == person_id), "right") - 1] = True
+        return occurrences[invited[self.events[occurrences]]]
+
+    def invitees_of(self: Snapshot, event: int) -> Any:
+        """Return ids of people invited to the event of index `event`."""
+
+        return self.invitees[self.indptr[event]:self.indptr[event + 1]]
+
+    def collisions(self: Snapshot, occurrences: Any = None) -> Any:
+        """Return array of pairs of indices of colliding occurrences \
+            of different events (touching ones collide too), \
+                the earlier one first. For each occurrence the later ones \
+                    starting before its end are found by a binary search.
+
+        Arguments:
+
+        - `occurrences` - indices of occurrences checked against \
+            each other, e.g. from `of_place` (all if not given)"""
+
+        occurrences = np.arange(len(self.starts)) if occurrences is None \
+            else np.sort(occurrences)
+        starts = self.starts[occurrences]
+        counts = np.searchsorted(starts, self.ends[occurrences], "right") \
+            - np.arange(len(occurrences)) - 1
+        first = np.repeat(np.arange(len(occurrences)), counts)
+        second = first + 1 + np.arange(len(first)) \
+            - np.repeat(np.cumsum(counts) - counts, counts)
+        pairs = np.stack((occurrences[first], occurrences[second]), axis=1)
+        return pairs[self.events[pairs[:, 0]] != self.events[pairs[:, 1]]]
+
+    def event_ids(self: Snapshot, occurrences: Any) -> Any:
+        """Return ids of events of `occurrences` (array of indices)."""
+
+        return self.ids[self.events[occurrences]]
+
+    def dates(self: Snapshot, occurrences: Iterable[int]) \
+            -> list[tuple[datetime.datetime, datetime.datetime]]:
+        """Return `(start, end)` of `occurrences` as `datetime` objects."""
+
+        return [(EPOCH + int(self.starts[o]) * SECOND,
+                 EPOCH + int(self.ends[o]) * SECOND) for o in occurrences]
+
+    def summary(self: Snapshot) -> dict[str, Any]:
+        """Return numbers of events, occurrences and invitations \
+            in the snapshot."""
+
+        return {"events": len(self.ids), "occurrences": len(self.starts),
+                "invitations": len(self.invitees), "seq": self.seq}
@@ -52,8 +52,98 @@ python3 sch_client.py lookup people --surname Kowalski
 python3 sch_client.py lookup events --name "Christmas Eve"
 python3 sch_client.py lookup places --name "Library"
 
-# info_all - direct (only)
+# info_all - direct and api (optionally one page after given id)
 
 python3 sch_client.py info_all people
 python3 sch_client.py info_all events
-python3 sch_client.py info_all places
\ No newline at end of file
+python3 sch_client.py info_all places
+python3 sch_client.py -a info_all events
+python3 sch_client.py -a info_all places --after_id 100 --limit 20
+
+# collisions_all - direct and api (only events)
+
+python3 sch_client.py collisions_all events
+python3 sch_client.py -a collisions_all events
+
+# stats - direct and api (only events, optionally in a time range)
+
+python3 sch_client.py stats events
+python3 sch_client.py -a stats events --from "01-01-2024 00:00" --to "31-01-2024 23:59"
+
+# archive - only direct (moves events ended before the date)
+# archived - direct and api (only events, optionally in a time range)
+
+python3 sch_client.py archive --before "01-01-2024 00:00"
+python3 sch_client.py archived events --from "01-12-2023 00:00"
+python3 sch_client.py -a archived events --after_id 100 --limit 20
+
+# rebuild - direct and api (only events, regenerates stored collisions)
+
+python3 sch_client.py rebuild events
+python3 sch_client.py -a rebuild events
+
+# conflicts - direct and api (only people and places)
+
+python3 sch_client.py conflicts people --id 10
+python3 sch_client.py -a conflicts places --id 4
+python3 sch_client.py conflicts_all people
+python3 sch_client.py -a conflicts_all places
+
+# batch - direct and api (JSON list of add, update, delete and upsert instructions)
+
+python3 sch_client.py batch instructions.json
+cat instructions.json | python3 sch_client.py -a batch -
+
+# import - direct (only), CSV or JSONL
+
+python3 sch_client.py import places places.csv
+python3 sch_client.py import events events.jsonl --chunk_size 10000
+cat people.csv | python3 sch_client.py import people - --format csv
+
+# changes - direct and api (entries of the change log after a sequence number)
+# compact - only direct (keeps the latest entry of each record logged before the date)
+
+python3 sch_client.py changes --since 120 --limit 50
+python3 sch_client.py -a changes --since 120
+python3 sch_client.py compact --before "01-01-2024 00:00"
+
+# snapshot - only direct (columnar snapshot of events for analytics, memory-mapped)
+
+python3 sch_client.py snapshot events.snap
+python3 sch_client.py snapshot events.snap --until "31-12-2024 23:59"
+
+# upsert - direct and api (only people, matched by email), CSV or JSONL
+
+python3 sch_client.py upsert people staff.csv
+cat staff.jsonl | python3 sch_client.py -a upsert people - --format jsonl
+
+# export - direct and api, CSV or JSONL (optionally gzipped)
+
+python3 sch_client.py export people people.csv
+python3 sch_client.py export events - --format jsonl
+python3 sch_client.py -a export events events.jsonl.gz
+
+# search - direct and api (words or beginnings of words)
+
+python3 sch_client.py search people --query "kowal"
+python3 sch_client.py -a search events --query "lecture math" --limit 5
+
+# range - direct and api (only events)
+
+python3 sch_client.py range events --from "08-01-2024 00:00" --to "12-01-2024 23:59"
+python3 sch_client.py -a range events --from "08-01-2024 00:00" --to "12-01-2024 23:59" --place_id 4 --invitees 1 2
+
+# free_slots - direct and api (only events; duration in minutes)
+
+python3 sch_client.py free_slots events --invitees 1 2 3 --from "08-01-2024 08:00" --to "12-01-2024 18:00" --duration 60
+python3 sch_client.py -a free_slots events --invitees 1 2 --from "08-01-2024 08:00" --to "08-01-2024 18:00" --place_id 4
+
+# available - direct and api (only places; free in the hours on the days of the week, 0 - Monday)
+
+python3 sch_client.py available places --from "01-02-2024 00:00" --to "01-03-2024 00:00" --day_from 09:00 --day_to 11:00 --weekdays 0 1 2 3 4
+python3 sch_client.py -a available places --from "08-01-2024 08:00" --to "12-01-2024 18:00" --places 1 2 4
+
+# recurring events - direct and api (daily, weekly or monthly)
+
+python3 sch_client.py add events --name "Lecture" --description "Weekly lecture" --start_date "08-01-2024 10:00" --end_date "08-01-2024 12:00" --invitees 1 2 --place_id 4 --repeat weekly --repeat_count 15 --repeat_except 01-04-2024
+python3 sch_client.py -a add events --name "Meeting" --description "Monthly meeting" --start_date "31-01-2024 09:00" --end_date "31-01-2024 10:00" --invitees 3 --place_id 2 --repeat monthly --repeat_until "31-12-2024 09:00"
@@ -0,0 +1,475 @@
+# --------- SCHEDULE PROJECT ---------
+# ------- Jadwiga Swierczynska -------
+# ------------ 30.12.2023 ------------
+
+"""Benchmarks - run on a separate, generated database \
+    (`python benchmark.py <name> [--size N]`)"""
+
+import context
+import argparse
+import datetime
+import os
+import multiprocessing
+import random
+import time
+import tracemalloc
+import sch_db_tools as dbt
+import sch_io_tools as sio
+import sch_snapshot_tools as sst
+import sch_server as srv
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+
+BENCH_DB = "bench.db"
+"""File of the generated database (removed after the benchmark)."""
+
+
+def populate(size):
+    """Fill the benchmark database with `size` people, \
+        `size // 10` places and `size` events (with 3 invitees each).
+
+    Arguments:
+
+    - `size` - number of people and events"""
+
+    rnd = random.Random(0)
+    start = datetime.datetime(2024, 1, 1)
+    places = size // 10 or 1
+    sio.import_rows("people", ({
+        "name": f"Name{i}", "surname": f"Surname{i}",
+        "email": f"person{i}@example.com"} for i in range(size)))
+    sio.import_rows("places", ({
+        "name": f"Place{i}", "street_name": "Street",
+        "street_number": i + 1} for i in range(places)))
+    sio.import_rows("events", ({
+        "name": f"Event{i}", "description": "Lorem ipsum",
+        "start_date": start + datetime.timedelta(hours=i),
+        "end_date": start + datetime.timedelta(hours=i + 1),
+        "place_id": rnd.randrange(places) + 1,
+        "invitees": rnd.sample(range(1, size + 1), 3)}
+        for i in range(size)))
+
+
+def downgrade():
+    """Turn the benchmark database into the schema without lookup indexes \
+        and without primary key of `person_event`."""
+
+    with dbt.get_engine().begin() as connection:
+        for t in dbt.Base.metadata.sorted_tables:
+            for index in t.indexes:
+                connection.exec_driver_sql(
+                    f'DROP INDEX IF EXISTS "{index.name}"')
+        connection.exec_driver_sql(
+            "CREATE TABLE person_event_old (event_id INTEGER, "
+            "person_id INTEGER)")
+        connection.exec_driver_sql(
+            "INSERT INTO person_event_old SELECT * FROM person_event")
+        connection.exec_driver_sql("DROP TABLE person_event")
+        connection.exec_driver_sql(
+            "ALTER TABLE person_event_old RENAME TO person_event")
+
+
+def time_lookups(instrs):
+    """Run `act` for each instruction. \
+        Return the mean time of one action in milliseconds.
+
+    Arguments:
+
+    - `instrs` - list of instructions"""
+
+    begin = time.perf_counter()
+    for instr in instrs:
+        dbt.act(instr)
+    return (time.perf_counter() - begin) * 1000 / len(instrs)
+
+
+def bench_lookup(size, queries):
+    """Measure latency of `lookup` and `info` actions \
+        before and after the schema upgrade (`dbt.upgrade_schema`).
+
+    Arguments:
+
+    - `size` - number of people and events in the database
+    - `queries` - number of actions of each kind"""
+
+    populate(size)
+    rnd = random.Random(1)
+    ids = [rnd.randrange(size) + 1 for _ in range(queries)]
+    instrs = {
+        "people lookup": [{"table": "people", "action": "lookup",
+                           "surname": f"Surname{i - 1}"} for i in ids],
+        "places lookup": [{"table": "places", "action": "lookup",
+                           "name": f"Place{i % (size // 10 or 1)}"}
+                          for i in ids],
+        "events lookup": [{"table": "events", "action": "lookup",
+                           "name": f"Event{i - 1}"} for i in ids],
+        "events info": [{"table": "events", "action": "info", "id": i}
+                        for i in ids],
+        "people info": [{"table": "people", "action": "info", "id": i}
+                        for i in ids]
+    }
+
+    downgrade()
+    before = {k: time_lookups(v) for k, v in instrs.items()}
+    with dbt.get_engine().begin() as connection:
+        dbt.upgrade_schema(connection)
+    after = {k: time_lookups(v) for k, v in instrs.items()}
+
+    print(f"{size} rows, {queries} queries, mean latency [ms]")
+    print(f"{'action':<16}{'before':>10}{'after':>10}{'speedup':>10}")
+    for k in instrs:
+        print(f"{k:<16}{before[k]:>10.3f}{after[k]:>10.3f}"
+              f"{before[k] / after[k]:>9.1f}x")
+
+
+def bench_free_slots(size, queries):
+    """Measure latency of `free_slots` action for 100 people \
+        sharing `size` events (5 invitees each, a few thousand events \
+            per person).
+
+    Arguments:
+
+    - `size` - number of events in the database
+    - `queries` - number of measured actions"""
+
+    rnd = random.Random(0)
+    start = datetime.datetime(2024, 1, 1)
+    sio.import_rows("people", ({
+        "name": f"Name{i}", "surname": f"Surname{i}",
+        "email": f"person{i}@example.com"} for i in range(100)))
+    sio.import_rows("places", [{"name": "Place", "street_name": "Street",
+                                "street_number": 1}])
+    begins = (start + datetime.timedelta(minutes=rnd.randrange(365 * 24 * 60))
+              for _ in range(size))
+    sio.import_rows("events", ({
+        "name": f"Event{i}", "description": "Lorem ipsum", "start_date": b,
+        "end_date": b + datetime.timedelta(minutes=rnd.randrange(15, 120)),
+        "place_id": 1, "invitees": rnd.sample(range(1, 101), 5)}
+        for i, b in enumerate(begins)))
+
+    for days in [1, 7, 30]:
+        instr = {"table": "events", "action": "free_slots",
+                 "invitees": list(range(1, 101)), "from": start,
+                 "to": start + datetime.timedelta(days=days),
+                 "duration": 1}
+        slots = len(dbt.act(instr))
+        ms = time_lookups([instr] * queries)
+        print(f"{size} events, 100 people, window of {days} days: "
+              f"{ms:.1f} ms ({slots} slots)")
+
+
+def vars_serialize(obj, nested=True):
+    """Serialize a database object as before compiled serializers \
+        (from `vars`, related objects as well).
+
+    Arguments:
+
+    - `obj` - `Event`, `Place` or `Person` object
+    - `nested` - serialize related objects"""
+
+    relationships = obj.__mapper__.relationships
+    res = {k: v for k, v in vars(obj).items()
+           if not k.startswith('_') and k not in relationships}
+    collides = res.pop("collides", None)  # colliding `Event` objects
+    if nested and collides is not None:
+        res["collides"] = [vars_serialize(r, False) for r in collides]
+    if nested:
+        for k in relationships.keys():
+            v = getattr(obj, k)
+            res[k] = [vars_serialize(r, False) for r in v] \
+                if isinstance(v, list) else vars_serialize(v, False)
+    return res
+
+
+def bench_serialize(size, queries):
+    """Measure throughput of serializing all records to JSON lines \
+        (as `GET /<table>/?all=1` does) - ORM objects serialized from `vars` \
+            and encoded by the default Flask encoder (before) \
+                and `info_stream` fast path with the server encoder (after).
+
+    Arguments:
+
+    - `size` - number of people and events in the database
+    - `queries` - unused"""
+
+    populate(size)
+    flask_json = DefaultJSONProvider(srv.app)
+
+    def before(table):
+        worker = dbt.workers[table]({})
+        with dbt.init() as session:
+            for r in worker.info_all(session):
+                flask_json.dumps(vars_serialize(r))
+
+    def after(table):
+        for r in dbt.act_stream({"table": table, "action": "info_stream"}):
+            srv.app.json.dumps(r)
+
+    print(f"{size} people and events, rows per second")
+    print(f"{'table':<16}{'before':>10}{'after':>10}{'speedup':>10}")
+    for table in ["people", "events", "places"]:
+        rows = len(dbt.act({"table": table, "action": "info_all"}))
+        times = []
+        for f in [before, after]:
+            begin = time.perf_counter()
+            f(table)
+            times.append(rows / (time.perf_counter() - begin))
+        print(f"{table:<16}{times[0]:>10.0f}{times[1]:>10.0f}"
+              f"{times[1] / times[0]:>9.1f}x")
+
+
+ROLLBACK_JOURNAL = {"journal_mode": "delete", "synchronous": "full",
+                    "mmap_size": 0, "cache_size": -2000}
+"""SQLite defaults overriding `dbt.SQLITE_PRAGMAS` (the "before" setup)."""
+
+CONCURRENCY_SECONDS = 5
+"""Duration of each measurement of `bench_concurrency`."""
+
+
+def read_events(seconds, seed):
+    """Perform `range` actions (one day windows) for `seconds` seconds. \
+        Return the number of actions."""
+
+    rnd = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        begin = start + datetime.timedelta(hours=rnd.randrange(8000))
+        dbt.act({"table": "events", "action": "range", "from": begin,
+                 "to": begin + datetime.timedelta(hours=24),
+                 "place_id": None, "invitees": []})
+        count += 1
+    return count
+
+
+def write_events(seconds, seed):
+    """Perform `add` actions (one event each) for `seconds` seconds. \
+        Return the number of actions."""
+
+    start = datetime.datetime(2024, 1, 1, seed)
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        begin = start + datetime.timedelta(hours=count)
+        dbt.act({"table": "events", "action": "add", "name": "Written",
+                 "description": "Lorem ipsum", "start_date": begin,
+                 "end_date": begin + datetime.timedelta(hours=1),
+                 "place_id": 1, "invitees": [1]})
+        count += 1
+    return count
+
+
+def run_concurrently(readers, seconds):
+    """Run `readers` processes performing `range` actions \
+        and one process adding events for `seconds` seconds. \
+            Return numbers of reads and writes per second.
+
+    Arguments:
+
+    - `readers` - number of reading processes
+    - `seconds` - duration of the measurement"""
+
+    with multiprocessing.Pool(readers + 1) as pool:
+        reads = [pool.apply_async(read_events, (seconds, n))
+                 for n in range(readers)]
+        writes = pool.apply_async(write_events, (seconds, readers))
+        return sum(r.get() for r in reads) / seconds, writes.get() / seconds
+
+
+def bench_concurrency(size, queries):
+    """Measure throughput of concurrent readers (`range` actions) \
+        with one writer (`add` actions), each in its own process, \
+            with the rollback journal and SQLite defaults (before) \
+                and with `dbt.SQLITE_PRAGMAS` (after, write-ahead log).
+
+    Arguments:
+
+    - `size` - number of people and events in the database
+    - `queries` - unused"""
+
+    populate(size)
+    defaults = dict(dbt.SQLITE_PRAGMAS)
+    print(f"{size} events, actions per second "
+          f"({CONCURRENCY_SECONDS} s each)")
+    print(f"{'readers':<10}{'setup':<10}{'reads':>10}{'writes':>10}")
+    for readers in [1, 4]:
+        for name, pragmas in [("before", ROLLBACK_JOURNAL),
+                              ("after", defaults)]:
+            dbt.configure(pragmas=pragmas)
+            dbt.get_engine()  # built once, before forking
+            reads, writes = run_concurrently(readers, CONCURRENCY_SECONDS)
+            print(f"{readers:<10}{name:<10}{reads:>10.0f}{writes:>10.0f}")
+
+
+def bench_available(size, queries):
+    """Measure latency of finding places free on every weekday \
+        between 9:00 and 11:00 in a month - one `free_slots` action \
+            per place and day (before) and one `available` action \
+                of places (after, cold - blocks are built, and warm).
+
+    Arguments:
+
+    - `size` - number of people and events in the database
+    - `queries` - number of measured `available` actions"""
+
+    populate(size)
+    start = datetime.datetime(2024, 1, 1)
+    days = [start + datetime.timedelta(days=d) for d in range(31)
+            if (start + datetime.timedelta(days=d)).weekday() < 5]
+    places = size // 10 or 1
+    instr = {"table": "places", "action": "available", "from": start,
+             "to": start + datetime.timedelta(days=31), "day_from": "09:00",
+             "day_to": "11:00", "weekdays": [0, 1, 2, 3, 4]}
+
+    begin = time.perf_counter()
+    free = [p for p in range(1, places + 1) if all(dbt.act({
+        "table": "events", "action": "free_slots", "invitees": [],
+        "place_id": p, "from": d.replace(hour=9), "to": d.replace(hour=11),
+        "duration": 120}) for d in days)]
+    before = (time.perf_counter() - begin) * 1000
+    begin = time.perf_counter()
+    found = [p["id"] for p in dbt.act(instr)]
+    cold = (time.perf_counter() - begin) * 1000
+    warm = time_lookups([instr] * queries)
+
+    assert free == found, "Same places are found"
+    print(f"{size} events, {places} places, {len(free)} available, "
+          f"latency [ms]")
+    print(f"{'before':>10}{'cold':>10}{'warm':>10}{'speedup':>10}")
+    print(f"{before:>10.1f}{cold:>10.1f}{warm:>10.1f}"
+          f"{before / warm:>9.1f}x")
+
+
+def measure(function):
+    """Call `function` twice. Return its result, time of the first call \
+        in milliseconds and peak of memory allocated during the second one \
+            in megabytes (tracing allocations slows it down)."""
+
+    begin = time.perf_counter()
+    res = function()
+    elapsed = (time.perf_counter() - begin) * 1000
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return res, elapsed, peak
+
+
+def bench_snapshot(size, queries):
+    """Measure time and memory of counting events per person \
+        - from all `Event` objects with their invitees (before), \
+            from a snapshot loaded from the database (load) \
+                and from a snapshot opened from its file (open).
+
+    Arguments:
+
+    - `size` - number of people and events in the database
+    - `queries` - unused"""
+
+    populate(size)
+
+    def scan():
+        with dbt.init() as session:
+            counts = {}
+            for e in session.scalars(select(dbt.Event).options(
+                    selectinload(dbt.Event.invitees))):
+                for p in e.invitees:
+                    counts[p.id] = counts.get(p.id, 0) + 1
+            return counts
+
+    def count(snapshot):
+        people, n = sst.np.unique(snapshot.invitees, return_counts=True)
+        return dict(zip(people.tolist(), n.tolist()))
+
+    path = f"{BENCH_DB}.snap"
+    before, scan_ms, scan_mb = measure(scan)
+    loaded, load_ms, load_mb = measure(lambda: count(sst.Snapshot.load()))
+    sst.Snapshot.load().save(path)
+    opened, open_ms, open_mb = measure(
+        lambda: count(sst.Snapshot.open(path)))
+    os.remove(path)
+
+    assert before == loaded == opened, "Same counts"
+    print(f"{size} events, time [ms] and peak memory [MB]")
+    print(f"{'':>10}{'before':>10}{'load':>10}{'open':>10}")
+    print(f"{'time':>10}{scan_ms:>10.1f}{load_ms:>10.1f}{open_ms:>10.1f}")
+    print(f"{'memory':>10}{scan_mb:>10.1f}{load_mb:>10.1f}{open_mb:>10.1f}")
+
+
+IMPORT_TARGET = 50000
+"""Wanted throughput of imports [rows/s]."""
+
+
+def bench_import(size, queries):
+    """Measure throughput of `import_rows` - `size` people, \
+        `size // 10` places and `size` events (with 3 invitees each, \
+            colliding with the neighbouring events) imported \
+                to an empty database.
+
+    Arguments:
+
+    - `size` - number of imported people and events
+    - `queries` - unused"""
+
+    rnd = random.Random(0)
+    start = datetime.datetime(2024, 1, 1)
+    places = size // 10 or 1
+    rows = {
+        "people": [{"name": f"Name{i}", "surname": f"Surname{i}",
+                    "email": f"person{i}@example.com"} for i in range(size)],
+        "places": [{"name": f"Place{i}", "street_name": "Street",
+                    "street_number": i + 1} for i in range(places)],
+        "events": [{"name": f"Event{i}", "description": "Lorem ipsum",
+                    "start_date": start + datetime.timedelta(hours=i),
+                    "end_date": start + datetime.timedelta(hours=i + 1),
+                    "place_id": rnd.randrange(places) + 1,
+                    "invitees": rnd.sample(range(1, size + 1), 3)}
+                   for i in range(size)]}
+
+    print(f"import throughput [rows/s], target {IMPORT_TARGET}")
+    print(f"{'table':<10}{'rows':>10}{'rows/s':>10}{'target':>10}")
+    for table, values in rows.items():
+        begin = time.perf_counter()
+        res = sio.import_rows(table, values)
+        rate = len(values) / (time.perf_counter() - begin)
+        assert res["imported"] == len(values), "All rows are imported"
+        met = "met" if rate >= IMPORT_TARGET else "missed"
+        print(f"{table:<10}{len(values):>10}{rate:>10.0f}{met:>10}")
+
+
+benchmarks = {
+    "lookup": bench_lookup,
+    "free_slots": bench_free_slots,
+    "serialize": bench_serialize,
+    "concurrency": bench_concurrency,
+    "available": bench_available,
+    "snapshot": bench_snapshot,
+    "import": bench_import
+}
+"""Functions running benchmarks."""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", choices=benchmarks)
+    parser.add_argument("--size", type=int, default=100000,
+                        help="number of rows in the generated database")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="number of measured actions")
+    args = parser.parse_args()
+
+    if os.path.exists(BENCH_DB):
+        os.remove(BENCH_DB)
+    dbt.configure(url=f"sqlite:///{BENCH_DB}")
+    try:
+        benchmarks[args.benchmark](args.size, args.queries)
+    finally:
+        dbt.configure()
+        os.remove(BENCH_DB)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,30 @@
 import context
 import unittest
+import asyncio
 import types
 import datetime
+import decimal
+import time
+import io
+import gzip
+import json
+import os
+import tempfile
+import threading
+import uuid
 import sch_db_tools as dbt
+import sch_io_tools as sio
+import sch_async_tools as ast
+import sch_occupancy_tools as sot
+import sch_snapshot_tools as sst
 import requests
 import sch_server as srv
 import logging
 from multiprocessing import Process
+from sqlalchemy import create_engine, event, select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
 
 
 def parse_time(s):
@@ -16,6 +34,25 @@ def parse_time(s):
 SERVER = "http://localhost:5000/"
 
 
+def unique_email(name):
+    """Return an email not used before (emails of people are unique)"""
+    return f"{name}.{uuid.uuid4().hex}@example.com"
+
+
+class TemporaryDatabase(unittest.TestCase):
+    """Test case on its own database file (removed afterwards)"""
+
+    def setUp(self):
+        self.url = dbt.DB_URL
+        self.directory = tempfile.TemporaryDirectory()
+        dbt.configure(url="sqlite:///" + os.path.join(
+            self.directory.name, "schedule.db"))
+
+    def tearDown(self):
+        dbt.configure(url=self.url)
+        self.directory.cleanup()
+
+
 class TestServer(unittest.TestCase):
     def setUp(self):
         """Initialize a server for testing (disabled app logging)"""
@@ -29,6 +66,14 @@ class TestServer(unittest.TestCase):
         self.server = Process(target=app.run)
         self.server.start()
 
+        # wait until the server accepts connections
+        for _ in range(100):
+            try:
+                requests.get(SERVER)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.05)
+
     def tearDown(self):
         """Shutdown a server after test"""
         self.server.terminate()
@@ -56,6 +101,47 @@ class TestServer(unittest.TestCase):
                 {"msg": f"Deleted place {p['id']}"},
                 cur, "Correctly deleted a place")
 
+    def testDateFormats(self):
+        """Dates are sent as HTTP dates by default and in ISO format \
+            if asked to (also by the standard `json` module used \
+                without `orjson`)"""
+        place = requests.put(SERVER+"places/", params={
+            "name": "Place of dates", "street_name": "Old Street",
+            "street_number": 30}).json()
+        e = requests.put(SERVER+"events/", params={
+            "name": "Dated", "start_date": "10-01-2024 10:00",
+            "end_date": "10-01-2024 11:00", "description": "Lorem ipsum",
+            "invitees": [], "place_id": place["id"]}).json()
+        self.assertEqual(["Wed, 10 Jan 2024 10:00:00 GMT",
+                          "Wed, 10 Jan 2024 11:00:00 GMT"],
+                         [e["start_date"], e["end_date"]], "HTTP dates")
+        requests.delete(SERVER+"events/", params={"id": e["id"]})
+        requests.delete(SERVER+"places/", params={"id": place["id"]})
+
+        data = {"at": datetime.datetime(2024, 1, 10, 10),
+                "day": datetime.date(2024, 1, 10),
+                "n": decimal.Decimal("1.5")}
+        fast = srv.orjson
+        try:
+            for encoder in [fast, None]:
+                srv.orjson = encoder
+                self.assertEqual(
+                    {"at": "Wed, 10 Jan 2024 10:00:00 GMT",
+                     "day": "Wed, 10 Jan 2024 00:00:00 GMT", "n": "1.5"},
+                    json.loads(srv.app.json.dumps(data)),
+                    "Same encoding as Flask's default provider")
+                srv.FastJSONProvider.iso_dates = True
+                self.assertEqual(
+                    {"at": "2024-01-10T10:00:00", "day": "2024-01-10",
+                     "n": "1.5"}, json.loads(srv.app.json.dumps(data)),
+                    "ISO dates if asked to")
+                srv.FastJSONProvider.iso_dates = False
+            self.assertIn("\n", srv.app.json.dumps({"a": 1}, indent=2),
+                          "Options passed to json.dumps")
+        finally:
+            srv.orjson = fast
+            srv.FastJSONProvider.iso_dates = False
+
     def testEventUpdate(self):
         """Adding an event and updating it - but with incorrect dates"""
         tests = [{"name": "My Test Event",
@@ -83,7 +169,7 @@ class TestWorkers(unittest.TestCase):
     def testPersonAdd(self):
         """Adding a new person"""
         tests = [{"name": "Jan", "surname": "Kowalski",
-                  "email": "jan@example.com", "participates": []}]
+                  "email": unique_email("jan"), "participates": []}]
 
         for t in tests:
             with self.session:
@@ -117,14 +203,1070 @@ class TestWorkers(unittest.TestCase):
             with self.session:
                 p = dbt.EventWorker(t).add(self.session)
                 cur = dbt.EventWorker({"id": p.id}).info(
-                    self.session).serialize_basic()
+                    self.session).serialize()
 
                 cur = {k: v for k, v in cur.items() if k != "collides"}
                 t["id"] = p.id
+                # a single event - without recurrence
+                t |= dict.fromkeys(
+                    [*dbt.EventWorker.optional_properties, "series_end"])
                 self.assertEqual(t, cur, "Correctly fetches info about event")
 
                 self.session.commit()
 
 
+class TestActions(TemporaryDatabase):
+    def setUp(self):
+        """Initialize a session on a temporary database with one place"""
+        super().setUp()
+        self.place_id = dbt.act({"table": "places", "action": "add",
+                                 "name": "Hall", "street_name": "X",
+                                 "street_number": 1})["id"]
+        self.session = dbt.init()
+
+    def tearDown(self):
+        self.session.close()
+        super().tearDown()
+
+    def testEventCollision(self):
+        """Collisions found by the interval index follow updates"""
+        base = {"description": "Lorem ipsum", "invitees": [],
+                "place_id": self.place_id}
+        with self.session:
+            a = dbt.EventWorker(dict(
+                base, name="A", start_date=parse_time("01-03-2090 10:00"),
+                end_date=parse_time("01-03-2090 12:00"))).add(self.session)
+            b = dbt.EventWorker(dict(
+                base, name="B", start_date=parse_time("01-03-2090 12:00"),
+                end_date=parse_time("01-03-2090 13:00"))).add(self.session)
+            self.assertIn(a.id, [c.id for c in b.collides],
+                          "Touching events collide")
+
+            b = dbt.EventWorker({
+                "id": b.id, "start_date": parse_time("01-03-2090 12:01"),
+                "end_date": parse_time("01-03-2090 13:00")})\
+                .update(self.session)
+            self.assertNotIn(a.id, [c.id for c in b.collides],
+                             "Index is updated with the event")
+            self.session.commit()
+
+    def testCollisionsAll(self):
+        """All pairs of colliding events are found by the sweep"""
+        base = {"description": "Lorem ipsum", "invitees": [],
+                "place_id": self.place_id}
+        dates = [("01-04-2090 10:00", "01-04-2090 12:00"),
+                 ("01-04-2090 11:00", "01-04-2090 11:30"),
+                 ("01-04-2090 11:45", "01-04-2090 13:00"),
+                 ("01-04-2090 13:01", "01-04-2090 14:00")]
+        with self.session:
+            ids = [dbt.EventWorker(dict(
+                base, name="Sweep", start_date=parse_time(s),
+                end_date=parse_time(e))).add(self.session).id
+                for s, e in dates]
+            pairs = {(p["first"]["id"], p["second"]["id"])
+                     for p in dbt.EventWorker({}).collisions_all(self.session)
+                     if {p["first"]["id"], p["second"]["id"]} <= set(ids)}
+            self.assertEqual({(ids[0], ids[1]), (ids[0], ids[2])}, pairs,
+                             "Correctly finds all colliding pairs")
+            self.session.commit()
+
+    def testConflicts(self):
+        """Double-bookings of a person and of a place"""
+        with self.session:
+            person = dbt.PersonWorker({
+                "name": "Anna", "surname": "Busy",
+                "email": unique_email("anna"),
+                "participates": []}).add(self.session)
+            place = dbt.PlaceWorker({
+                "name": "Hall", "street_name": "Long Street",
+                "street_number": 1}).add(self.session)
+            base = {"description": "Lorem ipsum", "name": "Booked",
+                    "start_date": parse_time("01-05-2090 10:00"),
+                    "end_date": parse_time("01-05-2090 12:00")}
+            a = dbt.EventWorker(dict(base, invitees=[person.id],
+                                     place_id=self.place_id)).add(self.session)
+            b = dbt.EventWorker(dict(base, invitees=[person.id],
+                                     place_id=place.id)).add(self.session)
+            c = dbt.EventWorker(dict(base, invitees=[],
+                                     place_id=place.id)).add(self.session)
+
+            people = list(dbt.PersonWorker({"id": person.id})
+                          .conflicts(self.session))
+            self.assertEqual(
+                [(a.id, b.id)],
+                [(p["first"]["id"], p["second"]["id"]) for p in people],
+                "Correctly finds conflicts of a person")
+            places = [p for p in dbt.PlaceWorker({})
+                      .conflicts_all(self.session)
+                      if p["place_id"] == place.id]
+            self.assertEqual(
+                [(b.id, c.id)],
+                [(p["first"]["id"], p["second"]["id"]) for p in places],
+                "Correctly finds conflicts of all places")
+            self.session.commit()
+
+    def testInfoAllPages(self):
+        """Fetching all places page by page"""
+        with self.session:
+            ids = [dbt.PlaceWorker({"name": f"Page {i}", "street_name": "X",
+                                    "street_number": 1}).add(self.session).id
+                   for i in range(3)]
+            page = dbt.PlaceWorker({"after_id": ids[0] - 1, "limit": 2})\
+                .info_all(self.session)
+            self.assertEqual(ids[:2], [p.id for p in page],
+                             "First page has first two places")
+            page = list(dbt.PlaceWorker({"after_id": ids[1], "limit": 2})
+                        .info_stream(self.session))
+            self.assertEqual(ids[2:], [p["id"] for p in page],
+                             "Next page starts after the cursor")
+            self.session.commit()
+
+    def testInfoStream(self):
+        """Rows serialized without objects are equal to serialized objects"""
+        def ordered(r):
+            return {k: sorted(v, key=lambda x: x["id"])
+                    if isinstance(v, list) else v for k, v in r.items()}
+
+        for table in ["people", "events", "places"]:
+            instr = {"table": table, "action": "info_all", "limit": 50}
+            self.assertEqual(
+                [ordered(r) for r in dbt.act(instr)],
+                [ordered(r) for r in dbt.act_stream(
+                    dict(instr, action="info_stream"))],
+                "Same serialization")
+
+    def testActMany(self):
+        """Batch of actions with failing instructions"""
+        place = {"table": "places", "action": "add",
+                 "street_name": "Batch Street", "street_number": 1}
+        res = dbt.act_many([
+            dict(place, name="Batch 1"),
+            dict(place, name="Batch 2", street_name=None),
+            dict(place, name=""),
+            dict(place, name="Batch 3"),
+            {"table": "places", "action": "update", "id": 9999999999,
+             "name": "Nowhere"}])
+
+        self.assertEqual([True, False, False, True, False],
+                         [r["ok"] for r in res],
+                         "Only failing instructions are reported as errors")
+        for r in [res[0], res[3]]:
+            p = dbt.act({"table": "places", "action": "info", "id": r["id"]})
+            self.assertEqual("Batch Street", p["street_name"],
+                             "Other instructions are committed")
+
+    def testImport(self):
+        """Importing people from CSV and events from JSONL"""
+        people = sio.import_file("people", io.StringIO(
+            "name,surname,email,participates\n"
+            f"Ada,Imported,{unique_email('ada')},\n"
+            "Bob,Imported,bob.example.com,\n"), "csv")
+        self.assertEqual((1, 1), (people["imported"], people["failed"]),
+                         "Incorrect email is reported")
+
+        with self.session:
+            person = dbt.PersonWorker({"surname": "Imported"})\
+                .lookup(self.session)[-1]
+        events = sio.import_file("events", io.StringIO(
+            '{"name": "Imported", "start_date": "2090-06-01T10:00", '
+            '"end_date": "01-06-2090 12:00", "description": "Lorem", '
+            f'"place_id": {self.place_id}, '
+            f'"invitees": [{person.id}, 9999999999]}}\n'),
+            "jsonl")
+        self.assertEqual(1, events["imported"], "Event is imported")
+
+        with self.session:
+            event = dbt.EventWorker({"name": "Imported"})\
+                .lookup(self.session)[-1]
+            self.assertEqual([person.id], [p.id for p in event.invitees],
+                             "Existing invitees are linked")
+
+        events = sio.import_rows("events", [{
+            "name": "Imported except", "start_date": "2090-06-01T10:00",
+            "end_date": "2090-06-01T12:00", "description": "Lorem",
+            "place_id": self.place_id, "invitees": [], "repeat": "daily",
+            "repeat_count": 5, "repeat_except": "04-06-2090 02-06-2090"}])
+        self.assertEqual(1, events["imported"], "Recurring event imported")
+        with self.session:
+            event = dbt.EventWorker({"name": "Imported except"})\
+                .lookup(self.session)[-1]
+            self.assertEqual("2090-06-02 2090-06-04", event.repeat_except,
+                             "Skipped dates stored as by the database class")
+
+        rows = [{"name": f"Imported {n}", "start_date": "2090-06-01T10:00",
+                 "end_date": "2090-06-01T12:00", "description": "Lorem",
+                 "place_id": self.place_id,
+                 "invitees": [person.id] if n % 2 else []}
+                for n in range(4)]
+        self.assertEqual(4, sio.import_rows("events", rows)["imported"],
+                         "Events are imported")
+        with self.session:
+            for n in range(4):
+                event = dbt.EventWorker({"name": f"Imported {n}"})\
+                    .lookup(self.session)[-1]
+                self.assertEqual([person.id] if n % 2 else [],
+                                 [p.id for p in event.invitees],
+                                 "Invitees linked to ids of their rows")
+
+    def testUpsert(self):
+        """Adding or updating people matched by email \
+            (counted, with invalidated cached results)"""
+        emails = [unique_email("kim"), unique_email("lee")]
+        person = dbt.act({"table": "people", "action": "add", "name": "Kim",
+                          "surname": "Synced", "email": emails[0],
+                          "participates": []})
+        info = {"table": "people", "action": "info", "id": person["id"]}
+        dbt.act(info)
+        with self.assertRaises(IntegrityError):
+            dbt.act(dict(person, table="people", action="add", id=None))
+
+        rows = [{"name": "Kimberly", "surname": "Synced", "email": emails[0]},
+                {"name": "Lee", "surname": "Synced", "email": emails[1]},
+                {"name": "Bad", "surname": "Synced", "email": "bad.com"}]
+        res = sio.upsert_rows(rows, chunk_size=2)
+        self.assertEqual((0, 1, 1, 1), (res["unchanged"], res["updated"],
+                                        res["created"], res["failed"]),
+                         "Created, updated and failed rows")
+        self.assertEqual("Kimberly", dbt.act(info)["name"],
+                         "Cached info is invalidated")
+        res = sio.upsert_rows(rows)
+        self.assertEqual((2, 0, 0), (res["unchanged"], res["updated"],
+                                     res["created"]), "Unchanged rows")
+
+        res = dbt.act_many([
+            {"table": "people", "action": "upsert", "name": "Lee",
+             "surname": "Resynced", "email": emails[1]},
+            {"table": "people", "action": "upsert", "name": "Kim",
+             "surname": "Synced", "email": emails[0]},
+            {"table": "people", "action": "upsert", "name": "Kimmy",
+             "surname": "Synced", "email": emails[0]},
+            {"table": "places", "action": "upsert", "name": "Hall"}])
+        self.assertEqual(["updated", None, "updated", None],
+                         [r.get("status") for r in res],
+                         "Only the last person with an email is written")
+        self.assertEqual(["Kimmy"], [p["name"] for p in dbt.act(
+            {"table": "people", "action": "search", "query": emails[0]})],
+            "Person updated by the batch")
+
+        inserts = dict(dbt.upsert_inserts)
+        del dbt.upsert_inserts["sqlite"]
+        try:
+            self.assertFalse(dbt.act_many([
+                {"table": "people", "action": "upsert", "name": "Lee",
+                 "surname": "Synced", "email": emails[1]}])[0]["ok"],
+                "Upsert reported as failed without ON CONFLICT")
+        finally:
+            dbt.upsert_inserts.update(inserts)
+        with self.assertRaises(TypeError):
+            dbt.Worker({}, {})
+
+    def testChanges(self):
+        """Added, updated and deleted rows are logged in order \
+            and compaction keeps the latest entry of each row"""
+        with self.session:
+            since = self.session.scalar(
+                select(func.max(dbt.change_log.c.seq))) or 0
+        place = dbt.act({"table": "places", "action": "add", "name": "Log",
+                         "street_name": "X", "street_number": 1})
+        dbt.act({"table": "places", "action": "update", "id": place["id"],
+                 "name": "Logged"})
+        person = dbt.act({"table": "people", "action": "add", "name": "Lu",
+                          "surname": "Logged", "email": unique_email("lu"),
+                          "participates": []})
+        e = dbt.act({"table": "events", "action": "add", "name": "Logged",
+                     "description": "Lorem", "place_id": place["id"],
+                     "start_date": parse_time("01-01-2097 10:00"),
+                     "end_date": parse_time("01-01-2097 12:00"),
+                     "invitees": [person["id"]]})
+        dbt.act({"table": "events", "action": "delete", "id": e["id"]})
+        dbt.act({"table": "places", "action": "delete", "id": place["id"]})
+
+        def logged():
+            return [(c["table"], c["id"], c["op"])
+                    for c in dbt.changes(since)]
+        p, u, e = place["id"], person["id"], e["id"]
+        self.assertEqual([("places", p, "add"), ("places", p, "update"),
+                          ("people", u, "add"), ("events", e, "add"),
+                          ("people", u, "update"), ("places", p, "update"),
+                          ("people", u, "update"), ("places", p, "update"),
+                          ("events", e, "delete"), ("places", p, "delete")],
+                         logged(), "Writes and changed related rows logged")
+        self.assertEqual(logged()[3:5], [
+            (c["table"], c["id"], c["op"])
+            for c in dbt.changes(dbt.changes(since, 3)[-1]["seq"], 2)],
+            "Next entries after the last read one")
+
+        dbt.compact_changes(datetime.datetime.now()
+                            + datetime.timedelta(minutes=1))
+        self.assertEqual([("people", u, "update"), ("events", e, "delete"),
+                          ("places", p, "delete")], logged(),
+                         "Latest entry of each row is kept")
+
+    def testRange(self):
+        """Events in a time range (filtered by invitees), sorted by start"""
+        person = dbt.act({"table": "people", "action": "add", "name": "Ada",
+                          "surname": "Ranged", "email": unique_email("ada"),
+                          "participates": []})
+        ids = []
+        for start, end in [("03-01-2091 10:00", "03-01-2091 12:00"),
+                           ("01-01-2091 10:00", "05-01-2091 12:00"),
+                           ("01-01-2091 08:00", "01-01-2091 09:00")]:
+            ids.append(dbt.act({
+                "table": "events", "action": "add", "name": "Ranged",
+                "description": "Lorem", "start_date": parse_time(start),
+                "end_date": parse_time(end), "place_id": self.place_id,
+                "invitees": [person["id"]]})["id"])
+
+        res = dbt.act({"table": "events", "action": "range",
+                       "from": parse_time("02-01-2091 00:00"),
+                       "to": parse_time("04-01-2091 00:00"),
+                       "invitees": [person["id"]]})
+        self.assertEqual([ids[1], ids[0]], [r["id"] for r in res],
+                         "Overlapping events sorted by start")
+
+        endless = dbt.act({
+            "table": "events", "action": "add", "name": "Endless",
+            "description": "Lorem", "start_date": parse_time(
+                "01-01-2091 07:00"), "end_date": parse_time(
+                "01-01-2091 07:30"), "place_id": self.place_id,
+            "invitees": [], "repeat": "daily"})
+        instr = {"table": "events", "action": "range",
+                 "from": parse_time("02-01-2091 00:00")}
+        with self.assertRaises(ValueError):
+            dbt.act(instr)
+        self.assertEqual(2, sum(r["id"] == endless["id"] for r in dbt.act(
+            instr | {"to": parse_time("03-01-2091 12:00")})),
+            "Occurrences of an endless series in a bounded range")
+
+    def testFreeSlots(self):
+        """Free slots of two people (overlapping busy intervals merged)"""
+        people = [dbt.act({"table": "people", "action": "add", "name": "Ada",
+                           "surname": "Busy", "email": unique_email("ada"),
+                           "participates": []})["id"] for _ in range(2)]
+        for start, end, invitees in [
+                ("01-01-2092 09:00", "01-01-2092 11:00", people[:1]),
+                ("01-01-2092 10:00", "01-01-2092 12:00", people[1:]),
+                ("01-01-2092 13:00", "01-01-2092 13:30", people)]:
+            dbt.act({"table": "events", "action": "add", "name": "Busy",
+                     "description": "Lorem", "start_date": parse_time(start),
+                     "end_date": parse_time(end), "place_id": self.place_id,
+                     "invitees": invitees})
+
+        res = dbt.act({"table": "events", "action": "free_slots",
+                       "invitees": people, "duration": 90,
+                       "from": parse_time("01-01-2092 08:00"),
+                       "to": parse_time("01-01-2092 16:00")})
+        self.assertEqual([("01-01-2092 13:30", "01-01-2092 16:00")],
+                         [(r["start"].strftime("%d-%m-%Y %H:%M"),
+                           r["end"].strftime("%d-%m-%Y %H:%M"))
+                          for r in res], "Slots of at least 90 minutes")
+
+    def testRecurrence(self):
+        """Occurrences of a weekly event are expanded only in the range \
+            and collisions are found without expanding them"""
+        weekly = dbt.act({"table": "events", "action": "add",
+                          "name": "Weekly", "description": "Lorem",
+                          "start_date": parse_time("01-01-2094 10:00"),
+                          "end_date": parse_time("01-01-2094 12:00"),
+                          "place_id": self.place_id, "invitees": [],
+                          "repeat": "weekly", "repeat_count": 10,
+                          "repeat_except": ["15-01-2094"]})
+        self.assertEqual(parse_time("05-03-2094 12:00"),
+                         weekly["series_end"], "End of the last occurrence")
+
+        res = dbt.act({"table": "events", "action": "range",
+                       "from": parse_time("07-01-2094 00:00"),
+                       "to": parse_time("28-01-2094 00:00"),
+                       "place_id": self.place_id})
+        self.assertEqual(["08-01-2094 10:00", "22-01-2094 10:00"],
+                         [r["start_date"].strftime("%d-%m-%Y %H:%M")
+                          for r in res if r["id"] == weekly["id"]],
+                         "Occurrences in the range (except skipped)")
+
+        for day, collides in [("29-01-2094", True), ("15-01-2094", False),
+                              ("12-03-2094", False)]:
+            single = dbt.act({"table": "events", "action": "add",
+                              "name": "Single", "description": "Lorem",
+                              "start_date": parse_time(f"{day} 11:00"),
+                              "end_date": parse_time(f"{day} 11:30"),
+                              "place_id": self.place_id, "invitees": []})
+            self.assertEqual(collides, weekly["id"] in [
+                c["id"] for c in single["collides"]], f"Collision on {day}")
+            dbt.act({"table": "events", "action": "delete",
+                     "id": single["id"]})
+
+        daily = dbt.act({"table": "events", "action": "add",
+                         "name": "Daily", "description": "Lorem",
+                         "start_date": parse_time("02-01-2094 11:00"),
+                         "end_date": parse_time("02-01-2094 11:30"),
+                         "place_id": self.place_id, "invitees": [],
+                         "repeat": "daily", "repeat_every": 2})
+        self.assertIn(weekly["id"], [c["id"] for c in daily["collides"]],
+                      "Patterns collide (on 08-01-2094)")
+        pairs = [(p["first"]["id"], p["second"]["id"]) for p in dbt.act_stream(
+            {"table": "places", "action": "conflicts", "id": self.place_id})]
+        self.assertIn((weekly["id"], daily["id"]), pairs, "Conflict found")
+        for e in [weekly, daily]:
+            dbt.act({"table": "events", "action": "delete", "id": e["id"]})
+
+    def testStats(self):
+        """Numbers of events and booked hours in a time range \
+            (with occurrences of a recurring event)"""
+        person = dbt.act({"table": "people", "action": "add",
+                          "name": "Ewa", "surname": "Counted",
+                          "email": unique_email("ewa"), "participates": []})
+        base = {"table": "events", "action": "add", "name": "Counted",
+                "description": "Lorem", "place_id": self.place_id,
+                "invitees": [person["id"]]}
+        events = [dbt.act(dict(base, start_date=parse_time(s),
+                               end_date=parse_time(e), **r))
+                  for s, e, r in [
+                      ("01-02-2096 10:00", "01-02-2096 12:30", {}),
+                      ("01-02-2096 14:00", "01-02-2096 15:00", {}),
+                      ("02-02-2096 09:00", "02-02-2096 10:00",
+                       {"repeat": "daily", "repeat_count": 5}),
+                      ("10-02-2096 09:00", "10-02-2096 10:00", {})]]
+
+        res = dbt.act({"table": "events", "action": "stats",
+                       "from": parse_time("01-02-2096 00:00"),
+                       "to": parse_time("04-02-2096 23:59")})
+        self.assertEqual(5, res["events"], "Events starting in the range")
+        self.assertEqual([(self.place_id, 5, 6.5)],
+                         [(p["place_id"], p["events"], p["hours"])
+                          for p in res["places"]],
+                         "Events and hours per place")
+        self.assertEqual([{"person_id": person["id"], "name": "Ewa",
+                           "surname": "Counted", "events": 5}],
+                         res["people"], "Events per person")
+        self.assertEqual([("2096-02-01", 2), ("2096-02-02", 1),
+                          ("2096-02-03", 1), ("2096-02-04", 1)],
+                         [(d["day"], d["events"]) for d in res["days"]],
+                         "Events per day")
+        for e in events:
+            dbt.act({"table": "events", "action": "delete", "id": e["id"]})
+
+    def testBulkChanges(self):
+        """Imported and archived events are logged with their invitees \
+            (as updated, as by actions)"""
+        with self.session:
+            since = self.session.scalar(
+                select(func.max(dbt.change_log.c.seq))) or 0
+        person = dbt.act({"table": "people", "action": "add",
+                          "name": "Ivo", "surname": "Bulk",
+                          "email": unique_email("ivo"), "participates": []})
+        sio.import_rows("events", [{
+            "name": "Bulk", "start_date": "1989-06-01T10:00",
+            "end_date": "1989-06-01T12:00", "description": "Lorem",
+            "place_id": self.place_id, "invitees": [person["id"]]}])
+        with self.session:
+            event = dbt.EventWorker({"name": "Bulk"})\
+                .lookup(self.session)[-1]
+
+        def logged():
+            return [(c["table"], c["id"], c["op"])
+                    for c in dbt.changes(since)]
+        p, e = person["id"], event.id
+        self.assertEqual([("people", p, "add"), ("events", e, "add"),
+                          ("people", p, "update")], logged(),
+                         "Invitees of imported events are logged")
+
+        dbt.archive(parse_time("01-01-1990 00:00"))
+        self.assertEqual([("events", e, "delete"), ("people", p, "update")],
+                         logged()[3:],
+                         "Invitees of archived events are logged")
+
+    def testArchive(self):
+        """Finished events are moved to the archive with their invitees \
+            in chunks and they can be queried there"""
+        person = dbt.act({"table": "people", "action": "add",
+                          "name": "Olga", "surname": "Archived",
+                          "email": unique_email("olga"), "participates": []})
+        base = {"table": "events", "action": "add", "name": "Old",
+                "description": "Lorem", "place_id": self.place_id,
+                "invitees": [person["id"]]}
+        old = [dbt.act(dict(base, start_date=parse_time(f"0{d}-03-1990 10:00"),
+                            end_date=parse_time(f"0{d}-03-1990 12:00")))
+               for d in [1, 2, 3]]
+        weekly = dbt.act(dict(base, start_date=parse_time("01-03-1990 10:00"),
+                              end_date=parse_time("01-03-1990 12:00"),
+                              repeat="weekly"))
+        dbt.act(dict(base, start_date=parse_time("01-03-2091 10:00"),
+                     end_date=parse_time("01-03-2091 12:00")))
+
+        res = dbt.archive(parse_time("01-01-1991 00:00"), chunk_size=2)
+        self.assertEqual({"archived": 3, "chunks": 2}, res,
+                         "Archived in chunks")
+        self.assertEqual({"msg": "Not found"}, dbt.act({
+            "table": "events", "action": "info", "id": old[0]["id"]}),
+            "Archived event is not live")
+        self.assertIn("id", dbt.act({"table": "events", "action": "info",
+                                     "id": weekly["id"]}),
+                      "Endless series is not archived")
+
+        archived = dbt.act({"table": "events", "action": "archived",
+                            "from": parse_time("02-03-1990 00:00"),
+                            "to": parse_time("31-03-1990 00:00"),
+                            "after_id": old[0]["id"]})
+        self.assertEqual([(e["id"], [person["id"]]) for e in old[1:]],
+                         [(e["id"], e["invitees"]) for e in archived],
+                         "Archived events with invitees in the range")
+        dbt.act({"table": "events", "action": "delete", "id": weekly["id"]})
+
+    def testCollisionTable(self):
+        """Stored collisions follow writes (also of cached results) \
+            and equal the ones regenerated from scratch"""
+        base = {"table": "events", "description": "Lorem",
+                "place_id": self.place_id, "invitees": [], "name": "Stored"}
+        a = dbt.act(dict(base, action="add",
+                         start_date=parse_time("01-05-2091 10:00"),
+                         end_date=parse_time("01-05-2091 12:00")))
+        b = dbt.act(dict(base, action="add",
+                         start_date=parse_time("01-05-2091 11:00"),
+                         end_date=parse_time("01-05-2091 13:00")))
+
+        def collides():
+            info = dbt.act({"table": "events", "action": "info",
+                            "id": a["id"]})
+            return [c["id"] for c in info["collides"]]
+
+        self.assertEqual([b["id"]], collides(), "Collision of the other")
+        dbt.act(dict(base, action="update", id=b["id"],
+                     start_date=parse_time("01-05-2091 13:00"),
+                     end_date=parse_time("01-05-2091 14:00")))
+        self.assertEqual([], collides(), "Cached info is invalidated")
+
+        sio.import_rows("events", [dict(
+            base, start_date=parse_time("01-05-2091 09:00"),
+            end_date=parse_time("01-05-2091 10:00"))])
+        imported = collides()
+        self.assertEqual(1, len(imported), "Collision of imported event")
+        dbt.act({"table": "events", "action": "delete", "id": imported[0]})
+        self.assertEqual([], collides(), "Collision of deleted event")
+
+        with self.session:
+            stored = set(self.session.execute(
+                dbt.select(dbt.event_collisions)).tuples())
+            swept = {(p["first"]["id"], p["second"]["id"]) for p in
+                     dbt.EventWorker({}).collisions_all(self.session)}
+        self.assertEqual(swept | {(y, x) for x, y in swept}, stored,
+                         "Stored pairs are the swept ones")
+        dbt.act({"table": "events", "action": "rebuild"})
+        self.assertEqual([], collides(), "Collisions after rebuild")
+        for e in [a, b]:
+            dbt.act({"table": "events", "action": "delete", "id": e["id"]})
+
+    def testCache(self):
+        """Cached info is invalidated by writes of related objects"""
+        person = dbt.act({"table": "people", "action": "add", "name": "Ada",
+                          "surname": "Cached", "email": unique_email("ada"),
+                          "participates": []})
+        other = dbt.act({"table": "people", "action": "add", "name": "Bob",
+                         "surname": "Cached", "email": unique_email("bob"),
+                         "participates": []})
+        e = dbt.act({"table": "events", "action": "add", "name": "Cached",
+                     "description": "Lorem", "place_id": self.place_id,
+                     "start_date": parse_time("01-01-2093 10:00"),
+                     "end_date": parse_time("01-01-2093 12:00"),
+                     "invitees": [person["id"]]})
+        info = {"table": "events", "action": "info", "id": e["id"]}
+        other_info = {"table": "people", "action": "info", "id": other["id"]}
+
+        dbt.act(info)
+        dbt.act(other_info)
+        hits = dbt.cache.stats()["hits"]
+        dbt.act(info)
+        self.assertEqual(hits + 1, dbt.cache.stats()["hits"], "Cache hit")
+
+        dbt.act({"table": "people", "action": "update", "id": person["id"],
+                 "name": "Adelaide"})
+        self.assertEqual(["Adelaide"],
+                         [p["name"] for p in dbt.act(info)["invitees"]],
+                         "Invitee update invalidates the event")
+
+        dbt.act({"table": "events", "action": "update", "id": e["id"],
+                 "invitees": [person["id"], other["id"]]})
+        self.assertEqual([e["id"]], [p["id"] for p in dbt.act(
+            other_info)["participates"]], "New invitee is invalidated")
+
+        cached = dbt.act(other_info)
+        url = dbt.DB_URL
+        dbt.configure(url="sqlite://")
+        try:
+            self.assertNotEqual(cached, dbt.act(other_info),
+                                "Cache cleared with another database")
+        finally:
+            dbt.configure(url=url)
+
+    def testSearch(self):
+        """Searching people by prefixes of words, updated by triggers"""
+        word = f"Searched{time.time_ns()}"
+        p = dbt.act({"table": "people", "action": "add", "name": "Ada",
+                     "surname": word,
+                     "email": f"ada.{uuid.uuid4().hex}@search.example.com",
+                     "participates": []})
+
+        found = dbt.act({"table": "people", "action": "search",
+                         "query": f"{word[:-3]} search.exam", "limit": 5})
+        self.assertEqual([p["id"]], [r["id"] for r in found],
+                         "Found by prefixes of surname and email")
+
+        dbt.act({"table": "people", "action": "update", "id": p["id"],
+                 "surname": "Renamed"})
+        found = dbt.act({"table": "people", "action": "search",
+                         "query": word})
+        self.assertEqual([], found, "Old surname is not found")
+
+    def testExport(self):
+        """Exporting people with their events (gzipped JSONL)"""
+        with self.session:
+            e = dbt.EventWorker({"name": "Exported", "description": "Lorem",
+                                 "start_date": parse_time("01-07-2090 10:00"),
+                                 "end_date": parse_time("01-07-2090 12:00"),
+                                 "invitees": [], "place_id": self.place_id})\
+                .add(self.session)
+            later = dbt.EventWorker({
+                "name": "Exported later", "description": "Lorem",
+                "start_date": parse_time("02-07-2090 10:00"),
+                "end_date": parse_time("02-07-2090 12:00"),
+                "invitees": [], "place_id": self.place_id}).add(self.session)
+            email = unique_email("eve")
+            p = dbt.PersonWorker({"name": "Eve", "surname": "Exported",
+                                  "email": email,
+                                  "participates": [later.id, e.id]})\
+                .add(self.session)
+            self.session.commit()
+            expected = {"id": p.id, "name": "Eve", "surname": "Exported",
+                        "email": email, "participates": [e.id, later.id]}
+
+        file = io.BytesIO()
+        res = sio.export_file("people", file, "jsonl", compress=True)
+        lines = gzip.decompress(file.getvalue()).decode().splitlines()
+        self.assertEqual(res["exported"], len(lines), "All rows counted")
+        self.assertIn(expected, [json.loads(line) for line in lines],
+                      "Person is exported with ordered ids of events")
+
+    def testSharedEngine(self):
+        """Sessions and actions reuse one process-wide engine"""
+        engine = dbt.get_engine()
+        self.assertIs(engine, self.session.get_bind(),
+                      "Session is bound to the shared engine")
+        dbt.act({"table": "places", "action": "info_all"})
+        self.assertIs(engine, dbt.get_engine(),
+                      "Engine is not rebuilt by act")
+
+
+class TestEagerLoading(unittest.TestCase):
+    def setUp(self):
+        """Initialize a session on a fresh in-memory database \
+            counting executed statements"""
+        self.engine = create_engine("sqlite://")
+        dbt.Base.metadata.create_all(self.engine)
+        self.session = Session(self.engine)
+        self.statements = 0
+
+        def count(*args):
+            self.statements += 1
+        event.listen(self.engine, "before_cursor_execute", count)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def addRows(self, n):
+        """Add `n` events, each with a new place and a new invitee"""
+        for i in range(n):
+            place = dbt.PlaceWorker({"name": f"Place {i}", "street_name": "X",
+                                     "street_number": 1}).add(self.session)
+            person = dbt.PersonWorker({"name": "A", "surname": f"B{i}",
+                                       "email": unique_email("a"),
+                                       "participates": []})\
+                .add(self.session)
+            dbt.EventWorker({"name": f"Event {i}", "description": "Lorem",
+                             "start_date": parse_time("01-01-2024 10:00"),
+                             "end_date": parse_time("01-01-2024 12:00"),
+                             "invitees": [person.id],
+                             "place_id": place.id}).add(self.session)
+        self.session.commit()
+        self.session.expunge_all()
+
+    def countStatements(self, worker):
+        """Count statements of `info_all` and serialization of the result"""
+        self.statements = 0
+        for r in worker.info_all(self.session):
+            r.serialize()
+        self.session.expunge_all()
+        return self.statements
+
+    def testConstantStatements(self):
+        """Serializing all rows takes the same number of statements"""
+        for worker in [dbt.EventWorker({}), dbt.PersonWorker({}),
+                       dbt.PlaceWorker({})]:
+            self.addRows(2)
+            few = self.countStatements(worker)
+            self.addRows(50)
+            many = self.countStatements(worker)
+            self.assertEqual(few, many, "No lazy loads per row")
+
+    def testOtherSessions(self):
+        """Sessions not created by `dbt.init` are not logged \
+            and do not store collisions"""
+        self.addRows(2)
+        self.assertEqual((0, 0), (
+            self.session.scalar(select(func.count())
+                                .select_from(dbt.change_log)),
+            self.session.scalar(select(func.count())
+                                .select_from(dbt.event_collisions))),
+            "No listeners on other sessions")
+
+
+class TestSchemaUpgrade(unittest.TestCase):
+    def setUp(self):
+        """Initialize an in-memory database with the old schema \
+            (no indexes, no primary key of `person_event`, \
+                ids of events without `AUTOINCREMENT`)"""
+        self.engine = create_engine("sqlite://")
+        with self.engine.begin() as connection:
+            for t in dbt.Base.metadata.sorted_tables:
+                if t is not dbt.participation:
+                    connection.exec_driver_sql(str(CreateTable(t).compile(
+                        connection)).replace(" AUTOINCREMENT", ""))
+            connection.exec_driver_sql(
+                "CREATE TABLE person_event (event_id INTEGER, "
+                "person_id INTEGER)")
+            connection.exec_driver_sql(
+                "INSERT INTO person_event VALUES (1, 2), (1, 2), (2, 2)")
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def testMergePeople(self):
+        """Upgrade fails if people share an email (case-insensitively) \
+            and merges them (with their links, logged) only if asked to, \
+                before the unique index of emails is created"""
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "INSERT INTO \"People\" VALUES (1, 'A', 'A', 'a@b'), "
+                "(2, 'B', 'B', 'A@b'), (3, 'C', 'C', 'c@d')")
+        with self.engine.begin() as connection:
+            with self.assertRaises(ValueError, msg="Duplicates reported"):
+                dbt.upgrade_schema(connection)
+
+        dbt.configure(merge_people=True)
+        try:
+            with self.engine.begin() as connection, \
+                    self.assertLogs(dbt.logger) as logs:
+                dbt.upgrade_schema(connection)
+        finally:
+            dbt.configure(merge_people=False)
+        self.assertIn("[2]", logs.output[0], "Merged people logged")
+        with self.engine.begin() as connection:
+            self.assertEqual(connection.exec_driver_sql(
+                "SELECT id, email FROM \"People\" ORDER BY id").all(),
+                [(1, "a@b"), (3, "c@d")], "Duplicates removed")
+            self.assertEqual(connection.exec_driver_sql(
+                "SELECT event_id, person_id FROM person_event "
+                "ORDER BY event_id").all(), [(1, 1), (2, 1)],
+                "Links moved to the first person")
+
+    def testUpgrade(self):
+        """Upgrade adds the primary key and indexes, keeping the links"""
+        with self.engine.begin() as connection:
+            dbt.upgrade_schema(connection)
+            dbt.upgrade_schema(connection)
+            columns = connection.exec_driver_sql(
+                "PRAGMA table_info(person_event)").all()
+            self.assertEqual({c.name for c in columns if c.pk},
+                             {"event_id", "person_id"}, "Primary key added")
+            self.assertEqual(connection.exec_driver_sql(
+                "SELECT event_id, person_id FROM person_event "
+                "ORDER BY event_id").all(), [(1, 2), (2, 2)],
+                "Links kept without duplicates")
+            indexes = set(connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'")
+                .scalars())
+        for t in dbt.Base.metadata.sorted_tables:
+            for index in t.indexes:
+                self.assertIn(index.name, indexes, "Index created")
+
+    def testAutoincrement(self):
+        """Upgrade rebuilds events with `AUTOINCREMENT` keeping their ids \
+            and links, new ids follow archived ones"""
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "INSERT INTO \"Events\" (id, name, start_date, end_date, "
+                "description, place_id) VALUES (1, 'A', "
+                "'2024-01-01 10:00:00.000000', '2024-01-01 11:00:00.000000', "
+                "'Lorem', 1)")
+            connection.exec_driver_sql(
+                "INSERT INTO events_archive (id, name, start_date, "
+                "end_date, description, place_id) VALUES (5, 'B', "
+                "'2023-01-01 10:00:00.000000', '2023-01-01 11:00:00.000000', "
+                "'Lorem', 1)")
+            dbt.upgrade_schema(connection)
+            dbt.upgrade_schema(connection)
+            self.assertIn("AUTOINCREMENT", connection.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE name = 'Events'")
+                .scalar(), "Events rebuilt")
+            self.assertEqual(connection.exec_driver_sql(
+                "SELECT event_id, person_id FROM person_event "
+                "ORDER BY event_id").all(), [(1, 2), (2, 2)],
+                "Links kept")
+            self.assertEqual([1], connection.exec_driver_sql(
+                "SELECT id FROM \"Events\"").scalars().all(), "Id kept")
+            connection.exec_driver_sql(
+                "INSERT INTO \"Events\" (name, start_date, end_date, "
+                "description, place_id) VALUES ('C', "
+                "'2024-01-02 10:00:00.000000', '2024-01-02 11:00:00.000000', "
+                "'Lorem', 1)")
+            self.assertEqual(6, connection.exec_driver_sql(
+                "SELECT max(id) FROM \"Events\"").scalar(),
+                "Id after the archived event")
+            foreign = connection.exec_driver_sql(
+                "PRAGMA foreign_key_list(person_event)").all()
+            self.assertIn("Events", {f.table for f in foreign},
+                          "Links still reference events")
+
+    def testInMemoryUrl(self):
+        """In-memory database URL is used without pool options"""
+        url = dbt.DB_URL
+        dbt.configure(url="sqlite://")
+        try:
+            place = dbt.act({"table": "places", "action": "add",
+                             "name": "Memory", "street_name": "X",
+                             "street_number": 1})
+            self.assertEqual([place["id"]], [p["id"] for p in dbt.act(
+                {"table": "places", "action": "info_all"})],
+                "Place stored in the in-memory database")
+        finally:
+            dbt.configure(url=url)
+
+
+class TestConcurrentWrites(TemporaryDatabase):
+    def testConcurrentUpdates(self):
+        """Updates reading before writing run concurrently in threads \
+            without failing on the write lock"""
+        place = dbt.act({"table": "places", "action": "add",
+                         "name": "Busy", "street_name": "X",
+                         "street_number": 1})["id"]
+        errors = []
+
+        def update(n):
+            try:
+                for i in range(20):
+                    dbt.act({"table": "places", "action": "update",
+                             "id": place, "street_number": n * 100 + i + 1})
+                    dbt.act_many([{"table": "places", "action": "update",
+                                   "id": place, "name": f"Busy {n} {i}"}])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=update, args=(n,))
+                   for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([], errors, "No update failed")
+
+    def testIndexesOfWritingSessions(self):
+        """Reading and writing sessions use the interval and search indexes"""
+        for write in [False, True]:
+            with dbt.init(write) as session:
+                self.assertTrue(dbt.has_interval_index(session),
+                                "Interval index is used")
+                self.assertTrue(dbt.has_search_index(session),
+                                "Search index is used")
+
+
+@unittest.skipIf(sot.np is None, "numpy is not installed")
+class TestStatsHorizon(TemporaryDatabase):
+    def testUnboundedRecurrence(self):
+        """Without the end of the range endless recurring events \
+            are counted up to `stats_horizon` after now only"""
+        place = dbt.act({"table": "places", "action": "add",
+                         "name": "Endless", "street_name": "X",
+                         "street_number": 1})["id"]
+        base = {"table": "events", "action": "add", "description": "Lorem",
+                "place_id": place, "invitees": [], "name": "Daily"}
+        start = datetime.datetime.now().replace(microsecond=0) \
+            - datetime.timedelta(days=10)
+        dbt.act(dict(base, start_date=start,
+                     end_date=start + datetime.timedelta(hours=1),
+                     repeat="daily"))
+        dbt.act(dict(base, name="Far", start_date=parse_time(
+            "01-01-2200 10:00"), end_date=parse_time("01-01-2200 11:00")))
+
+        res = dbt.act({"table": "events", "action": "stats"})
+        days = dbt.EventWorker.stats_horizon.days
+        self.assertTrue(days <= res["events"] - 1 <= days + 11,
+                        "Occurrences up to the horizon")
+
+
+class TestOccupancy(TemporaryDatabase):
+    def testSlots(self):
+        """Booked slots, slots in given hours and days, free windows"""
+        np = sot.np
+        booked = sot.booked_rows(np.array([0, 1, 0]), np.array([0, 20, 50]),
+                                 np.array([30, 20, 60]), 2, 0, 6, 15)
+        self.assertEqual([[1, 1, 0, 1, 0, 0], [0, 1, 0, 0, 0, 0]],
+                         booked.astype(int).tolist(),
+                         "Overlapping slots are booked")
+        self.assertEqual([0.5, 1 / 6], sot.utilization(
+            booked, np.ones(6, dtype=bool)).tolist(), "Utilization")
+        minute = datetime.timedelta(minutes=1)
+        origin = sot.ORIGIN
+        self.assertEqual([(origin + 30 * minute, origin + 45 * minute),
+                          (origin + 60 * minute, origin + 90 * minute)],
+                         sot.free_windows(booked, np.ones(6, dtype=bool),
+                                          0, 15), "Windows free in all rows")
+
+        mask = sot.slot_mask(0, 7 * 24, 60, datetime.time(9),
+                             datetime.time(10, 30), [0, 2])
+        self.assertEqual([9, 10, 57, 58], np.flatnonzero(mask).tolist(),
+                         "Slots overlapping the hours on Monday and Wednesday")
+
+    def testAvailable(self):
+        """Places free in given hours follow writes of events"""
+        place = dbt.act({"table": "places", "action": "add",
+                         "name": "Occupied", "street_name": "X",
+                         "street_number": 1})["id"]
+        instr = {"table": "places", "action": "available",
+                 "from": parse_time("01-01-2098 00:00"),
+                 "to": parse_time("01-02-2098 00:00"), "day_from": "09:00",
+                 "day_to": "11:00", "weekdays": [0, 1, 2, 3, 4],
+                 "places": [place]}
+
+        def free(**changed):
+            return [p["id"] for p in dbt.act(instr | changed)]
+
+        self.assertEqual([place], free(), "Free place")
+        base = {"table": "events", "action": "add", "name": "Occupied",
+                "description": "Lorem", "place_id": place, "invitees": []}
+        e = dbt.act(dict(base, start_date=parse_time("06-01-2098 10:30"),
+                         end_date=parse_time("06-01-2098 11:30")))
+        self.assertEqual([], free(), "Booked on Monday")
+        dbt.act({"table": "events", "action": "update", "id": e["id"],
+                 "start_date": parse_time("04-01-2098 10:30"),
+                 "end_date": parse_time("04-01-2098 11:30")})
+        self.assertEqual([place], free(), "Moved to Sunday")
+        weekly = dbt.act(dict(base, start_date=parse_time("05-12-2097 09:00"),
+                              end_date=parse_time("05-12-2097 09:15"),
+                              repeat="weekly", repeat_count=10))
+        self.assertEqual([], free(), "Occurrence on Thursday")
+        self.assertEqual([place], free(day_from="09:15"), "Free after 9:15")
+        for r in [e, weekly]:
+            dbt.act({"table": "events", "action": "delete", "id": r["id"]})
+        self.assertEqual([place], free(weekdays=None), "Free after deletion")
+        dbt.act({"table": "places", "action": "delete", "id": place})
+
+
+@unittest.skipIf(sst.np is None, "numpy is not installed")
+class TestSnapshot(TemporaryDatabase):
+    def testSnapshot(self):
+        """Range, collision and per-person queries on a saved snapshot"""
+        place = dbt.act({"table": "places", "action": "add",
+                         "name": "Snapshot", "street_name": "X",
+                         "street_number": 1})["id"]
+        person = dbt.act({"table": "people", "action": "add",
+                          "name": "Snap", "surname": "Shot",
+                          "email": unique_email("snap"),
+                          "participates": []})["id"]
+        base = {"table": "events", "action": "add", "name": "Snapshot",
+                "description": "Lorem", "place_id": place}
+        a = dbt.act(dict(base, start_date=parse_time("10-03-2096 10:00"),
+                         end_date=parse_time("10-03-2096 12:00"),
+                         invitees=[person]))["id"]
+        b = dbt.act(dict(base, start_date=parse_time("10-03-2096 11:00"),
+                         end_date=parse_time("10-03-2096 13:00"),
+                         invitees=[]))["id"]
+        c = dbt.act(dict(base, start_date=parse_time("08-03-2096 11:30"),
+                         end_date=parse_time("08-03-2096 12:00"),
+                         invitees=[person], repeat="daily",
+                         repeat_count=3))["id"]
+
+        loaded = sst.Snapshot.load(parse_time("31-12-2096 00:00"))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "events.snap")
+            loaded.save(path)
+            snap = sst.Snapshot.open(path)
+            for name in sst.ARRAYS:
+                self.assertEqual(getattr(loaded, name).tolist(),
+                                 getattr(snap, name).tolist(),
+                                 f"Same {name} after reopening")
+            self.assertIsInstance(snap.starts, sst.np.memmap,
+                                  "Memory-mapped arrays")
+
+            at = snap.of_place(place)
+            self.assertEqual([c, c, a, b, c], snap.event_ids(at).tolist(),
+                             "Occurrences in the place sorted by start")
+            self.assertEqual((parse_time("08-03-2096 11:30"),
+                              parse_time("08-03-2096 12:00")),
+                             snap.dates(at[:1])[0], "Dates of occurrences")
+            self.assertEqual([c, c, a, c], snap.event_ids(
+                snap.of_person(person)).tolist(), "Occurrences of invitee")
+            self.assertEqual([b], snap.event_ids(snap.of_place(
+                place, snap.between(parse_time("10-03-2096 12:30"),
+                                    parse_time("10-03-2096 23:00"))))
+                .tolist(), "Occurrences in time range")
+            self.assertEqual([[a, b], [a, c], [b, c]], sorted(
+                sorted(p) for p in snap.event_ids(snap.collisions(at))
+                .tolist()), "Colliding events in the place")
+            index = int(sst.np.searchsorted(snap.ids, a))
+            self.assertEqual([person], snap.invitees_of(index).tolist(),
+                             "Invitees of event")
+
+            self.assertFalse(snap.stale(), "Snapshot is up to date")
+            for e in [a, b, c]:
+                dbt.act({"table": "events", "action": "delete", "id": e})
+            self.assertTrue(snap.stale(), "Events changed after snapshot")
+            del snap, at
+        dbt.act({"table": "people", "action": "delete", "id": person})
+        dbt.act({"table": "places", "action": "delete", "id": place})
+
+
+@unittest.skipIf(ast.aiosqlite is None, "aiosqlite is not installed")
+class TestAsync(TemporaryDatabase):
+    def testConcurrentActions(self):
+        """Concurrent async actions give the same results as `act`"""
+        async def main():
+            place = await ast.act({"table": "places", "action": "add",
+                                   "name": "Async", "street_name": "X",
+                                   "street_number": 1})
+            events = await asyncio.gather(*[ast.act({
+                "table": "events", "action": "add", "name": f"Async {i}",
+                "description": "Lorem", "place_id": place["id"],
+                "start_date": parse_time("01-01-2095 10:00"),
+                "end_date": parse_time("01-01-2095 12:00"),
+                "invitees": []}) for i in range(5)])
+            with self.assertRaises(ValueError):
+                await ast.act({"table": "places", "action": "add",
+                               "name": "", "street_name": "X",
+                               "street_number": 1})
+            batch = await ast.act_many([
+                {"table": "events", "action": "delete",
+                 "id": events[0]["id"]},
+                {"table": "events", "action": "delete", "id": -1}])
+            infos = await asyncio.gather(*[ast.act({
+                "table": "events", "action": "info", "id": e["id"]})
+                for e in events[1:]])
+            streamed = [e["id"] async for e in ast.act_stream(
+                {"table": "events", "action": "info_stream"})]
+            return events, infos, batch, streamed
+
+        events, infos, batch, streamed = ast.run(main())
+        counts = sorted(len(e["collides"]) for e in events)
+        self.assertEqual(list(range(counts[0], counts[0] + 5)), counts,
+                         "Concurrently added events are written in turn")
+        for info in infos:
+            self.assertEqual(dbt.act({"table": "events", "action": "info",
+                                      "id": info["id"]}), info,
+                             "Same serialization")
+        self.assertEqual([True, False], [r["ok"] for r in batch],
+                         "Batch results")
+        self.assertNotIn(events[0]["id"], streamed,
+                         "Streamed after deletion")
+        self.assertIn(events[1]["id"], streamed, "Streamed events")
+
+
 if __name__ == "__main__":
     unittest.main()